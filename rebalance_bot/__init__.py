@@ -1,4 +1,9 @@
 __all__ = [
     "models", "logging_utils", "globals", "exchange_client",
-    "market_utils", "portfolio", "orders", "rebalance_flow", "runner"
+    "market_utils", "portfolio", "orders", "rebalance_flow", "runner",
+    "reconcile", "user_stream", "ws_standin", "transport",
+    "multi_bot", "rate_limit", "config_watcher",
+    "backtest", "clock", "sim_exchange", "bench", "metrics", "journal",
+    "lazy", "market_cache", "tick_scheduler", "ladder", "kill_switch", "ledger",
+    "planner", "order_book", "recorder"
 ]
@@ -0,0 +1,159 @@
+import os
+import json
+import argparse
+import itertools
+import numpy as np
+from dataclasses import asdict
+from concurrent.futures import ProcessPoolExecutor
+from .models import BacktestParams, BacktestResult
+from .planner import plan_portfolio
+
+def _first_hit(prices, start, hit, window=256):
+    n = len(prices)
+    while start < n:
+        end = min(n, start + window)
+        mask = hit(prices[start:end])
+        if mask.any():
+            return start + int(mask.argmax())
+        start = end
+        window *= 2
+    return -1
+
+class _Book:
+    def __init__(self, params: BacktestParams):
+        self.params = params
+        self.short = params.initial_short_usd
+        self.entry = 0.0
+        self.realized = 0.0
+        self.events = []
+
+    def fill(self, t, side, contracts, price):
+        if side == "sell":
+            asset = (self.short / self.entry if self.entry else 0.0) + contracts / price
+            self.short += contracts
+            self.entry = self.short / asset
+        else:
+            contracts = min(contracts, self.short)
+            self.realized += contracts * (1 / price - 1 / self.entry) if self.entry else 0.0
+            self.short -= contracts
+            if self.short <= 0:
+                self.short, self.entry = 0.0, 0.0
+        self.realized -= self.params.fee_rate * contracts / price
+        self.events.append((t, self.short, self.entry, self.realized))
+
+def run_backtest(prices, params: BacktestParams) -> BacktestResult:
+    prices = np.asarray(prices, dtype=float)
+    n = len(prices)
+    if n == 0:
+        raise ValueError("price series is empty")
+    if params.rebalance_gap >= 1 - params.short_target_ratio:
+        raise ValueError("REBALANCE_GAP must be smaller than 1 - SHORT_TARGET_RATIO")
+    lot, balance, ratio = params.lot_size, params.balance_asset, params.short_target_ratio
+    book = _Book(params)
+    if book.short > 0:
+        book.entry = float(prices[0])
+    book.events.append((0, book.short, book.entry, book.realized))
+    rebalance_fills = boundary_fills = cancels = 0
+    t = 0
+    while t < n:
+        price = float(prices[t])
+        plan = plan_portfolio(price, balance, book.short, lot, params.rebalance_gap, ratio, params.max_leverage)
+        if not plan.balanced:
+            if plan.action == "skip_leverage":
+                t += 1
+                continue
+            side, limit = plan.side, price
+            filled = (lambda seg: seg >= limit) if side == "sell" else (lambda seg: seg <= limit)
+            j = _first_hit(prices, t + 1, lambda seg: filled(seg) | (np.abs(seg - limit) > params.drift_cancel * seg))
+            if j < 0:
+                break
+            if filled(prices[j:j + 1])[0]:
+                book.fill(j, side, plan.contracts, limit)
+                rebalance_fills += 1
+            else:
+                cancels += 1
+        else:
+            if plan.action != "boundary":
+                t += 1
+                continue
+            lower, upper, contracts_down, contracts_up = plan.price_lower, plan.price_upper, plan.contracts_down, plan.contracts_up
+            j = _first_hit(prices, t + 1, lambda seg: (seg >= upper) | (seg <= lower))
+            if j < 0:
+                break
+            if prices[j] >= upper:
+                book.fill(j, "sell", contracts_up, upper)
+            else:
+                book.fill(j, "buy", contracts_down, lower)
+            boundary_fills += 1
+        t = j + 1
+
+    idx, shorts, entries, realized = (np.array(col) for col in zip(*book.events))
+    k = np.searchsorted(idx, np.arange(n), side="right") - 1
+    short, entry = shorts[k], entries[k]
+    unrealized = np.where(entry > 0, short * (1 / prices - 1 / np.where(entry > 0, entry, 1)), 0.0)
+    equity_asset = balance + realized[k] + unrealized
+    equity_usd = equity_asset * prices
+    drawdown = 1 - equity_usd / np.maximum.accumulate(equity_usd)
+    deviation = (short - balance * prices * ratio) / (balance * prices)
+    return BacktestResult(
+        params=params,
+        final_equity_asset=float(equity_asset[-1]),
+        final_equity_usd=float(equity_usd[-1]),
+        return_pct=float(equity_usd[-1] / equity_usd[0] - 1) * 100,
+        max_drawdown_pct=float(drawdown.max()) * 100,
+        mean_abs_deviation=float(np.abs(deviation).mean()),
+        rebalance_fills=rebalance_fills,
+        boundary_fills=boundary_fills,
+        cancels=cancels,
+    )
+
+_worker_prices = None
+
+def _init_worker(prices):
+    global _worker_prices
+    _worker_prices = prices
+
+def _run_worker(params):
+    try:
+        return run_backtest(_worker_prices, params)
+    except ValueError:
+        return None
+
+def sweep(prices, rebalance_gaps, short_target_ratios, max_leverages, workers=None, **common) -> list:
+    grid = [
+        BacktestParams(rebalance_gap=gap, short_target_ratio=ratio, max_leverage=leverage, **common)
+        for gap, ratio, leverage in itertools.product(rebalance_gaps, short_target_ratios, max_leverages)
+    ]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(grid) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(np.asarray(prices, dtype=float),)) as pool:
+        results = [r for r in pool.map(_run_worker, grid, chunksize=chunksize) if r is not None]
+    return sorted(results, key=lambda r: r.final_equity_usd, reverse=True)
+
+def load_prices_csv(path, column=1, skip_header=1):
+    return np.genfromtxt(path, delimiter=",", skip_header=skip_header, usecols=column, dtype=float)
+
+def _floats(value):
+    return [float(v) for v in value.split(",") if v]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a price series through the rebalance strategy.")
+    parser.add_argument("prices", help="CSV file with one price per row")
+    parser.add_argument("--column", type=int, default=1)
+    parser.add_argument("--gaps", type=_floats, default=[0.01])
+    parser.add_argument("--ratios", type=_floats, default=[0.5])
+    parser.add_argument("--leverages", type=_floats, default=[1.0])
+    parser.add_argument("--lot-size", type=float, default=10.0)
+    parser.add_argument("--balance", type=float, default=1.0)
+    parser.add_argument("--fee-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    prices = load_prices_csv(args.prices, args.column)
+    results = sweep(prices, args.gaps, args.ratios, args.leverages, args.workers,
+                    lot_size=args.lot_size, balance_asset=args.balance, fee_rate=args.fee_rate)
+    for result in results:
+        print(json.dumps(asdict(result)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import argparse
+import json
+import math
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict
+from . import globals as G
+from . import clock
+from .logging_utils import setup_logging
+from .models import BotContext, BenchResult, ProcessState
+from .portfolio import setup_portfolio
+from .planner import plan_batch
+from .order_book import open_order_book, replay
+from .orders import cancel_all_orders
+from .runner import run_tick
+from .sim_exchange import SimExchange
+from .transport import run_sync
+
+START_PRICE = 60000.0
+
+def _sine(n, amplitude, period):
+    return [START_PRICE * (1 + amplitude * math.sin(2 * math.pi * i / period)) for i in range(n)]
+
+def _trend(n, per_step):
+    return [START_PRICE * (1 + per_step) ** i for i in range(n)]
+
+# Each scenario is a set of SimExchange arguments. The position starts at the
+# target short so the first tick lands in the boundary-order steady state.
+SCENARIOS = {
+    "balanced": dict(volatility=0.0002),
+    "trending": dict(prices=_trend(20000, 0.0004)),
+    "repeated_fills": dict(prices=_sine(20000, 0.03, 120)),
+    "network_errors": dict(volatility=0.0005, error_rates={"*": 0.05}),
+}
+# Scenarios that inject faults, where a tick raising is the expected outcome.
+FAULT_SCENARIOS = {"network_errors"}
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _bind_context(config):
+    token = G.use_context(BotContext(
+        UNIQUE_KEY="bench",
+        SYMBOL_FUTURES=config.get("symbol_futures", "BTC/USD:BTC"),
+        SYMBOL=config.get("symbol", "BTC"),
+        REBALANCE_GAP=config.get("rebalance_gap", 0.01),
+        SHORT_TARGET_RATIO=config.get("short_target_ratio", 0.5),
+        INTERVAL_SECONDS=config.get("interval_seconds", 5),
+        MAX_LEVERAGE=config.get("max_leverage", 2.0),
+    ))
+    G.state = ProcessState.REBALANCING
+    return token
+
+def _new_exchange(name, config):
+    balance = config.get("balance", 1.0)
+    short = -round(balance * START_PRICE * config.get("short_target_ratio", 0.5), -1)
+    return SimExchange(start_price=START_PRICE, balance=balance, position=short, seed=config.get("seed", 0),
+                       **SCENARIOS[name])
+
+def _run(name, ticks, config):
+    token = _bind_context(config)
+    ex = _new_exchange(name, config)
+    previous = clock.install(ex.clock)
+    try:
+        ex.load_markets()
+        started = time.perf_counter()
+        run_sync(setup_portfolio(ex))
+        setup_ms = (time.perf_counter() - started) * 1000
+        if config.get("local_book"):
+            open_order_book(ex.instrument)
+
+        durations, per_tick, steady, errors = [], [], [], {}
+        for _ in range(ticks):
+            if G.order_book is not None:
+                # Stands in for the book stream delivering between ticks.
+                replay(G.order_book, ex.book_updates())
+            before, state = dict(ex.calls), G.state
+            started = time.perf_counter()
+            try:
+                run_tick(ex)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            durations.append((time.perf_counter() - started) * 1000)
+            calls = {k: v - before.get(k, 0) for k, v in ex.calls.items() if v != before.get(k, 0)}
+            per_tick.append(calls)
+            if state == G.state == ProcessState.WAITMATCHPRE:
+                steady.append(sum(calls.values()))
+            G.wake_event.wait(G.INTERVAL_SECONDS)
+            G.wake_event.clear()
+            if ex.exhausted:
+                break
+
+        started = time.perf_counter()
+        run_sync(cancel_all_orders(ex))
+        shutdown_ms = (time.perf_counter() - started) * 1000
+    finally:
+        clock.install(previous)
+        G.reset_context(token)
+
+    totals = {}
+    for calls in per_tick:
+        for endpoint, count in calls.items():
+            totals[endpoint] = totals.get(endpoint, 0) + count
+    n = len(per_tick)
+    return BenchResult(
+        scenario=name,
+        ticks=n,
+        steady_ticks=len(steady),
+        tick_ms_p50=round(_percentile(durations, 0.5), 4),
+        tick_ms_p95=round(_percentile(durations, 0.95), 4),
+        tick_ms_max=round(max(durations, default=0.0), 4),
+        setup_ms=round(setup_ms, 4),
+        shutdown_ms=round(shutdown_ms, 4),
+        calls_per_tick=round(sum(totals.values()) / n, 4) if n else 0.0,
+        steady_calls_max=max(steady, default=0),
+        calls_by_endpoint={k: round(v / n, 4) for k, v in sorted(totals.items())},
+        fills=sum(1 for o in ex.orders.values() if o["filled"] > 0),
+        errors=sum(errors.values()),
+        errors_by_type=dict(sorted(errors.items())),
+    )
+
+def run_scenario(name, ticks=1000, memory=True, **config) -> BenchResult:
+    result = _run(name, ticks, config)
+    if memory:
+        # Separate pass so tracemalloc overhead does not skew the timings.
+        tracemalloc.start()
+        try:
+            _run(name, ticks, config)
+            result.peak_memory_kib = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        finally:
+            tracemalloc.stop()
+    return result
+
+def run_planner_bench(batch, repeats=200, seed=0) -> dict:
+    # Times planner.plan_batch alone on random portfolios, no exchange involved.
+    rng = random.Random(seed)
+    prices = [START_PRICE * rng.uniform(0.8, 1.2) for _ in range(batch)]
+    balances = [rng.uniform(0.1, 5.0) for _ in range(batch)]
+    shorts = [b * p * rng.uniform(0.3, 0.7) for b, p in zip(balances, prices)]
+    plan_batch(prices, balances, shorts, 10.0, 0.01, 0.5, 2.0)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        plan_batch(prices, balances, shorts, 10.0, 0.01, 0.5, 2.0)
+    per_batch = (time.perf_counter() - started) / repeats
+    return {"planner_batch": batch, "us_per_batch": round(per_batch * 1e6, 2), "us_per_portfolio": round(per_batch * 1e6 / batch, 3)}
+
+def check_budgets(result: BenchResult, budgets: dict) -> list:
+    breaches = []
+    for field, limit in budgets.items():
+        value = getattr(result, field, None)
+        if value is not None and value > limit:
+            breaches.append(f"{result.scenario}: {field}={value} exceeds budget {limit}")
+    if result.errors and result.scenario not in FAULT_SCENARIOS and "errors" not in budgets:
+        breaches.append(f"{result.scenario}: {result.errors} tick(s) raised {result.errors_by_type}")
+    return breaches
+
+def _budget(value):
+    field, _, limit = value.partition("=")
+    if not limit:
+        raise argparse.ArgumentTypeError(f"budget must look like field=limit, got {value!r}")
+    return field, float(limit)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bot loop against the simulated exchange.")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help=f"any of {', '.join(SCENARIOS)}")
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--budget", type=_budget, action="append", default=[],
+                        help="fail when a result field exceeds a limit, e.g. steady_calls_max=3")
+    parser.add_argument("--log-level", default="error")
+    parser.add_argument("--local-book", action="store_true",
+                        help="price orders from a local order book fed by the simulated book stream")
+    parser.add_argument("--planner", type=int, action="append", default=[], metavar="BATCH",
+                        help="also time the planning kernel alone for this many portfolios")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    setup_logging(level=args.log_level, echo=False)
+    budgets = dict(args.budget)
+    breaches = []
+    for name in args.scenarios:
+        result = run_scenario(name, args.ticks, memory=not args.no_memory, local_book=args.local_book)
+        print(json.dumps(asdict(result)))
+        breaches.extend(check_budgets(result, budgets))
+    for batch in args.planner:
+        print(json.dumps(run_planner_bench(batch)))
+    for breach in breaches:
+        print(breach, file=sys.stderr)
+    return 1 if breaches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+# Loop passes a simulated wait gives pending tasks before the clock jumps.
+SETTLE_PASSES = 20
+
+class RealClock:
+    def monotonic(self):
+        return time.monotonic()
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, event, timeout=None):
+        return event.wait(timeout)
+
+    def wait_condition(self, condition, timeout=None):
+        return condition.wait(timeout)
+
+    async def sleep_async(self, seconds):
+        await asyncio.sleep(seconds)
+
+    async def wait_tasks(self, tasks, timeout=None):
+        return await asyncio.wait(tasks, timeout=timeout)
+
+class SimClock:
+    def __init__(self, start=None, speed=None):
+        self._now = time.time() if start is None else start
+        self.speed = speed
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def advance(self, seconds):
+        if seconds <= 0:
+            return
+        if self.speed:
+            time.sleep(seconds / self.speed)
+        self._now += seconds
+        for listener in self._listeners:
+            listener(self._now)
+
+    def monotonic(self):
+        return self._now
+
+    def time(self):
+        return self._now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def wait(self, event, timeout=None):
+        if not event.is_set():
+            self.advance(timeout or 0)
+        return event.is_set()
+
+    def wait_condition(self, condition, timeout=None):
+        self.advance(timeout or 0.001)
+        return True
+
+    async def sleep_async(self, seconds):
+        self.advance(seconds)
+        await asyncio.sleep(0)
+
+    async def wait_tasks(self, tasks, timeout=None):
+        # The tasks get a few passes of the loop first; simulated time only
+        # jumps by the timeout when they still cannot finish.
+        tasks = set(tasks)
+        for attempt in range(2):
+            for _ in range(SETTLE_PASSES):
+                if all(task.done() for task in tasks):
+                    break
+                await asyncio.sleep(0)
+            if attempt == 0 and not all(task.done() for task in tasks):
+                self.advance(timeout or 0.001)
+        done = {task for task in tasks if task.done()}
+        return done, tasks - done
+
+_clock = RealClock()
+
+def install(clock):
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+def current():
+    return _clock
+
+def monotonic():
+    return _clock.monotonic()
+
+def now():
+    return _clock.time()
+
+def sleep(seconds):
+    _clock.sleep(seconds)
+
+def wait(event, timeout=None):
+    return _clock.wait(event, timeout)
+
+def wait_condition(condition, timeout=None):
+    return _clock.wait_condition(condition, timeout)
+
+async def sleep_async(seconds):
+    await _clock.sleep_async(seconds)
+
+async def wait_tasks(tasks, timeout=None):
+    return await _clock.wait_tasks(tasks, timeout)
+
+async def wait_for(awaitable, timeout=None):
+    # asyncio.wait_for on the installed clock.
+    task = asyncio.ensure_future(awaitable)
+    done, _ = await wait_tasks([task], timeout)
+    if task in done:
+        return task.result()
+    task.cancel()
+    raise asyncio.TimeoutError()
@@ -0,0 +1,89 @@
+import os
+import configparser
+from typing import Optional
+from .logging_utils import log_and_print
+from .models import BotConfig
+
+def read_config_file(file_path: str) -> BotConfig:
+    config_parser = configparser.ConfigParser()
+    if not os.path.exists(file_path):
+        raise ValueError(f"Configuration file {file_path} not found")
+    config_parser.read(file_path)
+    if 'bot' not in config_parser:
+        raise ValueError(f"Configuration file {file_path} is missing 'bot' section")
+    config = config_parser['bot']
+    return BotConfig(
+        symbol_futures=config.get('symbol_futures', 'BTC/USD:BTC'),
+        rebalance_gap=float(config.get('rebalance_gap', 0.01)),
+        short_target_ratio=float(config.get('short_target_ratio', 0.5)),
+        interval_seconds=int(config.get('interval_seconds', 5)),
+        max_leverage=float(config.get('max_leverage', 1.0)),
+        initial_asset=float(config.get('initial_asset', 0.0)),
+        use_user_stream=config.getboolean('use_user_stream', False),
+        use_async_engine=config.getboolean('use_async_engine', False),
+        use_journal=config.getboolean('use_journal', True),
+        adaptive_interval=config.getboolean('adaptive_interval', False),
+        min_interval_seconds=float(config.get('min_interval_seconds', 1.0)),
+        max_interval_seconds=float(config.get('max_interval_seconds', 30.0)),
+        request_budget=float(config.get('request_budget', 60.0)),
+        ladder_levels=int(config.get('ladder_levels', 1)),
+        cancel_on_disconnect=config.getboolean('cancel_on_disconnect', False)
+    )
+
+def validate_config(config: BotConfig) -> list:
+    errors = []
+    if config.max_leverage <= 0:
+        errors.append("MAX_LEVERAGE must be greater than 0")
+    if not (0.05 <= config.short_target_ratio <= 0.95):
+        errors.append("SHORT_TARGET_RATIO must be between 0.05 and 0.95")
+    if config.rebalance_gap <= 0:
+        errors.append("REBALANCE_GAP must be greater than 0")
+    if config.interval_seconds <= 0:
+        errors.append("INTERVAL_SECONDS must be greater than 0")
+    if config.min_interval_seconds <= 0:
+        errors.append("MIN_INTERVAL_SECONDS must be greater than 0")
+    if config.max_interval_seconds < config.min_interval_seconds:
+        errors.append("MAX_INTERVAL_SECONDS must not be below MIN_INTERVAL_SECONDS")
+    if config.request_budget <= 0:
+        errors.append("REQUEST_BUDGET must be greater than 0")
+    if config.ladder_levels < 1:
+        errors.append("LADDER_LEVELS must be at least 1")
+    return errors
+
+class ConfigWatcher:
+    def __init__(self, path: str, config: Optional[BotConfig] = None):
+        self.path = path
+        self.config = config
+        self._stamp = None
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def poll(self) -> Optional[BotConfig]:
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        if stamp is None:
+            log_and_print("⚠️ Configuration file %s is missing. Keeping current parameters.", "warning", self.path)
+            return None
+        try:
+            config = read_config_file(self.path)
+        except (ValueError, configparser.Error) as e:
+            log_and_print("⚠️ Ignoring configuration change: %s. Keeping current parameters.", "warning", e)
+            return None
+        errors = validate_config(config)
+        if errors:
+            log_and_print("⚠️ Ignoring invalid configuration change: %s. Keeping current parameters.", "warning", '; '.join(errors))
+            return None
+        if config == self.config:
+            return None
+        if self.config is not None and config.symbol_futures != self.config.symbol_futures:
+            log_and_print("⚠️ SYMBOL_FUTURES cannot change while running (%s -> %s). Restart the bot to switch symbols.", "warning", self.config.symbol_futures, config.symbol_futures)
+            return None
+        self.config = config
+        return config
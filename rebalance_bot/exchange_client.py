@@ -1,21 +1,90 @@
-import time
-import ccxt
+from .lazy import lazy_import
+import asyncio
 import configparser
+import time
+import threading
 from functools import wraps
 from .logging_utils import log_and_print
 from . import globals as G
+from . import clock
+from . import metrics
+from .market_cache import perpetual_symbols
+from .ledger import ledger_position, sync_ledger
+from .order_book import book_price
+from .transport import run_sync
+from .rate_limit import scheduler_for, endpoint_bucket, endpoint_priority, backoff_delay
+
+ccxt = lazy_import("ccxt")
+
+def _retry_wait(func, error, attempt, max_retries, delay, scheduler, bucket, deadline):
+    # Once an attempt has failed: returns how long to back off, or None when
+    # the caller should give up.
+    wait = backoff_delay(attempt, delay)
+    if isinstance(error, ccxt.RateLimitExceeded) and scheduler is not None:
+        scheduler.penalize(bucket, wait)
+    if attempt + 1 == max_retries or (deadline is not None and clock.monotonic() + wait > deadline):
+        return None
+    metrics.record_retry(func.__name__)
+    log_and_print("⚠️ Retry %s/%s for %s in %.2fs: %s", "warning", attempt+1, max_retries, func.__name__, wait, error)
+    return wait
+
+_request_count_lock = threading.Lock()
+
+def count_request():
+    # Cancel sweeps send requests from pool threads that share the bot's context.
+    with _request_count_lock:
+        G.tick_requests += 1
 
-def retry_ccxt(max_retries=3, delay=2):
+def _request_slot(func, priority):
+    exchange = getattr(func, "__self__", None)
+    if exchange is None:
+        return None, None, None
+    name = func.__name__
+    return scheduler_for(exchange), endpoint_bucket(name), endpoint_priority(name) if priority is None else priority
+
+async def _request(func, args, kwargs, max_retries, delay, priority):
+    # One attempt loop for both client kinds: a blocking ccxt method waits on
+    # the scheduler and the clock in place, a coroutine method awaits them.
+    asynchronous = asyncio.iscoroutinefunction(func)
+    scheduler, bucket, request_priority = _request_slot(func, priority)
+    deadline = G.tick_deadline
+    attempt, last_error = -1, None
+    for attempt in range(max_retries):
+        if scheduler is not None:
+            waited = time.perf_counter()
+            if asynchronous:
+                acquired = await scheduler.acquire_async(bucket, request_priority, deadline)
+            else:
+                acquired = scheduler.acquire(bucket, request_priority, deadline)
+            metrics.record_slot_wait(bucket, time.perf_counter() - waited)
+            if not acquired:
+                raise ccxt.RequestTimeout(f"Tick deadline reached while waiting for a request slot: {func.__name__}")
+        count_request()
+        started = time.perf_counter()
+        try:
+            result = await func(*args, **kwargs) if asynchronous else func(*args, **kwargs)
+            metrics.record_request(func.__name__, time.perf_counter() - started)
+            return result
+        except (ccxt.NetworkError, ccxt.ExchangeNotAvailable, ccxt.RequestTimeout) as e:
+            metrics.record_request(func.__name__, time.perf_counter() - started, e)
+            last_error = e
+            wait = _retry_wait(func, e, attempt, max_retries, delay, scheduler, bucket, deadline)
+            if wait is None:
+                break
+            if asynchronous:
+                await clock.sleep_async(wait)
+            else:
+                clock.sleep(wait)
+    log_and_print("❌ Failed after %s attempt(s): %s", "error", attempt+1, func.__name__)
+    raise last_error or ccxt.ExchangeError(f"{func.__name__} not attempted: max_retries={max_retries}")
+
+def retry_ccxt(max_retries=3, delay=0.25, priority=None):
+    # The wrapped call returns a coroutine, awaited by the engine; outside
+    # it, pass the call to transport.run_sync().
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except (ccxt.NetworkError, ccxt.ExchangeNotAvailable, ccxt.RequestTimeout) as e:
-                    log_and_print(f"⚠️ Retry {attempt+1}/{max_retries} for {func.__name__}: {e}", "warning")
-                    time.sleep(delay)
-            raise Exception(f"Failed after {max_retries} retries: {func.__name__}")
+            return _request(func, args, kwargs, max_retries, delay, priority)
         return wrapper
     return decorator
 
@@ -24,53 +93,101 @@ def load_config(key):
     config.read(G.CONFIG_PATH)
     return config[key][f'{key}_API_KEY'], config[key][f'{key}_API_SECRET']
 
+class LazyExchange:
+    # Defers importing ccxt and building the client until the first attribute
+    # access, so config prompts and cached-market startups stay cheap.
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_exchange", None)
+
+    def _target(self):
+        if self._exchange is None:
+            object.__setattr__(self, "_exchange", self._factory())
+        return self._exchange
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._target(), name, value)
+
+_exchanges = {}
+
 def connect_exchange(api_key, api_secret):
-    exchange = ccxt.deribit({'apiKey': api_key, 'secret': api_secret, 'enableRateLimit': True})
-    try:
-        exchange.fetch_balance()
-        log_and_print("✅ Successfully connected to Deribit exchange", "info")
-    except Exception as e:
-        log_and_print(f"❌ Failed to connect to Deribit: {e}", "error")
+    # No connectivity probe here: the first real request surfaces auth or
+    # network problems, and one client per key is shared within the process.
+    exchange = _exchanges.get(api_key)
+    if exchange is None:
+        exchange = _exchanges[api_key] = LazyExchange(
+            lambda: ccxt.deribit({'apiKey': api_key, 'secret': api_secret, 'enableRateLimit': False})
+        )
     return exchange
 
-@retry_ccxt()
-def get_target_symbol_balance(exchange, symbol='BTC'):
-    balance = retry_ccxt()(exchange.fetch_balance)()
+def connect_exchange_async(api_key, api_secret, session=None):
+    import ccxt.async_support as ccxt_async
+    config = {'apiKey': api_key, 'secret': api_secret, 'enableRateLimit': False}
+    if session is not None:
+        config['session'] = session
+    return ccxt_async.deribit(config)
+
+async def get_target_symbol_balance(exchange, symbol='BTC'):
+    balance = await G.snapshot.get("balance", None, lambda: retry_ccxt()(exchange.fetch_balance)())
     return balance['total'].get(symbol, 0)
 
-@retry_ccxt()
-def get_price(exchange):
-    return retry_ccxt()(exchange.fetch_ticker)(G.SYMBOL_FUTURES)['last']
+async def get_price(exchange):
+    ticker = await G.snapshot.get("ticker", G.SYMBOL_FUTURES, lambda: retry_ccxt()(exchange.fetch_ticker)(G.SYMBOL_FUTURES))
+    return ticker['last']
+
+def parse_futures_position(positions):
+    for pos in positions:
+        if pos['symbol'] == G.SYMBOL_FUTURES or pos['info'].get('instrument_name') == G.SYMBOL_FUTURES:
+            size = float(pos['info'].get('size', '0'))
+            entry = float(pos.get('entryPrice', 0))
+            unrealized = float(pos.get('unrealizedPnl', 0))
+            return size, entry, unrealized
+    return 0.0, 0.0, 0.0
+
+async def _load_futures_position(exchange):
+    return parse_futures_position(await retry_ccxt()(exchange.fetch_positions)())
 
-@retry_ccxt()
-def get_futures_position(exchange):
+async def get_futures_position(exchange):
+    position = ledger_position()
+    if position is not None:
+        return position
     try:
-        positions = retry_ccxt()(exchange.fetch_positions)()
-        for pos in positions:
-            if pos['symbol'] == G.SYMBOL_FUTURES or pos['info'].get('instrument_name') == G.SYMBOL_FUTURES:
-                size = float(pos['info'].get('size', '0'))
-                entry = float(pos.get('entryPrice', 0))
-                unrealized = float(pos.get('unrealizedPnl', 0))
-                return size, entry, unrealized
+        if G.ledger is not None:
+            G.snapshot.invalidate("position")
+        return sync_ledger(await G.snapshot.get("position", G.SYMBOL_FUTURES, lambda: _load_futures_position(exchange)))
     except Exception as e:
-        log_and_print(f"fetch_positions failed: {str(e)}", "error")
+        log_and_print("fetch_positions failed: %s", "error", e)
     return 0.0, 0.0, 0.0
 
-@retry_ccxt()
-def get_limit_price(exchange, side):
-    book = retry_ccxt()(exchange.fetch_order_book)(G.SYMBOL_FUTURES)
-    if side.lower() == 'buy':
-        return book['bids'][0][0] if book['bids'] else None
-    else:
-        return book['asks'][0][0] if book['asks'] else None
+def limit_order_params(side):
+    # Rebalance orders always rest passively; buys only ever reduce the short.
+    return {"post_only": True} if side.lower() == "sell" else {"post_only": True, "reduce_only": True}
+
+def limit_order_method(exchange, side):
+    return exchange.create_limit_sell_order if side.lower() == "sell" else exchange.create_limit_buy_order
+
+def is_cancelled(result) -> bool:
+    return (result or {}).get("status", "").lower() in ["canceled", "cancelled"]
+
+def best_price(book, side):
+    levels = book['bids'] if side.lower() == 'buy' else book['asks']
+    return levels[0][0] if levels else None
+
+def local_limit_price(side):
+    # Best price from the local order book, or None when a REST snapshot is needed.
+    price = book_price(side)
+    metrics.record_price_source("rest" if price is None else "local")
+    return price
+
+async def get_limit_price(exchange, side):
+    price = local_limit_price(side)
+    if price is not None:
+        return price
+    book = await G.snapshot.get("book", G.SYMBOL_FUTURES, lambda: retry_ccxt()(exchange.fetch_order_book)(G.SYMBOL_FUTURES))
+    return best_price(book, side)
 
-@retry_ccxt()
 def getPerpetualSymbols(exchange):
-    perpetual_symbols = []
-    markets = exchange.load_markets()
-    for symbol, market in markets.items():
-        if (market.get("contract") is True and
-            market.get("settle") in ["USD","USDT","USDC","BTC","ETH"] and
-            market.get("swap", False)):
-            perpetual_symbols.append(symbol)
-    return perpetual_symbols
+    return run_sync(retry_ccxt()(perpetual_symbols)(exchange))
@@ -1,26 +1,59 @@
-from .models import ProcessState
-from datetime import datetime
+from .models import BotContext
+from dataclasses import fields
+import contextvars
+import types
+import sys
 import os
 
-UNIQUE_KEY = None
 CONFIG_PATAMETERS_FOLDER = "CONFIG_PARAMETERS"
 CONFIG_FOLDER = "CONFIG_API_KEY"
 LOGS_FOLDER = "LOGS"
-CONFIG_KEY = "deribit"
+JOURNAL_FOLDER = "JOURNAL"
+# Relative to the repository root unless absolute; empty disables the cache.
+CACHE_FOLDER = os.environ.get("REBALANCE_CACHE_DIR", "CACHE")
+RECORDS_FOLDER = "RECORDS"
 PARAMETER_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", CONFIG_PATAMETERS_FOLDER, "rebalance_parameters.ini"))
 CONFIG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", CONFIG_FOLDER, "config.ini"))
-LOG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", LOGS_FOLDER, f"rebalance_log_{datetime.now().strftime('%Y%m%d')}.log"))
-
-SYMBOL_FUTURES = "BTC/USD:BTC"
-SYMBOL = "BTC"
-REBALANCE_GAP = 0.01
-SHORT_TARGET_RATIO = 0.5
-INTERVAL_SECONDS = 5
-MAX_LEVERAGE = 1.0
-
-order_ids = []
-state = ProcessState.REBALANCING
-initial_balance_asset = 0.0
-current_balance_asset = 0.0
-initial_short_usd = 0.0
-current_short_usd = 0.0
+DERIBIT_WS_URL = "wss://www.deribit.com/ws/api/v2"
+LOG_FILE_PREFIX = "rebalance_log"
+LOG_LEVEL = os.environ.get("REBALANCE_LOG_LEVEL", "info")
+LOG_JSON = os.environ.get("REBALANCE_LOG_JSON", "0") == "1"
+LOG_ECHO = os.environ.get("REBALANCE_LOG_ECHO", "1") == "1"
+LOG_MAX_BYTES = int(os.environ.get("REBALANCE_LOG_MAX_BYTES", "0"))
+LOG_BACKUP_COUNT = 10
+MARKET_CACHE_TTL_SECONDS = int(os.environ.get("REBALANCE_MARKET_CACHE_TTL", str(6 * 3600)))
+METRICS_PORT = int(os.environ.get("REBALANCE_METRICS_PORT", "0"))
+KILL_DEADLINE_SECONDS = float(os.environ.get("REBALANCE_KILL_DEADLINE", "0.8"))
+LEDGER_SYNC_SECONDS = float(os.environ.get("REBALANCE_LEDGER_SYNC", "60"))
+BOOK_STALE_SECONDS = float(os.environ.get("REBALANCE_BOOK_STALE", "5"))
+RECORD_MARKET_DATA = os.environ.get("REBALANCE_RECORD", "0") == "1"
+
+# Per-bot parameters and state (SYMBOL_FUTURES, order_ids, state, ...) live on a
+# BotContext. Reads and writes of those names on this module are routed to the
+# context bound to the current thread / asyncio task, so many bots can share one process.
+BOT_FIELDS = frozenset(f.name for f in fields(BotContext))
+default_context = BotContext()
+_current_context = contextvars.ContextVar("bot_context", default=default_context)
+
+def current_context() -> BotContext:
+    return _current_context.get()
+
+def use_context(context: BotContext):
+    return _current_context.set(context)
+
+def reset_context(token):
+    _current_context.reset(token)
+
+class _GlobalsModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name in BOT_FIELDS:
+            return getattr(_current_context.get(), name)
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    def __setattr__(self, name, value):
+        if name in BOT_FIELDS:
+            setattr(_current_context.get(), name, value)
+        else:
+            super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = _GlobalsModule
@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import asdict
+from . import globals as G
+from . import clock
+from .models import JournalState, OrderStatus, ProcessState
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT,
+    payload TEXT
+)
+"""
+
+def journal_path(config_key, symbol_futures, bot_name=None):
+    key = "_".join(part for part in (config_key, symbol_futures, bot_name) if part)
+    name = "".join(c if c.isalnum() else "_" for c in key)
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", G.JOURNAL_FOLDER, f"{name}.db"))
+
+class Journal:
+    # Appends order and state transitions to SQLite. Rows are grouped into one
+    # transaction per tick (one fsync); order placements commit immediately so a
+    # crash right after an order is acknowledged cannot lose it.
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._orders = {}
+        self._scalars = {}
+
+    def _append(self, kind, key, payload):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO events (ts, kind, key, payload) VALUES (?, ?, ?, ?)",
+                (clock.now(), kind, key, None if payload is None else json.dumps(payload)),
+            )
+            self._pending += 1
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._conn.commit()
+                self._pending = 0
+
+    def record_order(self, order: OrderStatus, flush=False):
+        payload = asdict(order)
+        if self._orders.get(order.order_id) != payload:
+            self._orders[order.order_id] = payload
+            self._append("order", order.order_id, payload)
+        if flush:
+            self.flush()
+
+    def record_untrack(self, order_id):
+        if self._orders.pop(order_id, None) is not None:
+            self._append("untrack", order_id, None)
+
+    def _record_scalar(self, key, value):
+        if self._scalars.get(key, object()) != value:
+            self._scalars[key] = value
+            self._append("value", key, value)
+
+    def checkpoint(self):
+        for order in list(G.order_ids.values()):
+            self.record_order(order)
+        for order_id in [order_id for order_id in self._orders if order_id not in G.order_ids]:
+            self.record_untrack(order_id)
+        self._record_scalar("state", G.state.name)
+        self._record_scalar("order_sync_cursor", G.order_sync_cursor)
+        self._record_scalar("initial_balance_asset", G.initial_balance_asset)
+        self._record_scalar("initial_short_usd", G.initial_short_usd)
+        self._record_scalar("ladder_anchor", G.ladder_anchor)
+        self._record_scalar("ladder_center", G.ladder_center)
+        self.flush()
+
+    def replay(self) -> JournalState:
+        saved = JournalState()
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, key, payload FROM events ORDER BY seq").fetchall()
+        for kind, key, payload in rows:
+            value = None if payload is None else json.loads(payload)
+            if kind == "order":
+                saved.orders[key] = OrderStatus(**value)
+            elif kind == "untrack":
+                saved.orders.pop(key, None)
+            elif key == "state":
+                saved.state = ProcessState[value]
+            elif key in ("order_sync_cursor", "initial_balance_asset", "initial_short_usd", "ladder_anchor", "ladder_center"):
+                setattr(saved, key, value)
+        self._orders = {order_id: asdict(order) for order_id, order in saved.orders.items()}
+        return saved
+
+    def compact(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM events")
+            self._pending = 1
+        self._orders.clear()
+        self._scalars.clear()
+        self.checkpoint()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+def open_journal():
+    if G.USE_JOURNAL and G.journal is None:
+        G.journal = Journal(journal_path(G.CONFIG_KEY, G.SYMBOL_FUTURES, G.BOT_NAME))
+    return G.journal
+
+def close_journal():
+    if G.journal is not None:
+        G.journal.checkpoint()
+        G.journal.close()
+        G.journal = None
+
+def restore_from_journal() -> bool:
+    if G.journal is None:
+        return False
+    saved = G.journal.replay()
+    if not saved.orders:
+        return False
+    G.order_ids = dict(saved.orders)
+    G.order_sync_cursor = saved.order_sync_cursor
+    G.state = saved.state or ProcessState.REBALANCING
+    G.ladder_anchor, G.ladder_center = saved.ladder_anchor, saved.ladder_center
+    if saved.initial_balance_asset is not None:
+        G.initial_balance_asset = saved.initial_balance_asset
+    if saved.initial_short_usd is not None:
+        G.initial_short_usd = saved.initial_short_usd
+    return True
+
+def discard_restored():
+    G.order_ids = {}
+    G.order_sync_cursor = None
+    G.state = ProcessState.REBALANCING
+
+def untracked_open_orders(open_orders) -> list:
+    return [data for data in open_orders if str(data.get("id", "")) not in G.order_ids]
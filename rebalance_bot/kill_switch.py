@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from .lazy import lazy_import
+from .logging_utils import log_and_print
+from . import globals as G
+from . import clock
+from . import metrics
+from .exchange_client import retry_ccxt, is_cancelled
+from .rate_limit import PRIORITY_KILL
+from .reconcile import untrack_order, reconcile_orders, apply_ccxt_order
+from .transport import run_sync, blocking
+
+ccxt = lazy_import("ccxt")
+
+CANCEL_WORKERS = 8
+# One retry at most: past the deadline a stuck request is abandoned, not waited on.
+CANCEL_RETRIES = 2
+
+_executor = None
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=CANCEL_WORKERS, thread_name_prefix="cancel")
+    return _executor
+
+def _submit(fn, *args):
+    return _pool().submit(contextvars.copy_context().run, fn, *args)
+
+def _remaining(deadline):
+    return max(0.0, deadline - clock.monotonic())
+
+def _outcome(future):
+    if future.cancelled() or not future.done():
+        return TimeoutError()
+    return future.exception() or future.result()
+
+async def _within(calls, deadline) -> dict:
+    # Runs the coroutines in `calls` concurrently and returns their results by
+    # key; a call that raised maps to its exception and one still running at
+    # the deadline to TimeoutError. A blocking client runs them on the cancel
+    # pool, so the caller is never held past the deadline either way.
+    if not calls:
+        return {}
+    if blocking():
+        futures = {key: _submit(run_sync, coro) for key, coro in calls.items()}
+        wait(futures.values(), timeout=_remaining(deadline))
+        for key, future in futures.items():
+            if future.cancel():
+                calls[key].close()
+        return {key: _outcome(future) for key, future in futures.items()}
+    tasks = {key: asyncio.ensure_future(coro) for key, coro in calls.items()}
+    _, pending = await clock.wait_tasks(tasks.values(), _remaining(deadline))
+    for task in pending:
+        task.cancel()
+    return {key: _outcome(task) for key, task in tasks.items()}
+
+async def _result(coro, deadline, what):
+    outcome = (await _within({what: coro}, deadline))[what]
+    if isinstance(outcome, TimeoutError):
+        log_and_print("⏱️ %s did not finish before the cancel deadline", "warning", what)
+        return None
+    if isinstance(outcome, Exception):
+        log_and_print("⚠️ %s failed: %s", "warning", what, outcome)
+        return None
+    return outcome
+
+def sweep_deadline(deadline_seconds=None, kill=False):
+    # The kill switch has its own short budget; routine sweeps share the
+    # deadline of the tick they run in (one interval outside the loop).
+    if deadline_seconds is not None:
+        return clock.monotonic() + deadline_seconds
+    if kill:
+        return clock.monotonic() + G.KILL_DEADLINE_SECONDS
+    return G.tick_deadline if G.tick_deadline is not None else clock.monotonic() + G.INTERVAL_SECONDS
+
+def sweep_priority(kill=False):
+    # None leaves each request at its endpoint's normal priority.
+    return PRIORITY_KILL if kill else None
+
+async def _bulk_cancel(exchange, priority):
+    if exchange.has.get("cancelAllOrders"):
+        return await retry_ccxt(CANCEL_RETRIES, priority=priority)(exchange.cancel_all_orders)(G.SYMBOL_FUTURES)
+    return None
+
+def untrack_cancelled(order_id, data):
+    # The cancel reply carries the final filled amount, which the position
+    # ledger books when the order is untracked.
+    order = G.order_ids.get(order_id)
+    if order is not None:
+        apply_ccxt_order(order, data)
+    untrack_order(order_id)
+
+def untrack_reported(result):
+    # Some venues report the orders a bulk cancel removed; those need no
+    # further lookup. Anything else is resolved from the open order list.
+    for data in result if isinstance(result, list) else []:
+        order_id = str((data or {}).get("id") or "")
+        if order_id in G.order_ids and is_cancelled(data):
+            untrack_cancelled(order_id, data)
+
+async def cancel_order(exchange, order):
+    # Single cancel outside a sweep; failures are logged and left to the next
+    # reconciliation.
+    try:
+        result = await retry_ccxt()(exchange.cancel_order)(order.order_id, G.SYMBOL_FUTURES)
+        if is_cancelled(result):
+            untrack_cancelled(order.order_id, result)
+            log_and_print("🗑️ Cancelled order %s", "info", order.order_id)
+    except ccxt.NetworkError as ne:
+        log_and_print("🌐 Network error while cancelling order %s: %s", "warning", order.order_id, ne)
+    except Exception as e:
+        log_and_print("⚠️ Failed to cancel order %s: %s", "error", order.order_id, e)
+
+async def _open_order_ids(exchange, priority):
+    open_orders = await retry_ccxt(CANCEL_RETRIES, priority=priority)(exchange.fetch_open_orders)(G.SYMBOL_FUTURES)
+    return {str(data.get("id", "")) for data in open_orders}
+
+async def _cancel_one(exchange, order_id, priority, deadline):
+    # Queued cancels that only get a worker after the deadline are dropped
+    # rather than sent late; the order is reported as possibly resting.
+    if _remaining(deadline) <= 0:
+        return None
+    try:
+        result = await retry_ccxt(CANCEL_RETRIES, priority=priority)(exchange.cancel_order)(order_id, G.SYMBOL_FUTURES)
+    except ccxt.OrderNotFound:
+        return "gone"
+    return result if is_cancelled(result) else None
+
+async def _kill_targets(exchange, deadline, priority):
+    # The kill switch pulls everything on the instrument, not only what this
+    # bot tracks: an exchange-wide cancel, then one fetch to verify it.
+    untrack_reported(await _result(_bulk_cancel(exchange, priority), deadline, "Exchange-wide cancel"))
+    open_ids = await _result(_open_order_ids(exchange, priority), deadline, "Open order check")
+    return set(G.order_ids) if open_ids is None else open_ids
+
+async def cancel_open_orders(exchange, deadline_seconds=None, kill=False) -> bool:
+    # Routine sweeps cancel the tracked orders only, so manual orders and
+    # other bots on the same account and instrument are left alone. The
+    # cancels run concurrently and the caller is never blocked past the
+    # deadline. Returns True when nothing is known to be resting afterwards.
+    started = time.perf_counter()
+    deadline, priority, resolve = sweep_deadline(deadline_seconds, kill), sweep_priority(kill), not kill
+    previous_deadline, G.tick_deadline = G.tick_deadline, deadline
+    try:
+        targets = await _kill_targets(exchange, deadline, priority) if kill else set(G.order_ids)
+        if targets:
+            log_and_print("🗑️ Cancelling %s order(s)...", "info", len(targets))
+        outcomes = await _within({order_id: _cancel_one(exchange, order_id, priority, deadline) for order_id in targets}, deadline)
+        leftover = settle_cancels({order_id: None if isinstance(outcome, Exception) else outcome
+                                   for order_id, outcome in outcomes.items()})
+        if resolve and G.order_ids:
+            # Orders the exchange no longer knew were either cancelled or
+            # filled just before the cancel: reconcile tells them apart and
+            # filled ones stay tracked for the next tick.
+            try:
+                await reconcile_orders(exchange)
+            except Exception as e:
+                log_and_print("⚠️ Unable to resolve cancelled orders: %s", "warning", e)
+            untrack_resolved()
+        return finish_sweep(resolve, started, leftover)
+    finally:
+        G.tick_deadline = previous_deadline
+
+def settle_cancels(outcomes) -> list:
+    # Per-order cancel outcomes (result dict, "gone", or None when unknown)
+    # to bookkeeping; returns the ids that may still be resting.
+    leftover = []
+    for order_id, outcome in outcomes.items():
+        if isinstance(outcome, dict):
+            untrack_cancelled(order_id, outcome)
+            log_and_print("🗑️ Cancelled order %s", "info", order_id)
+        elif outcome is None:
+            leftover.append(order_id)
+    return leftover
+
+def untrack_resolved():
+    for order in [o for o in G.order_ids.values() if o.status == "CANCELLED"]:
+        untrack_order(order.order_id)
+
+def finish_sweep(resolve, started, leftover) -> bool:
+    G.snapshot.invalidate("book")
+    elapsed = time.perf_counter() - started
+    metrics.record_cancel_sweep("routine" if resolve else "kill", elapsed, len(leftover))
+    if leftover:
+        log_and_print("❌ %s order(s) may still be resting after %.0f ms: %s", "error", len(leftover), elapsed * 1000, ', '.join(leftover))
+    else:
+        log_and_print("✅ All open orders cancelled in %.0f ms.", "info", elapsed * 1000)
+    return not leftover
+
+async def engage_kill_switch(exchange, reason) -> bool:
+    log_and_print("🛑 Kill switch: %s. Pulling all orders on %s...", "warning", reason, G.SYMBOL_FUTURES)
+    return await cancel_open_orders(exchange, kill=True)
@@ -0,0 +1,96 @@
+from .logging_utils import log_and_print
+from . import globals as G
+from .models import ProcessState
+from .exchange_client import retry_ccxt, limit_order_params, limit_order_method
+from .market_utils import get_lot_size, ladder_plan, ladder_step, ladder_level
+from .reconcile import track_order
+from .kill_switch import cancel_order
+from .transport import gather
+
+def ladder_enabled() -> bool:
+    return G.LADDER_LEVELS > 1
+
+def resting_levels() -> dict:
+    return {o.level: o for o in G.order_ids.values() if o.level is not None and o.status in ("OPEN", "PARTIAL")}
+
+def _matches(order, wanted) -> bool:
+    if wanted is None:
+        return False
+    side, _, contracts = wanted
+    return order.side == side.upper() and abs((order.contracts - order.filled) - contracts) < 1e-9
+
+def _is_stale(order, center, desired) -> bool:
+    if order.level in desired:
+        return not _matches(order, desired[order.level])
+    # Levels that drifted just outside the window keep their grid size, so
+    # they stay until they are a full ladder width away or on the wrong side.
+    on_wrong_side = (order.side == "SELL") != (order.level > center)
+    return on_wrong_side or abs(order.level - center) > 2 * G.LADDER_LEVELS
+
+def ladder_changes(center, lot_size):
+    # Diff the desired ladder against what is resting: only levels whose side
+    # or remaining size changed are cancelled. Once the cancels are applied,
+    # missing_levels() gives the levels to place.
+    desired = ladder_plan(G.ladder_anchor, center, lot_size, G.LADDER_LEVELS)
+    stale = [order for order in resting_levels().values() if _is_stale(order, center, desired)]
+    return stale, desired
+
+def missing_levels(desired) -> list:
+    resting = resting_levels()
+    return [(level, *wanted) for level, wanted in sorted(desired.items()) if level not in resting]
+
+def filled_ladder_center(filled_orders):
+    # The new centre is the furthest level filled. Fills on both sides in one
+    # tick (or fills of non-ladder orders) fall back to a full rebalance.
+    if any(o.level is None for o in filled_orders):
+        return None
+    sells = [o.level for o in filled_orders if o.side == "SELL"]
+    buys = [o.level for o in filled_orders if o.side == "BUY"]
+    if sells and buys:
+        return None
+    return max(sells) if sells else min(buys)
+
+def level_placed(order, level, side, price, contracts):
+    log_and_print("[LADDER] L%+d %s %s at %.2f", "info", level, side, contracts, price)
+    return track_order(order, level=level)
+
+def ladder_synced(center, stale, to_place, failed):
+    if stale or to_place:
+        G.snapshot.invalidate("book")
+    log_and_print("[LADDER] Centre L%+d: cancelled %s, placed %s, resting %s", "info", center, len(stale), len(to_place) - len(failed), len(resting_levels()))
+    if failed:
+        raise failed[0]
+
+async def _place_level(exchange, level, side, price, contracts):
+    order = await retry_ccxt()(limit_order_method(exchange, side))(G.SYMBOL_FUTURES, contracts, price, limit_order_params(side))
+    return level_placed(order, level, side, price, contracts)
+
+async def sync_ladder(exchange, center):
+    G.ladder_center = center
+    stale, desired = ladder_changes(center, get_lot_size(exchange))
+    await gather(*[cancel_order(exchange, order) for order in stale])
+    to_place = missing_levels(desired)
+    results = await gather(*[_place_level(exchange, *level) for level in to_place], return_exceptions=True)
+    ladder_synced(center, stale, to_place, [r for r in results if isinstance(r, BaseException)])
+
+async def place_ladder_orders(exchange, price_now, dev):
+    if G.ladder_anchor is None:
+        G.ladder_anchor = price_now
+    center = ladder_level(price_now, G.ladder_anchor, ladder_step())
+    log_and_print("[LADDER] Placing %s levels per side around L%+d | dev=%.4f", "info", G.LADDER_LEVELS, center, dev)
+    try:
+        await sync_ladder(exchange, center)
+    except Exception as e:
+        log_and_print("❌ Error placing ladder orders: %s", "error", e)
+    G.state = ProcessState.WAITMATCHPRE if resting_levels() else ProcessState.REBALANCING
+
+async def adjust_ladder(exchange, filled_orders) -> bool:
+    center = filled_ladder_center(filled_orders) if filled_orders else G.ladder_center
+    if center is None or G.ladder_anchor is None:
+        return False
+    try:
+        await sync_ladder(exchange, center)
+    except Exception as e:
+        log_and_print("❌ Error adjusting ladder: %s", "error", e)
+        return False
+    return bool(resting_levels())
@@ -0,0 +1,20 @@
+import importlib.util
+import sys
+
+def lazy_import(name):
+    # Returns the module without executing it; the import runs on first
+    # attribute access. Importing ccxt takes about half a second and most
+    # startup paths (cached markets, config prompts, the simulator) never
+    # touch it until the first request.
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
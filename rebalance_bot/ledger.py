@@ -0,0 +1,109 @@
+import threading
+from .logging_utils import log_and_print
+from . import globals as G
+from . import clock
+from . import metrics
+
+class PositionLedger:
+    # Local copy of the futures position, moved by the fills seen on tracked
+    # orders. Every order's filled amount is applied once, as a delta against
+    # what was already booked for it. The exchange is only asked again after
+    # `sync_seconds` or when something made the ledger unreliable
+    # (invalidate()), and a mismatch at that point is logged as drift.
+    def __init__(self, lot_size=0.0, sync_seconds=None):
+        self.lot_size = lot_size
+        self.sync_seconds = G.LEDGER_SYNC_SECONDS if sync_seconds is None else sync_seconds
+        self.size = 0.0
+        self.entry_price = 0.0
+        self.realized = 0.0
+        self.fees = 0.0
+        self.synced_at = None
+        self._applied = {}
+        self._fees = {}
+        self._lock = threading.Lock()
+
+    def fresh(self, now=None) -> bool:
+        now = clock.monotonic() if now is None else now
+        return self.synced_at is not None and now - self.synced_at < self.sync_seconds
+
+    def invalidate(self):
+        self.synced_at = None
+
+    def _book(self, signed, price):
+        # Inverse contracts: size is in USD, the entry is the harmonic mean of
+        # fill prices and PnL is realized in the settlement asset.
+        if self.size == 0 or (self.size > 0) == (signed > 0):
+            asset = (abs(self.size) / self.entry_price if self.entry_price else 0.0) + abs(signed) / price
+            self.size += signed
+            self.entry_price = abs(self.size) / asset
+            return
+        closed = min(abs(signed), abs(self.size))
+        direction = 1 if self.size > 0 else -1
+        self.realized += direction * closed * (1 / self.entry_price - 1 / price)
+        self.size += signed
+        if abs(self.size) < 1e-9:
+            self.size, self.entry_price = 0.0, 0.0
+        elif (self.size > 0) != (direction > 0):
+            self.entry_price = price
+
+    def apply_order(self, order) -> float:
+        with self._lock:
+            delta = order.filled - self._applied.get(order.order_id, 0.0)
+            fee = order.fee - self._fees.get(order.order_id, 0.0)
+            self._fees[order.order_id] = order.fee
+            self.fees += fee
+            if delta <= 1e-9:
+                return 0.0
+            self._applied[order.order_id] = order.filled
+            price = order.average_price or order.price
+            if not price:
+                self.synced_at = None
+                return 0.0
+            self._book(delta if order.side == "BUY" else -delta, float(price))
+            return delta
+
+    def forget(self, order_id):
+        with self._lock:
+            self._applied.pop(order_id, None)
+            self._fees.pop(order_id, None)
+
+    def position(self, orders=()):
+        for order in orders:
+            self.apply_order(order)
+        ticker = G.snapshot.peek("ticker", G.SYMBOL_FUTURES)
+        price = ticker["last"] if ticker else None
+        unrealized = self.size * (1 / self.entry_price - 1 / price) if price and self.entry_price else 0.0
+        return self.size, self.entry_price, unrealized
+
+    def sync(self, size, entry_price, orders=()):
+        # The exchange position already includes every fill booked so far, so
+        # the tracked orders' current fills are taken as applied.
+        orders = list(orders)
+        for order in orders:
+            self.apply_order(order)
+        with self._lock:
+            drift = size - self.size
+            if self.synced_at is not None and self.lot_size and abs(drift) >= self.lot_size / 2:
+                metrics.record_ledger_drift(drift)
+                log_and_print("⚠️ Position ledger drifted by %+.0f contracts. Resynced to %.0f @ %.2f", "warning", drift, size, entry_price)
+            self.size, self.entry_price = float(size), float(entry_price or 0.0)
+            self._applied = {order.order_id: order.filled for order in orders}
+            self._fees = {order.order_id: order.fee for order in orders}
+            self.synced_at = clock.monotonic()
+
+def open_ledger(lot_size):
+    G.ledger = PositionLedger(lot_size)
+    return G.ledger
+
+def ledger_position():
+    # O(1) read for the hot path; None means the caller should fetch from the
+    # exchange and pass the result to sync_ledger().
+    if G.ledger is None or not G.ledger.fresh():
+        return None
+    return G.ledger.position(list(G.order_ids.values()))
+
+def sync_ledger(position):
+    if G.ledger is not None:
+        size, entry, _ = position
+        G.ledger.sync(size, entry, list(G.order_ids.values()))
+    return position
@@ -1,22 +1,99 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import sys
 from datetime import datetime
 from . import globals as G
 
-logging.basicConfig(
-    filename=G.LOG_PATH,
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
-def log_and_print(message: str, level: str = "info"):
-    if level.lower() == "info":
-        logging.info(f"[{G.UNIQUE_KEY}] " + message)
-    elif level.lower() == "warning":
-        logging.warning(f"[{G.UNIQUE_KEY}] " + message)
-    elif level.lower() == "error":
-        logging.error(f"[{G.UNIQUE_KEY}] " + message)
-    elif level.lower() == "debug":
-        logging.debug(f"[{G.UNIQUE_KEY}] " + message)
-    else:
-        logging.info(f"[{G.UNIQUE_KEY}] " + message)
-    print(f"[{G.UNIQUE_KEY}] " + message)
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - [%(bot)s] %(message)s'
+
+logger = logging.getLogger("rebalance_bot")
+logger.propagate = False
+_listener = None
+
+class DailyFileHandler(logging.handlers.RotatingFileHandler):
+    def __init__(self, folder, prefix, max_bytes=0, backup_count=0):
+        self.folder = folder
+        self.prefix = prefix
+        self.day = datetime.now().strftime('%Y%m%d')
+        super().__init__(self.path_for(self.day), maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+
+    def path_for(self, day):
+        return os.path.abspath(os.path.join(self.folder, f"{self.prefix}_{day}.log"))
+
+    def emit(self, record):
+        day = datetime.fromtimestamp(record.created).strftime('%Y%m%d')
+        if day != self.day:
+            self.day = day
+            self.close()
+            self.baseFilename = self.path_for(day)
+        super().emit(record)
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "bot": getattr(record, "bot", None),
+            "tick": getattr(record, "tick", None),
+            "msg": record.getMessage(),
+        }, ensure_ascii=False)
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def setup_logging(level=None, json_lines=None, echo=None, max_bytes=None):
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+    level = LEVELS.get((level or G.LOG_LEVEL).lower(), logging.INFO)
+    json_lines = G.LOG_JSON if json_lines is None else json_lines
+    echo = G.LOG_ECHO if echo is None else echo
+    max_bytes = G.LOG_MAX_BYTES if max_bytes is None else max_bytes
+
+    folder = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", G.LOGS_FOLDER))
+    os.makedirs(folder, exist_ok=True)
+    handlers = [DailyFileHandler(folder, G.LOG_FILE_PREFIX, max_bytes, G.LOG_BACKUP_COUNT)]
+    handlers[0].setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+    if echo:
+        stdout = logging.StreamHandler(sys.stdout)
+        stdout.setFormatter(logging.Formatter('[%(bot)s] %(message)s'))
+        handlers.append(stdout)
+
+    records = queue.SimpleQueue()
+    logger.handlers[:] = [_DeferredQueueHandler(records)]
+    logger.setLevel(level)
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=False)
+    _listener.start()
+
+def start_logging():
+    # Entry points call this; importing the package leaves logging alone.
+    if _listener is None:
+        setup_logging()
+
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def log_and_print(message: str, level: str = "info", *args):
+    levelno = LEVELS.get(level.lower(), logging.INFO)
+    if not logger.isEnabledFor(levelno):
+        return
+    logger.log(levelno, message, *args, extra={"bot": G.UNIQUE_KEY, "tick": G.tick_id})
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,98 @@
+import json
+import os
+from typing import Optional
+from . import globals as G
+from . import clock
+from .logging_utils import log_and_print
+
+# Bump when the cached layout changes; older files are then ignored and rebuilt.
+CACHE_VERSION = 1
+PERPETUAL_SETTLES = ("USD", "USDT", "USDC", "BTC", "ETH")
+
+def is_perpetual(market) -> bool:
+    return market.get("contract") is True and market.get("settle") in PERPETUAL_SETTLES and market.get("swap", False)
+
+def cache_path(exchange_id) -> Optional[str]:
+    if not G.CACHE_FOLDER:
+        return None
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", G.CACHE_FOLDER, f"markets_{exchange_id}.json"))
+
+def uses_market_cache(exchange) -> bool:
+    # Simulated exchanges opt out: their markets are built in memory and
+    # must not leave files behind in bench or backtest runs.
+    return getattr(exchange, "cache_markets", True) and bool(G.CACHE_FOLDER)
+
+def read_market_cache(exchange_id, ttl=None) -> Optional[dict]:
+    ttl = G.MARKET_CACHE_TTL_SECONDS if ttl is None else ttl
+    if cache_path(exchange_id) is None:
+        return None
+    try:
+        with open(cache_path(exchange_id), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != CACHE_VERSION or data.get("exchange") != exchange_id:
+        return None
+    if clock.now() - data.get("saved_at", 0) > ttl:
+        return None
+    return data
+
+def write_market_cache(exchange_id, markets, currencies=None, keep=()):
+    # Only perpetuals (plus any explicitly traded symbol) are kept: the full
+    # Deribit instrument list is mostly options the bot never trades.
+    data = {
+        "version": CACHE_VERSION,
+        "exchange": exchange_id,
+        "saved_at": clock.now(),
+        "perpetuals": sorted(symbol for symbol, market in markets.items() if is_perpetual(market)),
+        "markets": {symbol: market for symbol, market in markets.items() if is_perpetual(market) or symbol in keep},
+        "currencies": currencies or {},
+    }
+    path = cache_path(exchange_id)
+    if path is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp, path)
+    except OSError as e:
+        log_and_print("⚠️ Unable to write market cache %s: %s", "warning", path, e)
+
+def seed_markets(exchange, symbols=()) -> bool:
+    data = read_market_cache(exchange.id) if uses_market_cache(exchange) else None
+    if data is None or any(symbol not in data["markets"] for symbol in symbols):
+        return False
+    exchange.set_markets(data["markets"], data["currencies"] or None)
+    log_and_print("📚 Loaded %s markets for %s from cache", "info", len(data['markets']), exchange.id)
+    return True
+
+def _needs_load(exchange, symbols, reload):
+    return reload or not exchange.markets or any(symbol not in exchange.markets for symbol in symbols)
+
+def ensure_markets(exchange, symbols=(), reload=False) -> dict:
+    if not _needs_load(exchange, symbols, reload):
+        return exchange.markets
+    if not reload and seed_markets(exchange, symbols):
+        return exchange.markets
+    markets = exchange.load_markets(True)
+    if uses_market_cache(exchange):
+        write_market_cache(exchange.id, markets, getattr(exchange, "currencies", None), keep=symbols)
+    return markets
+
+async def ensure_markets_async(exchange, symbols=(), reload=False) -> dict:
+    if not _needs_load(exchange, symbols, reload):
+        return exchange.markets
+    if not reload and seed_markets(exchange, symbols):
+        return exchange.markets
+    markets = await exchange.load_markets(True)
+    if uses_market_cache(exchange):
+        write_market_cache(exchange.id, markets, getattr(exchange, "currencies", None), keep=symbols)
+    return markets
+
+def perpetual_symbols(exchange) -> list:
+    data = read_market_cache(exchange.id) if uses_market_cache(exchange) else None
+    if data is not None:
+        return list(data["perpetuals"])
+    return [symbol for symbol, market in ensure_markets(exchange).items() if is_perpetual(market)]
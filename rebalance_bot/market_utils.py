@@ -1,4 +1,7 @@
+import math
 from . import globals as G
+from .models import RebalancePlan
+from .planner import plan_portfolio, boundary_range
 
 def get_lot_size(exchange) -> float:
     try:
@@ -13,7 +16,71 @@ def get_lot_size(exchange) -> float:
 def deviation(current_short_usd, desired_short_usd, total_usd):
     return (current_short_usd - desired_short_usd) / total_usd if total_usd else 0
 
-def price_range(total_short_usd=None):
-    up = G.REBALANCE_GAP / ((1 - G.SHORT_TARGET_RATIO) - G.REBALANCE_GAP)
-    down = -G.REBALANCE_GAP / ((1 - G.SHORT_TARGET_RATIO) + G.REBALANCE_GAP)
-    return down, up
+def price_range(total_short_usd=None, rebalance_gap=None, short_target_ratio=None):
+    gap = G.REBALANCE_GAP if rebalance_gap is None else rebalance_gap
+    ratio = G.SHORT_TARGET_RATIO if short_target_ratio is None else short_target_ratio
+    return boundary_range(gap, ratio)
+
+# Scalar views of planner.plan_portfolio, which owns the sizing maths.
+
+def rebalance_plan(price, short_usd, lot_size, balance_asset=None, short_target_ratio=None) -> RebalancePlan:
+    balance = G.current_balance_asset if balance_asset is None else balance_asset
+    ratio = G.SHORT_TARGET_RATIO if short_target_ratio is None else short_target_ratio
+    plan = plan_portfolio(price, balance, short_usd, lot_size, 0.0, ratio, math.inf)
+    desired_short_usd = plan.total_usd * ratio
+    return RebalancePlan(
+        total_usd=plan.total_usd,
+        desired_short_usd=desired_short_usd,
+        dev=plan.dev,
+        diff=desired_short_usd - short_usd,
+        leverage=plan.leverage,
+        contracts=plan.contracts,
+    )
+
+def boundary_order_plan(price_now, lot_size, total_short_usd=None, balance_asset=None, short_usd=None,
+                        rebalance_gap=None, short_target_ratio=None):
+    balance = G.current_balance_asset if balance_asset is None else balance_asset
+    short = G.current_short_usd if short_usd is None else short_usd
+    gap = G.REBALANCE_GAP if rebalance_gap is None else rebalance_gap
+    ratio = G.SHORT_TARGET_RATIO if short_target_ratio is None else short_target_ratio
+    plan = plan_portfolio(price_now, balance, short, lot_size, gap, ratio, math.inf)
+    return plan.price_lower, plan.price_upper, plan.contracts_down, plan.contracts_up
+
+def ladder_step(rebalance_gap=None, short_target_ratio=None):
+    # One geometric step for both directions (geometric mean of the up and
+    # down boundaries), so levels stay on a fixed grid as the ladder re-centres.
+    down_pct, up_pct = price_range(None, rebalance_gap, short_target_ratio)
+    return math.sqrt((1 + up_pct) / (1 + down_pct))
+
+def ladder_level(price, anchor, step):
+    return round(math.log(price / anchor) / math.log(step))
+
+def ladder_plan(anchor, center, lot_size, levels, balance_asset=None, short_usd=None,
+                rebalance_gap=None, short_target_ratio=None) -> dict:
+    balance = G.current_balance_asset if balance_asset is None else balance_asset
+    short = G.current_short_usd if short_usd is None else short_usd
+    ratio = G.SHORT_TARGET_RATIO if short_target_ratio is None else short_target_ratio
+    step = ladder_step(rebalance_gap, ratio)
+
+    def price_at(level):
+        return anchor * step ** level
+
+    def target_short(level):
+        return round(balance * price_at(level) * ratio / lot_size) * lot_size
+
+    plan = {}
+    previous = short
+    for k in range(1, levels + 1):
+        target = target_short(center + k)
+        contracts = target - previous
+        if contracts >= lot_size:
+            plan[center + k] = ("sell", price_at(center + k), contracts)
+            previous = target
+    previous = short
+    for k in range(1, levels + 1):
+        target = max(0.0, target_short(center - k))
+        contracts = previous - target
+        if contracts >= lot_size:
+            plan[center - k] = ("buy", price_at(center - k), contracts)
+            previous = target
+    return plan
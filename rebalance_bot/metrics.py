@@ -0,0 +1,228 @@
+import bisect
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from . import globals as G
+from . import clock
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FILL_BUCKETS = (1, 5, 15, 60, 300, 900, 3600, 14400, 86400)
+DRIFT_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (h.buckets, list(h.counts), h.sum, h.count)) for key, h in self._histograms.items())
+        lines, seen = [], set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+def _number(value):
+    return repr(float(value))
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+REGISTRY = Registry()
+REGISTRY.describe("exchange_request_seconds", "Latency of a single exchange request attempt.")
+REGISTRY.describe("exchange_slot_wait_seconds", "Time spent waiting for a rate-limit slot.")
+REGISTRY.describe("exchange_retries_total", "Exchange request attempts that were retried.")
+REGISTRY.describe("exchange_errors_total", "Exchange request errors by exception type.")
+REGISTRY.describe("tick_seconds", "Wall time of one bot tick.")
+REGISTRY.describe("rebalance_ack_seconds", "Time from a rebalance decision to the exchange acknowledging the order.")
+REGISTRY.describe("order_fill_seconds", "Time from order placement to fill, by order kind.")
+REGISTRY.describe("order_amendments_total", "WAITMATCH reprices by outcome (edited, replaced, cancelled, failed).")
+REGISTRY.describe("cancel_sweep_seconds", "Wall time of a cancel-all sweep, routine or kill switch.")
+REGISTRY.describe("cancel_sweep_leftover_total", "Orders that could not be confirmed cancelled before the sweep deadline.")
+REGISTRY.describe("ledger_drift_total", "Position ledger resyncs that found a mismatch with the exchange.")
+REGISTRY.describe("ledger_drift_contracts", "Absolute size of each position ledger mismatch, in contracts.")
+REGISTRY.describe("order_book_gaps_total", "Local order book updates that broke the change_id sequence.")
+REGISTRY.describe("limit_price_source_total", "Limit prices taken from the local order book or a REST snapshot.")
+
+def _bot():
+    return G.UNIQUE_KEY or "default"
+
+def record_request(endpoint, seconds, error=None):
+    REGISTRY.observe("exchange_request_seconds", seconds, endpoint=endpoint)
+    if error is not None:
+        REGISTRY.inc("exchange_errors_total", endpoint=endpoint, error=type(error).__name__)
+
+def record_slot_wait(bucket, seconds):
+    REGISTRY.observe("exchange_slot_wait_seconds", seconds, bucket=bucket)
+
+def record_retry(endpoint):
+    REGISTRY.inc("exchange_retries_total", endpoint=endpoint)
+
+def record_ack(side, seconds):
+    REGISTRY.observe("rebalance_ack_seconds", seconds, bot=_bot(), side=side)
+
+def record_fill(order, kind):
+    if order.created_at is not None:
+        REGISTRY.observe("order_fill_seconds", max(0.0, clock.now() - order.created_at), FILL_BUCKETS,
+                         bot=_bot(), kind=kind)
+
+def record_amend(result):
+    REGISTRY.inc("order_amendments_total", bot=_bot(), result=result)
+
+def record_cancel_sweep(mode, seconds, leftover):
+    REGISTRY.observe("cancel_sweep_seconds", seconds, bot=_bot(), mode=mode)
+    if leftover:
+        REGISTRY.inc("cancel_sweep_leftover_total", leftover, bot=_bot(), mode=mode)
+
+def record_ledger_drift(contracts):
+    REGISTRY.inc("ledger_drift_total", bot=_bot())
+    REGISTRY.observe("ledger_drift_contracts", abs(contracts), DRIFT_BUCKETS, bot=_bot())
+
+def record_book_gap():
+    REGISTRY.inc("order_book_gaps_total", bot=_bot())
+
+def record_price_source(source):
+    REGISTRY.inc("limit_price_source_total", bot=_bot(), source=source)
+
+@contextmanager
+def timed_tick():
+    started = time.perf_counter()
+    profile_path = _take_profile_request()
+    profiler = cProfile.Profile() if profile_path else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(os.path.dirname(profile_path) or ".", exist_ok=True)
+            profiler.dump_stats(profile_path)
+        REGISTRY.observe("tick_seconds", time.perf_counter() - started, bot=_bot())
+
+_profile_lock = threading.Lock()
+_profile_requests = []
+
+def request_profile(path=None):
+    if path is None:
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        folder = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", G.LOGS_FOLDER))
+        path = os.path.join(folder, f"tick_profile_{stamp}.prof")
+    with _profile_lock:
+        _profile_requests.append(path)
+    return path
+
+def _take_profile_request():
+    if not _profile_requests:
+        return None
+    with _profile_lock:
+        return _profile_requests.pop(0) if _profile_requests else None
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, status = REGISTRY.render().encode(), 200
+        elif self.path == "/profile":
+            body, status = f"profiling next tick into {request_profile()}\n".encode(), 200
+        else:
+            body, status = b"not found\n", 404
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MetricsServer:
+    def __init__(self, port, host="127.0.0.1"):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+_server = None
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    global _server
+    port = G.METRICS_PORT if port is None else port
+    if _server is None and port:
+        _server = MetricsServer(port, host).start()
+    return _server
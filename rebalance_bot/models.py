@@ -1,6 +1,9 @@
-from dataclasses import dataclass
+import asyncio
+import threading
+from dataclasses import dataclass, field
 from enum import Enum
 from typing import Optional
+from . import clock
 
 class ProcessState(Enum):
     WAITMATCH = 0
@@ -15,6 +18,97 @@ class BotConfig:
     interval_seconds: int
     max_leverage: float
     initial_asset: float
+    use_user_stream: bool = False
+    use_async_engine: bool = False
+    use_journal: bool = True
+    adaptive_interval: bool = False
+    min_interval_seconds: float = 1.0
+    max_interval_seconds: float = 30.0
+    request_budget: float = 60.0
+    ladder_levels: int = 1
+    cancel_on_disconnect: bool = False
+
+@dataclass
+class RebalancePlan:
+    total_usd: float
+    desired_short_usd: float
+    dev: float
+    diff: float
+    leverage: float
+    contracts: float
+
+@dataclass
+class PortfolioPlan:
+    action: str
+    side: str
+    contracts: float
+    dev: float
+    leverage: float
+    total_usd: float
+    price_lower: float
+    price_upper: float
+    contracts_down: float
+    contracts_up: float
+    balanced: bool
+
+@dataclass
+class PlanBatch:
+    # One NumPy array per field, one row per portfolio (see planner.plan_batch).
+    action: object
+    side: object
+    contracts: object
+    dev: object
+    leverage: object
+    total_usd: object
+    price_lower: object
+    price_upper: object
+    contracts_down: object
+    contracts_up: object
+    balanced: object
+
+    def __len__(self):
+        return len(self.action)
+
+@dataclass
+class BacktestParams:
+    rebalance_gap: float
+    short_target_ratio: float
+    max_leverage: float
+    balance_asset: float = 1.0
+    lot_size: float = 10.0
+    initial_short_usd: float = 0.0
+    fee_rate: float = 0.0
+    drift_cancel: float = 0.001
+
+@dataclass
+class BacktestResult:
+    params: BacktestParams
+    final_equity_asset: float
+    final_equity_usd: float
+    return_pct: float
+    max_drawdown_pct: float
+    mean_abs_deviation: float
+    rebalance_fills: int
+    boundary_fills: int
+    cancels: int
+
+@dataclass
+class BenchResult:
+    scenario: str
+    ticks: int
+    steady_ticks: int
+    tick_ms_p50: float
+    tick_ms_p95: float
+    tick_ms_max: float
+    setup_ms: float
+    shutdown_ms: float
+    calls_per_tick: float
+    steady_calls_max: int
+    calls_by_endpoint: dict
+    fills: int
+    errors: int = 0
+    errors_by_type: dict = field(default_factory=dict)
+    peak_memory_kib: Optional[float] = None
 
 @dataclass
 class OrderStatus:
@@ -25,6 +119,9 @@ class OrderStatus:
     status: str
     filled: float = 0
     average_price: Optional[float] = None
+    created_at: Optional[float] = None
+    level: Optional[int] = None
+    fee: float = 0.0
 
     @staticmethod
     def normalize_status(status: str) -> str:
@@ -49,4 +146,149 @@ class OrderStatus:
             status=cls.normalize_status(order.get("status", "")),
             filled=float(order.get("filled", 0)),
             average_price=order.get("average", order.get("average_price", None)),
+            fee=float((order.get("fee") or {}).get("cost") or 0),
         )
+
+class MarketSnapshot:
+    TTL_SECONDS = {"ticker": 2.0, "book": 1.0, "position": 5.0, "balance": 30.0}
+    TICK_SCOPED = ("ticker", "book", "position")
+
+    def __init__(self):
+        self._entries = {}
+
+    async def get(self, kind, key, loader):
+        # `loader` returns a coroutine; it only runs on a miss.
+        value = self.peek(kind, key)
+        if value is not None:
+            return value
+        value = await loader()
+        self.put(kind, key, value)
+        return value
+
+    def peek(self, kind, key):
+        entry = self._entries.get((kind, key))
+        if entry is not None and clock.monotonic() < entry[0]:
+            return entry[1]
+        return None
+
+    def put(self, kind, key, value, ttl=None):
+        ttl = self.TTL_SECONDS.get(kind, 0) if ttl is None else ttl
+        self._entries[(kind, key)] = (clock.monotonic() + ttl, value)
+
+    def invalidate(self, *kinds):
+        if not kinds:
+            self._entries.clear()
+            return
+        for entry_key in [k for k in self._entries if k[0] in kinds]:
+            del self._entries[entry_key]
+
+    def begin_tick(self, keep=()):
+        self.invalidate(*[k for k in self.TICK_SCOPED if k not in keep])
+
+class WakeSignal:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._waiters = []
+
+    def set(self):
+        self._event.set()
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve_waiter, future)
+
+    def clear(self):
+        self._event.clear()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        return clock.wait(self._event, timeout)
+
+    async def wait_async(self, timeout=None):
+        if self._event.is_set():
+            return True
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._waiters.append((loop, future))
+        if self._event.is_set():
+            return True
+        try:
+            await clock.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+        return self._event.is_set()
+
+def _resolve_waiter(future):
+    if not future.done():
+        future.set_result(True)
+
+@dataclass
+class BotContext:
+    UNIQUE_KEY: Optional[str] = None
+    # Stable across restarts (unlike UNIQUE_KEY); keeps the journal and
+    # recordings of bots sharing a key and symbol apart.
+    BOT_NAME: Optional[str] = None
+    CONFIG_KEY: str = "deribit"
+    SYMBOL_FUTURES: str = "BTC/USD:BTC"
+    SYMBOL: str = "BTC"
+    REBALANCE_GAP: float = 0.01
+    SHORT_TARGET_RATIO: float = 0.5
+    INTERVAL_SECONDS: int = 5
+    MAX_LEVERAGE: float = 1.0
+    USE_USER_STREAM: bool = False
+    USE_ASYNC_ENGINE: bool = False
+    USE_JOURNAL: bool = True
+    ADAPTIVE_INTERVAL: bool = False
+    MIN_INTERVAL_SECONDS: float = 1.0
+    MAX_INTERVAL_SECONDS: float = 30.0
+    REQUEST_BUDGET: float = 60.0
+    LADDER_LEVELS: int = 1
+    CANCEL_ON_DISCONNECT: bool = False
+    parameter_file: Optional[str] = None
+    tick_deadline: Optional[float] = None
+    tick_id: int = 0
+    tick_requests: int = 0
+    tick_scheduler: object = None
+    config_watcher: object = None
+
+    order_ids: dict = field(default_factory=dict)
+    order_sync_cursor: Optional[int] = None
+    state: ProcessState = ProcessState.REBALANCING
+    initial_balance_asset: float = 0.0
+    current_balance_asset: float = 0.0
+    initial_short_usd: float = 0.0
+    current_short_usd: float = 0.0
+    snapshot: MarketSnapshot = field(default_factory=MarketSnapshot)
+    user_stream: object = None
+    wake_event: WakeSignal = field(default_factory=WakeSignal)
+    journal: object = None
+    ledger: object = None
+    order_book: object = None
+    recorder: object = None
+    ladder_anchor: Optional[float] = None
+    ladder_center: Optional[int] = None
+
+@dataclass
+class JournalState:
+    orders: dict = field(default_factory=dict)
+    state: Optional[ProcessState] = None
+    order_sync_cursor: Optional[int] = None
+    initial_balance_asset: Optional[float] = None
+    initial_short_usd: Optional[float] = None
+    ladder_anchor: Optional[float] = None
+    ladder_center: Optional[int] = None
+
+@dataclass
+class BotSpec:
+    config: BotConfig
+    config_key: str = "deribit"
+    parameter_file: Optional[str] = None
+    name: Optional[str] = None
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import uuid
+import configparser
+import aiohttp
+from .logging_utils import log_and_print, start_logging
+from . import globals as G
+from .models import BotContext, BotSpec
+from .exchange_client import load_config, connect_exchange_async
+from .market_cache import ensure_markets_async
+from .runner import load_config_from_file, update_config_from_file, run_bot_async
+
+class ExchangePool:
+    def __init__(self):
+        self._exchanges = {}
+        self._markets = {}
+        self._session = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, config_key):
+        async with self._lock:
+            if config_key in self._exchanges:
+                return self._exchanges[config_key]
+            if self._session is None:
+                self._session = aiohttp.ClientSession()
+            api_key, api_secret = load_config(config_key)
+            ex = connect_exchange_async(api_key, api_secret, session=self._session)
+            shared = self._markets.get(ex.id)
+            if shared is None:
+                await ensure_markets_async(ex)
+                self._markets[ex.id] = (ex.markets, ex.currencies)
+                log_and_print("📚 Sharing %s markets for %s across bots", "info", len(ex.markets), ex.id)
+            else:
+                ex.set_markets(*shared)
+            self._exchanges[config_key] = ex
+            return ex
+
+    async def close(self):
+        for ex in self._exchanges.values():
+            await ex.close()
+        self._exchanges.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+def load_bot_spec(path) -> BotSpec:
+    parser = configparser.ConfigParser()
+    parser.read(path)
+    section = parser['bot'] if 'bot' in parser else {}
+    config_key = section.get('config_key', G.CONFIG_KEY)
+    name = section.get('bot_name') or os.path.splitext(os.path.basename(path))[0]
+    return BotSpec(config=load_config_from_file(path), config_key=config_key, parameter_file=path, name=name)
+
+async def _run_spec(spec: BotSpec, pool: ExchangePool):
+    token = G.use_context(BotContext(CONFIG_KEY=spec.config_key, BOT_NAME=spec.name, parameter_file=spec.parameter_file))
+    G.UNIQUE_KEY = uuid.uuid4().hex[:8]
+    try:
+        update_config_from_file(spec.config)
+        ex = await pool.acquire(spec.config_key)
+        log_and_print("🤖 Bot starting on %s/%s", "info", spec.config_key, G.SYMBOL_FUTURES)
+        await run_bot_async(ex)
+    except SystemExit as e:
+        raise RuntimeError(f"bot exited with code {e.code}") from None
+    finally:
+        G.reset_context(token)
+
+def _check_unique(specs):
+    # Bots with the same key, symbol and name would share a journal and a
+    # recording folder, and resume each other's orders.
+    seen = set()
+    for spec in specs:
+        key = (spec.config_key, spec.config.symbol_futures, spec.name)
+        if key in seen:
+            raise ValueError(f"two bots share config key, symbol and name {key}; set bot_name in their parameter files")
+        seen.add(key)
+
+async def run_bots_async(specs):
+    _check_unique(specs)
+    pool = ExchangePool()
+    tasks = [asyncio.create_task(_run_spec(spec, pool), name=f"bot-{i}") for i, spec in enumerate(specs)]
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for spec, result in zip(specs, results):
+            if isinstance(result, BaseException):
+                log_and_print("❌ Bot %s/%s stopped: %r", "error", spec.config_key, spec.config.symbol_futures, result)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await pool.close()
+
+def run_bots(specs):
+    start_logging()
+    try:
+        asyncio.run(run_bots_async(specs))
+    except KeyboardInterrupt:
+        log_and_print("🛑 Multi-bot runtime stopped by user.", "info")
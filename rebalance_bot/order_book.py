@@ -0,0 +1,112 @@
+import bisect
+import threading
+from .logging_utils import log_and_print
+from . import globals as G
+from . import clock
+from . import metrics
+
+class LocalOrderBook:
+    # L2 replica of one instrument fed by Deribit `book.<instrument>.raw`
+    # notifications: a snapshot, then changes chained by change_id /
+    # prev_change_id. Amounts are kept per price in a dict and prices in a
+    # sorted list per side, so best bid/ask and depth at a price are O(1)
+    # reads. A broken chain clears the book until the next snapshot.
+    def __init__(self, instrument, stale_seconds=None):
+        self.instrument = instrument
+        self.stale_seconds = G.BOOK_STALE_SECONDS if stale_seconds is None else stale_seconds
+        self.change_id = None
+        self.updated_at = None
+        self.gaps = 0
+        self._levels = {"bids": {}, "asks": {}}
+        self._prices = {"bids": [], "asks": []}
+        self._lock = threading.Lock()
+
+    def _set(self, side, price, amount):
+        levels, prices = self._levels[side], self._prices[side]
+        if amount > 0:
+            if price not in levels:
+                bisect.insort(prices, price)
+            levels[price] = amount
+        elif levels.pop(price, None) is not None:
+            del prices[bisect.bisect_left(prices, price)]
+
+    def _clear(self):
+        for side in ("bids", "asks"):
+            self._levels[side].clear()
+            self._prices[side].clear()
+        self.change_id = None
+
+    def apply(self, data) -> bool:
+        # Returns False when the update does not follow the last one applied;
+        # the caller should then resubscribe to get a fresh snapshot.
+        with self._lock:
+            if data.get("type") == "snapshot":
+                self._clear()
+            elif self.change_id is None or data.get("prev_change_id") != self.change_id:
+                if self.change_id is not None:
+                    self.gaps += 1
+                    metrics.record_book_gap()
+                    log_and_print("⚠️ Order book gap on %s: expected %s, got %s. Waiting for a snapshot...", "warning", self.instrument, self.change_id, data.get('prev_change_id'))
+                self._clear()
+                self.updated_at = None
+                return False
+            for side in ("bids", "asks"):
+                for _, price, amount in data.get(side, ()):
+                    self._set(side, float(price), float(amount))
+            self.change_id = data.get("change_id")
+            self.updated_at = clock.monotonic()
+            return True
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+            self.updated_at = None
+
+    def fresh(self, now=None) -> bool:
+        now = clock.monotonic() if now is None else now
+        return self.updated_at is not None and now - self.updated_at < self.stale_seconds
+
+    def best_bid(self):
+        with self._lock:
+            prices = self._prices["bids"]
+            return prices[-1] if prices else None
+
+    def best_ask(self):
+        with self._lock:
+            prices = self._prices["asks"]
+            return prices[0] if prices else None
+
+    def best(self, side):
+        return self.best_bid() if side.lower() == "buy" else self.best_ask()
+
+    def depth_at(self, side, price) -> float:
+        levels = self._levels["bids" if side.lower() == "buy" else "asks"]
+        return levels.get(float(price), 0.0)
+
+    def top(self, levels=1) -> dict:
+        # ccxt-shaped view of the first levels, for callers that want one.
+        with self._lock:
+            bids = [[p, self._levels["bids"][p]] for p in reversed(self._prices["bids"][-levels:])]
+            asks = [[p, self._levels["asks"][p]] for p in self._prices["asks"][:levels]]
+        return {"symbol": G.SYMBOL_FUTURES, "bids": bids, "asks": asks}
+
+def open_order_book(instrument):
+    G.order_book = LocalOrderBook(instrument)
+    return G.order_book
+
+def book_price(side):
+    # Best price from the local replica, or None when it is missing or too
+    # old to trust; callers then fall back to a REST snapshot.
+    book = G.order_book
+    if book is None or not book.fresh():
+        return None
+    return book.best(side)
+
+def replay(book, messages) -> int:
+    # Feeds recorded (or simulated) book notifications into `book` and
+    # returns how many of them were rejected as out of sequence.
+    rejected = 0
+    for data in messages:
+        if not book.apply(data):
+            rejected += 1
+    return rejected
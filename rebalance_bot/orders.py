@@ -1,155 +1,201 @@
-import ccxt
-import math
+from .lazy import lazy_import
+import time
 from .logging_utils import log_and_print
 from . import globals as G
-from .models import OrderStatus, ProcessState
-from .exchange_client import retry_ccxt, get_futures_position
-from .market_utils import price_range, get_lot_size
+from . import metrics
+from .models import ProcessState, PortfolioPlan
+from .market_utils import get_lot_size
+from .planner import plan_portfolio
+from .exchange_client import retry_ccxt, get_price, get_futures_position, get_limit_price, limit_order_params, limit_order_method, is_cancelled
+from .reconcile import track_order, untrack_order, reconcile_orders, reconcile_unverified, apply_amended_order
+from .ladder import ladder_enabled, adjust_ladder
+from .kill_switch import cancel_open_orders, cancel_order, untrack_cancelled
+from .transport import gather
 
-@retry_ccxt()
-def cancel_all_orders(exchange):
+ccxt = lazy_import("ccxt")
+
+async def cancel_all_orders(exchange):
     log_and_print("🗑️ Cancelling all open orders...", "info")
     try:
-        if not G.order_ids:
-            log_and_print("🔕 No tracked open orders. Attempting exchange-wide cancel for safety...", "info")
-            try:
-               retry_ccxt()(exchange.cancel_all_orders)(G.SYMBOL_FUTURES)
-            except Exception as ee:
-                log_and_print(f"⚠️ Exchange-wide cancel failed: {ee}", "warning")
-            return
-        remaining_orders = []
-        for order_id in G.order_ids:
-            try:
-                result = retry_ccxt()(exchange.cancel_order)(order_id.order_id, G.SYMBOL_FUTURES)
-                status = (result or {}).get("status", "").lower()
-                if status not in ["canceled", "cancelled"]:
-                    remaining_orders.append(order_id)
-                else:
-                    log_and_print(f"🗑️ Cancelled order {order_id.order_id}", "info")
-            except ccxt.NetworkError as ne:
-                log_and_print(f"🌐 Network error while cancelling order {order_id.order_id}: {ne}", "warning")
-                remaining_orders.append(order_id)
-            except Exception as e:
-                log_and_print(f"⚠️ Failed to cancel order {order_id.order_id}: {e}", "error")
-                remaining_orders.append(order_id)
-        G.order_ids = remaining_orders
-        log_and_print("✅ All open orders processed and cleaned.", "info")
+        await cancel_open_orders(exchange)
     except Exception as e:
-        log_and_print(f"⚠️ Error cancelling orders: {e}", "error")
+        log_and_print("⚠️ Error cancelling orders: %s", "error", e)
+
+def log_boundary_plan(price_now, plan: PortfolioPlan):
+    log_and_print("[BOUNDARY] Placing boundary orders | dev=%.4f", "info", plan.dev)
+    log_and_print("[BOUNDARY] Price now: %.2f, Down pct: %.4f, Up pct: %.4f", "info", price_now, plan.price_lower / price_now - 1, plan.price_upper / price_now - 1)
 
-def place_boundary_orders(exchange, price_now, total_short_usd, dev):
-    log_and_print(f"[BOUNDARY] Placing boundary orders | dev={dev:.4f}", "info")
-    lot_size = get_lot_size(exchange)
-    down_pct, up_pct = price_range(total_short_usd)
-    log_and_print(f"[BOUNDARY] Price now: {price_now:.2f}, Down pct: {down_pct:.4f}, Up pct: {up_pct:.4f}", "info")
+def boundary_legs(plan: PortfolioPlan) -> list:
+    # (side, contracts, price, label) for the upper sell and the lower buy.
+    return [("sell", plan.contracts_up, plan.price_upper, "UPPER"), ("buy", plan.contracts_down, plan.price_lower, "LOWER")]
 
-    price_lower = price_now * (1 + down_pct)
-    price_upper = price_now * (1 + up_pct)
+def boundary_placed(plan: PortfolioPlan, decided_at):
+    G.snapshot.invalidate("book")
+    log_and_print("Placed boundary orders: UP %s @ %.2f, DOWN %s @ %.2f | decision→both legs resting: %.0f ms", "info",
+                  plan.contracts_up, plan.price_upper, plan.contracts_down, plan.price_lower, (time.perf_counter() - decided_at) * 1000)
+    G.state = ProcessState.WAITMATCHPRE
 
-    short_amt, entry, _ = get_futures_position(exchange)
-    short_assets = abs(short_amt) / entry if entry > 0 else 0
-    log_and_print(f"[BOUNDARY] Current short {G.SYMBOL}: {short_assets:.6f} at entry price {entry:.2f}", "info")
+def boundary_failed(error, placed):
+    log_and_print("❌ Error placing boundary orders: %s. Cancelling %s placed leg(s)...", "error", error, len(placed))
+    G.state = ProcessState.REBALANCING
+
+async def _place_leg(exchange, side, contracts, price, label):
+    order = track_order(await retry_ccxt()(limit_order_method(exchange, side))(G.SYMBOL_FUTURES, contracts, price, limit_order_params(side)))
+    log_and_print("[%s] %s %s amount at %.2f", "info", label, side.capitalize(), contracts, price)
+    return order
+
+async def place_boundary_orders(exchange, price_now, plan: PortfolioPlan, decided_at=None):
+    decided_at = decided_at or time.perf_counter()
+    log_boundary_plan(price_now, plan)
+    if plan.action != "boundary":
+        G.state = ProcessState.REBALANCING
+        return
 
-    total_port_up = G.current_balance_asset * price_upper
-    desired_short_up = total_port_up * G.SHORT_TARGET_RATIO
-    diff_up = desired_short_up - G.current_short_usd
+    results = await gather(*[_place_leg(exchange, *leg) for leg in boundary_legs(plan)], return_exceptions=True)
+    placed = [order for order in results if not isinstance(order, BaseException)]
+    failed = [error for error in results if isinstance(error, BaseException)]
+    if failed:
+        boundary_failed(failed[0], placed)
+        await gather(*[cancel_order(exchange, order) for order in placed])
+        return
+    boundary_placed(plan, decided_at)
 
-    total_port_down = G.current_balance_asset * price_lower
-    desired_short_down = total_port_down * G.SHORT_TARGET_RATIO
-    diff_down = desired_short_down - G.current_short_usd
+def amend_contracts(order, price, short_amt, lot_size):
+    # The order was sized when it was placed. Re-plan from the current price
+    # and position before repricing: returns the new total size, or None when
+    # the order is no longer needed and should be cancelled instead.
+    G.current_short_usd = abs(short_amt)
+    plan = plan_portfolio(price, G.current_balance_asset, G.current_short_usd, lot_size,
+                          G.REBALANCE_GAP, G.SHORT_TARGET_RATIO, G.MAX_LEVERAGE)
+    if plan.action != "rebalance" or plan.side != order.side.lower():
+        log_and_print("🔕 Order %s no longer needed (deviation %.2f%%, %s). Cancelling instead of repricing.", "info",
+                      order.order_id, plan.dev * 100, plan.action)
+        metrics.record_amend("cancelled")
+        return None
+    return order.filled + plan.contracts
 
-    contracts_up = abs(math.floor(abs(diff_up) / lot_size) * lot_size)
-    contracts_down = abs(math.ceil(abs(diff_down) / lot_size) * lot_size)
+def amended(order, result, price, contracts):
+    old_price = order.price
+    apply_amended_order(order, result, price, contracts)
+    G.snapshot.invalidate("book")
+    metrics.record_amend("edited")
+    log_and_print("✏️ Repriced order %s from %.2f to %.2f", "info", order.order_id, old_price, order.price)
 
-    if contracts_up >= lot_size and contracts_down >= lot_size:
+def replaced(order, replacement, price):
+    G.snapshot.invalidate("book")
+    track_order(replacement)
+    metrics.record_amend("replaced")
+    log_and_print("🔁 Replaced order %s with %s at %.2f", "info", order.order_id, replacement.get('id'), price)
+
+def amend_failed(order, error, action="amend"):
+    log_and_print("⚠️ Failed to %s order %s: %s", "warning", action, order.order_id, error)
+    metrics.record_amend("failed")
+
+async def amend_order(exchange, order) -> bool:
+    side = order.side.lower()
+    price, (short_amt, _, _) = await gather(get_limit_price(exchange, side), get_futures_position(exchange))
+    if not price:
+        return False
+    contracts = amend_contracts(order, price, short_amt, get_lot_size(exchange))
+    if contracts is None:
+        return False
+    if exchange.has.get("editOrder"):
         try:
-            order = retry_ccxt()(exchange.create_limit_sell_order)(G.SYMBOL_FUTURES, contracts_up, price_upper, {"post_only": True})
-            try:
-                verified_order = retry_ccxt()(exchange.fetch_order)(order['id'], G.SYMBOL_FUTURES)
-                G.order_ids.append(OrderStatus.from_ccxt_order(verified_order))
-            except Exception:
-                G.order_ids.append(OrderStatus.from_ccxt_order(order))
-            log_and_print(f"[UPPER] Sell {contracts_up} amount at {price_upper:.2f}", "info")
-
-            order = retry_ccxt()(exchange.create_limit_buy_order)(G.SYMBOL_FUTURES, contracts_down, price_lower, {"post_only": True, "reduce_only": True})
-            try:
-                verified_order = retry_ccxt()(exchange.fetch_order)(order['id'], G.SYMBOL_FUTURES)
-                G.order_ids.append(OrderStatus.from_ccxt_order(verified_order))
-            except Exception:
-                G.order_ids.append(OrderStatus.from_ccxt_order(order))
-            log_and_print(f"[LOWER] Buy {contracts_down} amount at {price_lower:.2f}", "info")
-
-            log_and_print(
-                f"Placed boundary orders: UP {contracts_up} @ {price_upper:.2f}, DOWN {contracts_down} @ {price_lower:.2f}",
-                "info",
-            )
-            G.state = ProcessState.WAITMATCHPRE
+            amended(order, await retry_ccxt()(exchange.edit_order)(order.order_id, G.SYMBOL_FUTURES, "limit", side, contracts, price, limit_order_params(side)), price, contracts)
+            return True
+        except ccxt.OrderNotFound:
+            log_and_print("⚠️ Order %s no longer open. Reconciling next tick.", "warning", order.order_id)
+            return True
+        except ccxt.NotSupported:
+            pass
         except Exception as e:
-            log_and_print(f"❌ Error placing boundary orders: {str(e)}", "error")
-    else:
-        G.state = ProcessState.REBALANCING
+            amend_failed(order, e)
+            return False
+    try:
+        result = await retry_ccxt()(exchange.cancel_order)(order.order_id, G.SYMBOL_FUTURES)
+        if not is_cancelled(result):
+            return False
+        untrack_cancelled(order.order_id, result)
+        replaced(order, await retry_ccxt()(limit_order_method(exchange, side))(G.SYMBOL_FUTURES, contracts - order.filled, price, limit_order_params(side)), price)
+        return True
+    except Exception as e:
+        amend_failed(order, e, "replace")
+        return False
 
-def handle_order_status(exchange):
+def settle_orders():
+    # Logs and untracks the orders that filled or were cancelled since the
+    # last tick; the engines then refresh the position and decide what next.
+    filled_orders = [o for o in G.order_ids.values() if o.status == "FILLED"]
+    cancelled_orders = [o for o in G.order_ids.values() if o.status == "CANCELLED"]
+    for filled in filled_orders:
+        log_and_print("✅ Order %s filled: %s at %.2f", "info", filled.order_id, filled.contracts, filled.price)
+        metrics.record_fill(filled, "boundary" if G.state == ProcessState.WAITMATCHPRE else "rebalance")
+        untrack_order(filled.order_id)
+    for cancelled in cancelled_orders:
+        log_and_print("❌ Order %s cancelled: %s at %.2f", "info", cancelled.order_id, cancelled.contracts, cancelled.price)
+        untrack_order(cancelled.order_id)
+    return filled_orders, cancelled_orders
+
+def log_balance():
+    log_and_print("💰 Updated balance: %s=%.6f ShortUSD=%.2f", "info", G.SYMBOL, G.current_balance_asset, G.current_short_usd)
+
+def settled_to_rebalance():
+    if not G.order_ids:
+        log_and_print("🔕 All orders cancelled, rebalancing...", "info")
+    G.state = ProcessState.REBALANCING
+
+def waiting_order():
+    if G.state != ProcessState.WAITMATCH:
+        return None
+    return next((o for o in G.order_ids.values() if o.status == "OPEN"), None)
+
+def reprice_needed(order, price) -> bool:
+    diff_price = abs(order.price - price)
+    log_and_print("Current price: %.2f, Order price: %.2f, Difference: %.4f", "debug", price, order.price, diff_price)
+    if diff_price <= (0.001 * price):
+        log_and_print("⏳ Waiting for orders to fill...", "debug")
+        return False
+    return True
+
+def gave_up_waiting():
+    log_and_print("🔕 No filled orders, cancelling all open orders.", "info")
+    G.state = ProcessState.REBALANCING
+
+async def handle_order_status(exchange):
+    streaming = G.user_stream is not None and G.user_stream.is_live()
     try:
-        for order in G.order_ids:
-            try:
-                data = retry_ccxt()(exchange.fetch_order)(order.order_id, G.SYMBOL_FUTURES)
-                order.status = OrderStatus.normalize_status(data['status'])
-                order.filled = float(data.get('filled', 0))
-                avg_price = data.get('average') or data.get('average_price')
-                order.average_price = float(avg_price) if avg_price is not None else None
-            except ccxt.OrderNotFound:
-                log_and_print(f"⚠️ Order {order.order_id} not found.", "warning")
-            except Exception as e:
-                log_and_print(f"❌ Error fetching order {order.order_id}: {str(e)}", "error")
-
-        filled_orders = [o for o in G.order_ids if o.status == "FILLED"]
-        for filled in filled_orders:
-            log_and_print(f"✅ Order {filled.order_id} filled: {filled.contracts} at {filled.price:.2f}", "info")
-            try:
-                pos_size, _, _ = get_futures_position(exchange)
-                G.current_short_usd = abs(pos_size)
-            except Exception as e:
-                log_and_print(f"⚠️ Unable to refresh position after fill: {e}", "warning")
-            log_and_print(f"💰 Updated balance: {G.SYMBOL}={G.current_balance_asset:.6f} ShortUSD={G.current_short_usd:.2f}", "info")
-            G.order_ids.remove(filled)
-        if filled_orders:
-            G.state = ProcessState.REBALANCING
-            cancel_all_orders(exchange)
-            return
+        try:
+            if streaming:
+                # REST stays the safety net for orders the stream has not
+                # reported; positions are then refreshed over REST as well.
+                streaming = not await reconcile_unverified(exchange, G.user_stream)
+            else:
+                await reconcile_orders(exchange)
+        except Exception as e:
+            log_and_print("❌ Error reconciling orders: %s", "error", e)
 
-        cancelled_orders = [o for o in G.order_ids if o.status == "CANCELLED"]
-        for cancelled in cancelled_orders:
-            log_and_print(f"❌ Order {cancelled.order_id} cancelled: {cancelled.contracts} at {cancelled.price:.2f}", "info")
-            G.order_ids.remove(cancelled)
-        if cancelled_orders:
-            try:
-                pos_size, _, _ = get_futures_position(exchange)
+        filled_orders, cancelled_orders = settle_orders()
+        if filled_orders or cancelled_orders:
+            if not streaming:
+                G.snapshot.invalidate("position", "balance")
+                pos_size, _, _ = await get_futures_position(exchange)
                 G.current_short_usd = abs(pos_size)
-            except Exception as e:
-                log_and_print(f"⚠️ Unable to refresh position after cancellations: {e}", "warning")
-            if not G.order_ids:
-                log_and_print("🔕 All orders cancelled, rebalancing...", "info")
-            G.state = ProcessState.REBALANCING
-            cancel_all_orders(exchange)
+            log_balance()
+            if ladder_enabled() and G.state == ProcessState.WAITMATCHPRE and await adjust_ladder(exchange, filled_orders):
+                return
+            settled_to_rebalance()
+            await cancel_all_orders(exchange)
             return
 
-        if G.state == ProcessState.WAITMATCH:
-            open_order = next((o for o in G.order_ids if o.status == "OPEN"), None)
-            if open_order:
-                from .exchange_client import get_price
-                price = get_price(exchange)
-                if not price or price <= 0:
-                    log_and_print("⚠️ Invalid price received while checking open orders.", "warning")
-                    return
-                diff_price = abs(open_order.price - price)
-                log_and_print(f"Current price: {price:.2f}, Order price: {open_order.price:.2f}, Difference: {diff_price:.4f}", "info")
-                if price > 0 and diff_price <= (0.001 * price):
-                    log_and_print("⏳ Waiting for orders to fill...", "info")
-                else:
-                    cancel_all_orders(exchange)
-                    log_and_print("🔕 No filled orders, cancelling all open orders.", "info")
-                    G.state = ProcessState.REBALANCING
-        log_and_print(f"[SETUP] {G.SYMBOL} Balance: {G.current_balance_asset:.6f}, Initial Short USD: {G.current_short_usd:.2f}", "info")
+        open_order = waiting_order()
+        if open_order:
+            price = await get_price(exchange)
+            if not price or price <= 0:
+                log_and_print("⚠️ Invalid price received while checking open orders.", "warning")
+                return
+            if reprice_needed(open_order, price) and not await amend_order(exchange, open_order):
+                await cancel_all_orders(exchange)
+                gave_up_waiting()
+        log_and_print("[SETUP] %s Balance: %.6f, Initial Short USD: %.2f", "debug", G.SYMBOL, G.current_balance_asset, G.current_short_usd)
     except Exception as e:
-        log_and_print(f"❌ Order status error: {str(e)}", "error")
+        log_and_print("❌ Order status error: %s", "error", e)
@@ -0,0 +1,129 @@
+import math
+from .lazy import lazy_import
+from .models import PlanBatch, PortfolioPlan
+
+np = lazy_import("numpy")
+
+REBALANCE = 0
+BOUNDARY = 1
+SKIP_LEVERAGE = 2
+SKIP_MIN_LOT = 3
+ACTIONS = ("rebalance", "boundary", "skip_leverage", "skip_min_lot")
+
+def _array(value):
+    return np.asarray(value, dtype=float)
+
+class _Arrays:
+    # Element-wise operations for a batch of portfolios.
+    @staticmethod
+    def div(a, b, default):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(b != 0, a / b, default)
+
+    abs = staticmethod(lambda x: np.abs(x))
+    floor = staticmethod(lambda x: np.floor(x))
+    ceil = staticmethod(lambda x: np.ceil(x))
+    round = staticmethod(lambda x: np.round(x))
+    maximum = staticmethod(lambda a, b: np.maximum(a, b))
+    not_ = staticmethod(lambda x: ~x)
+    where = staticmethod(lambda cond, a, b: np.where(cond, a, b))
+    select = staticmethod(lambda conds, choices, default: np.select(conds, choices, default))
+
+class _Scalars:
+    # The same operations on plain floats: one portfolio without the NumPy
+    # call overhead, for the bot's tick and the backtest's event loop.
+    @staticmethod
+    def div(a, b, default):
+        return a / b if b != 0 else default
+
+    abs = staticmethod(abs)
+    floor = staticmethod(lambda x: float(math.floor(x)))
+    ceil = staticmethod(lambda x: float(math.ceil(x)))
+    round = staticmethod(lambda x: float(round(x)))
+    maximum = staticmethod(max)
+    not_ = staticmethod(lambda x: not x)
+    where = staticmethod(lambda cond, a, b: a if cond else b)
+    select = staticmethod(lambda conds, choices, default: next((c for cond, c in zip(conds, choices) if cond), default))
+
+def boundary_range(rebalance_gap, short_target_ratio):
+    # Relative moves (down, up) at which the deviation reaches the gap.
+    # Works on scalars and arrays alike.
+    down = -rebalance_gap / ((1 - short_target_ratio) + rebalance_gap)
+    up = rebalance_gap / ((1 - short_target_ratio) - rebalance_gap)
+    return down, up
+
+def _plan(price, balance, short, lot, gap, ratio, max_lev, ops) -> dict:
+    # The sizing rules, written once for both backends. rebalance(), the
+    # amend path, the backtest and the scalar helpers in market_utils all go
+    # through here, without touching globals or the exchange.
+    total_usd = balance * price
+    diff = total_usd * ratio - short
+    dev = ops.div(-diff, total_usd, 0.0)
+    leverage = ops.div(ops.abs(short + diff), total_usd, math.inf)
+    contracts = ops.maximum(lot, ops.round(ops.abs(diff) / lot) * lot)
+
+    down_pct, up_pct = boundary_range(gap, ratio)
+    price_lower = price * (1 + down_pct)
+    price_upper = price * (1 + up_pct)
+    contracts_up = ops.floor(ops.abs(balance * price_upper * ratio - short) / lot) * lot
+    contracts_down = ops.ceil(ops.abs(balance * price_lower * ratio - short) / lot) * lot
+
+    balanced = ops.abs(dev) <= gap
+    action = ops.select(
+        [ops.not_(balanced) & (leverage > max_lev), ops.not_(balanced) & (contracts >= lot),
+         balanced & (contracts_up >= lot) & (contracts_down >= lot)],
+        [SKIP_LEVERAGE, REBALANCE, BOUNDARY],
+        SKIP_MIN_LOT,
+    )
+    return dict(
+        action=action,
+        side=ops.where(diff > 0, "sell", "buy"),
+        contracts=contracts,
+        dev=dev,
+        leverage=leverage,
+        total_usd=total_usd,
+        price_lower=price_lower,
+        price_upper=price_upper,
+        contracts_down=contracts_down,
+        contracts_up=contracts_up,
+        balanced=balanced,
+    )
+
+def plan_batch(prices, balances, shorts, lot_sizes, rebalance_gap, short_target_ratio, max_leverage) -> PlanBatch:
+    # Every argument is a scalar or an array and they broadcast against each
+    # other, one row per portfolio.
+    arrays = np.broadcast_arrays(
+        *map(_array, (prices, balances, shorts, lot_sizes, rebalance_gap, short_target_ratio, max_leverage))
+    )
+    return PlanBatch(**_plan(*arrays, _Arrays))
+
+def plan_row(batch: PlanBatch, i=0) -> PortfolioPlan:
+    return PortfolioPlan(
+        action=ACTIONS[int(batch.action[i])],
+        side=str(batch.side[i]),
+        contracts=float(batch.contracts[i]),
+        dev=float(batch.dev[i]),
+        leverage=float(batch.leverage[i]),
+        total_usd=float(batch.total_usd[i]),
+        price_lower=float(batch.price_lower[i]),
+        price_upper=float(batch.price_upper[i]),
+        contracts_down=float(batch.contracts_down[i]),
+        contracts_up=float(batch.contracts_up[i]),
+        balanced=bool(batch.balanced[i]),
+    )
+
+def plan_portfolio(price, balance, short_usd, lot_size, rebalance_gap, short_target_ratio, max_leverage) -> PortfolioPlan:
+    plan = _plan(*map(float, (price, balance, short_usd, lot_size, rebalance_gap, short_target_ratio, max_leverage)), _Scalars)
+    return PortfolioPlan(
+        action=ACTIONS[plan["action"]],
+        side=plan["side"],
+        contracts=plan["contracts"],
+        dev=plan["dev"],
+        leverage=plan["leverage"],
+        total_usd=plan["total_usd"],
+        price_lower=plan["price_lower"],
+        price_upper=plan["price_upper"],
+        contracts_down=plan["contracts_down"],
+        contracts_up=plan["contracts_up"],
+        balanced=plan["balanced"],
+    )
@@ -1,12 +1,46 @@
 from .logging_utils import log_and_print
 from . import globals as G
-from .exchange_client import get_target_symbol_balance, get_futures_position
+from .exchange_client import get_target_symbol_balance, get_futures_position, retry_ccxt
 from .orders import cancel_all_orders
+from .reconcile import reconcile_orders
+from .journal import restore_from_journal, discard_restored, untracked_open_orders
+from .rate_limit import PRIORITY_CANCEL
+from .market_utils import get_lot_size
+from .ledger import open_ledger
+from .transport import gather
 
-def setup_portfolio(exchange):
-    cancel_all_orders(exchange)
-    symbol_assets = get_target_symbol_balance(exchange, G.SYMBOL)
-    G.initial_balance_asset = G.current_balance_asset = symbol_assets
-    short_amt, _, _ = get_futures_position(exchange)
-    G.initial_short_usd = G.current_short_usd = abs(short_amt)
-    log_and_print(f"[SETUP] Initial {G.SYMBOL} Balance: {G.initial_balance_asset:.6f}, Initial Short USD: {G.initial_short_usd:.2f}", "info")
+async def _cancel_untracked(exchange, data):
+    log_and_print("🗑️ Cancelling untracked open order %s", "warning", data.get('id'))
+    try:
+        await retry_ccxt(priority=PRIORITY_CANCEL)(exchange.cancel_order)(data.get("id"), G.SYMBOL_FUTURES)
+    except Exception as e:
+        log_and_print("⚠️ Failed to cancel untracked order %s: %s", "error", data.get('id'), e)
+
+async def resume_portfolio(exchange) -> bool:
+    if not restore_from_journal():
+        return False
+    log_and_print("♻️ Resuming %s journaled order(s) in state %s...", "info", len(G.order_ids), G.state.name)
+    try:
+        open_orders = await retry_ccxt()(exchange.fetch_open_orders)(G.SYMBOL_FUTURES)
+        await gather(*[_cancel_untracked(exchange, data) for data in untracked_open_orders(open_orders)])
+        await reconcile_orders(exchange, open_orders)
+    except Exception as e:
+        log_and_print("⚠️ Unable to reconcile journaled orders: %s. Starting fresh...", "warning", e)
+        discard_restored()
+        return False
+    G.current_balance_asset, (short_amt, _, _) = await gather(get_target_symbol_balance(exchange, G.SYMBOL), get_futures_position(exchange))
+    G.current_short_usd = abs(short_amt)
+    resting = sum(1 for o in G.order_ids.values() if o.status in ("OPEN", "PARTIAL"))
+    log_and_print("[RESUME] %s order(s) still resting. %s Balance: %.6f, Short USD: %.2f", "info", resting, G.SYMBOL, G.current_balance_asset, G.current_short_usd)
+    return True
+
+async def setup_portfolio(exchange):
+    open_ledger(get_lot_size(exchange))
+    if not await resume_portfolio(exchange):
+        await cancel_all_orders(exchange)
+        symbol_assets, (short_amt, _, _) = await gather(get_target_symbol_balance(exchange, G.SYMBOL), get_futures_position(exchange))
+        G.initial_balance_asset = G.current_balance_asset = symbol_assets
+        G.initial_short_usd = G.current_short_usd = abs(short_amt)
+        log_and_print("[SETUP] Initial %s Balance: %.6f, Initial Short USD: %.2f", "info", G.SYMBOL, G.initial_balance_asset, G.initial_short_usd)
+    if G.journal is not None:
+        G.journal.compact()
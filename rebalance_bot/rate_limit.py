@@ -0,0 +1,148 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+from . import clock
+
+PRIORITY_KILL = 0
+PRIORITY_CANCEL = 1
+PRIORITY_ORDER = 2
+PRIORITY_POLL = 3
+
+# Deribit default account limits: matching-engine requests (order entry, edit, cancel)
+# and non-matching requests (everything else) draw from separate credit pools.
+DERIBIT_LIMITS = {
+    "matching": (5.0, 20.0),
+    "non_matching": (20.0, 100.0),
+}
+
+def backoff_delay(attempt, base=0.25, cap=8.0):
+    return random.uniform(0.5, 1.0) * min(cap, base * (2 ** attempt))
+
+def endpoint_bucket(name):
+    if name.startswith(("create", "edit", "cancel")):
+        return "matching"
+    return "non_matching"
+
+def endpoint_priority(name):
+    if name.startswith("cancel"):
+        return PRIORITY_CANCEL
+    if name.startswith(("create", "edit")):
+        return PRIORITY_ORDER
+    return PRIORITY_POLL
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = clock.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost=1.0):
+        now = clock.monotonic()
+        self._refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def drain(self, seconds):
+        self._refill(clock.monotonic())
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+class RequestScheduler:
+    def __init__(self, limits=None):
+        self.buckets = {name: TokenBucket(rate, burst) for name, (rate, burst) in (limits or DERIBIT_LIMITS).items()}
+        self._queues = {name: [] for name in self.buckets}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._async_waiters = set()
+
+    def _enqueue(self, bucket, priority):
+        entry = (priority, next(self._seq))
+        heapq.heappush(self._queues[bucket], entry)
+        return entry
+
+    def _dequeue(self, bucket, entry):
+        queue = self._queues[bucket]
+        if queue and queue[0] == entry:
+            heapq.heappop(queue)
+        else:
+            queue.remove(entry)
+            heapq.heapify(queue)
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _poll(self, bucket, entry):
+        if self._queues[bucket][0] != entry:
+            return None
+        wait = self.buckets[bucket].take()
+        if wait == 0:
+            self._dequeue(bucket, entry)
+        return wait
+
+    def _timeout(self, wait, deadline):
+        # Entries behind the head have no refill time of their own; they wake
+        # when the queue moves, or at their deadline at the latest.
+        if wait is not None or deadline is None:
+            return wait
+        return max(0.0, deadline - clock.monotonic())
+
+    def acquire(self, bucket="non_matching", priority=PRIORITY_POLL, deadline=None):
+        with self._cond:
+            entry = self._enqueue(bucket, priority)
+            while True:
+                wait = self._poll(bucket, entry)
+                if wait == 0:
+                    return True
+                if deadline is not None and clock.monotonic() + (wait or 0) > deadline:
+                    self._dequeue(bucket, entry)
+                    return False
+                clock.wait_condition(self._cond, self._timeout(wait, deadline))
+
+    async def acquire_async(self, bucket="non_matching", priority=PRIORITY_POLL, deadline=None):
+        # The head of the queue sleeps until its bucket refills; tasks queued
+        # behind it sleep until an entry leaves the queue (or the deadline).
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            entry = self._enqueue(bucket, priority)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    waiter[1].clear()
+                    wait = self._poll(bucket, entry)
+                if wait == 0:
+                    entry = None
+                    return True
+                if deadline is not None and clock.monotonic() + (wait or 0) > deadline:
+                    return False
+                try:
+                    await clock.wait_for(waiter[1].wait(), self._timeout(wait, deadline))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+                if entry is not None:
+                    self._dequeue(bucket, entry)
+
+    def penalize(self, bucket, seconds):
+        with self._cond:
+            self.buckets[bucket].drain(seconds)
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def scheduler_for(exchange):
+    key = (getattr(exchange, "id", None), getattr(exchange, "apiKey", None) or id(exchange))
+    with _schedulers_lock:
+        if key not in _schedulers:
+            _schedulers[key] = RequestScheduler()
+        return _schedulers[key]
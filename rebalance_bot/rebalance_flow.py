@@ -1,52 +1,60 @@
+import time
 from .logging_utils import log_and_print
+from . import metrics
 from . import globals as G
-from .market_utils import get_lot_size, deviation
-from .exchange_client import get_price, get_futures_position, get_limit_price, retry_ccxt
-from .models import ProcessState, OrderStatus
+from .market_utils import get_lot_size
+from .planner import plan_portfolio
+from .exchange_client import get_price, get_futures_position, get_limit_price, retry_ccxt, limit_order_params, limit_order_method
+from .models import ProcessState, PortfolioPlan
 from .orders import place_boundary_orders
+from .ladder import ladder_enabled, place_ladder_orders
+from .reconcile import track_order
+from .transport import gather
 
-def rebalance(exchange):
-    log_and_print("[REBALANCE] Checking portfolio...", "info")
-    price = get_price(exchange)
-    if not price or price <= 0:
-        log_and_print("⚠️ Invalid price received. Skipping rebalance cycle.", "warning")
-        return
+def plan_rebalance(price, short_amt, lot_size) -> PortfolioPlan:
+    G.current_short_usd = abs(short_amt)
+    plan = plan_portfolio(price, G.current_balance_asset, G.current_short_usd, lot_size,
+                          G.REBALANCE_GAP, G.SHORT_TARGET_RATIO, G.MAX_LEVERAGE)
+    log_and_print("[CHECK] Spot %s: %.6f | Short: %.0f USD | Deviation: %.2f%% | BTC Price : %.2f", "debug", G.SYMBOL, G.current_balance_asset, short_amt, plan.dev*100, price)
+    return plan
 
-    lot_size = get_lot_size(exchange)
-    short_amt, _, _ = get_futures_position(exchange)
-    short_usd = abs(short_amt)
-    total_usd = G.current_balance_asset * price
+def rebalance_skipped(plan: PortfolioPlan) -> bool:
+    if plan.action == "skip_leverage":
+        log_and_print("⚠️ Leverage would exceed %sx after this trade. Skipping.", "warning", G.MAX_LEVERAGE)
+        return True
+    if plan.action != "rebalance":
+        log_and_print("🔕 Too small order: %.2f contracts (min lot)", "info", plan.contracts)
+        return True
+    return False
 
-    G.current_short_usd = short_usd
-    desired_short_usd = total_usd * G.SHORT_TARGET_RATIO
-    dev = deviation(G.current_short_usd, desired_short_usd, total_usd)
+def rebalance_placed(order, plan: PortfolioPlan, price_limit, decided_at):
+    side, contracts = plan.side, plan.contracts
+    metrics.record_ack(side, time.perf_counter() - decided_at)
+    G.snapshot.invalidate("book")
+    track_order(order)
+    log_and_print("[%s] Placing %s order for %s contracts at %.2f | decision→ack: %.0f ms", "info",
+                  'SHORT' if side == 'sell' else 'COVER', side, contracts, price_limit, (time.perf_counter() - decided_at) * 1000)
+    G.state = ProcessState.WAITMATCH
 
-    log_and_print(f"[CHECK] Spot {G.SYMBOL}: {G.current_balance_asset:.6f} | Short: {short_amt:.0f} USD | Deviation: {dev*100:.2f}% | BTC Price : {price:.2f}", "info")
+async def rebalance(exchange):
+    log_and_print("[REBALANCE] Checking portfolio...", "debug")
+    price, (short_amt, _, _) = await gather(get_price(exchange), get_futures_position(exchange))
+    if not price or price <= 0:
+        log_and_print("⚠️ Invalid price received. Skipping rebalance cycle.", "warning")
+        return
 
-    if abs(dev) > G.REBALANCE_GAP:
-        diff = desired_short_usd - short_usd
-        current_leverage = abs(short_usd + diff) / (G.current_balance_asset * price)
-        if current_leverage > G.MAX_LEVERAGE:
-            log_and_print(f"⚠️ Leverage would exceed {G.MAX_LEVERAGE}x after this trade. Skipping.", "warning")
-            return
+    decided_at = time.perf_counter()
+    plan = plan_rebalance(price, short_amt, get_lot_size(exchange))
 
-        contracts = max(lot_size, round(abs(diff) / lot_size) * lot_size)
-        if contracts >= lot_size:
-            if diff > 0:
-                price_limit = get_limit_price(exchange, 'sell')
-                order = retry_ccxt()(exchange.create_limit_sell_order)(G.SYMBOL_FUTURES, contracts, price_limit, {"post_only": True})
-            else:
-                price_limit = get_limit_price(exchange, 'buy')
-                order = retry_ccxt()(exchange.create_limit_buy_order)(G.SYMBOL_FUTURES, contracts, price_limit, {"post_only": True, "reduce_only": True})
-            try:
-                verified_order = retry_ccxt()(exchange.fetch_order)(order['id'], G.SYMBOL_FUTURES)
-                G.order_ids.append(OrderStatus.from_ccxt_order(verified_order))
-            except Exception:
-                G.order_ids.append(OrderStatus.from_ccxt_order(order))
-            log_and_print(f"[{'SHORT' if diff>0 else 'COVER'}] Placing {'sell' if diff>0 else 'buy'} order for {contracts} contracts at {price_limit:.2f}", "info")
-            G.state = ProcessState.WAITMATCH
+    if plan.balanced:
+        if ladder_enabled():
+            await place_ladder_orders(exchange, price, plan.dev)
         else:
-            log_and_print(f"🔕 Too small order: {contracts:.2f} contracts (min lot)", "info")
-    else:
-        place_boundary_orders(exchange, price, total_usd, dev)
-        log_and_print("✅ Portfolio is balanced. OCO boundary orders placed.", "info")
+            await place_boundary_orders(exchange, price, plan, decided_at)
+        return
+    if rebalance_skipped(plan):
+        return
+
+    price_limit = await get_limit_price(exchange, plan.side)
+    order = await retry_ccxt()(limit_order_method(exchange, plan.side))(G.SYMBOL_FUTURES, plan.contracts, price_limit, limit_order_params(plan.side))
+    rebalance_placed(order, plan, price_limit, decided_at)
@@ -0,0 +1,132 @@
+from . import clock
+from .lazy import lazy_import
+from .logging_utils import log_and_print
+from . import globals as G
+from .models import OrderStatus
+from .exchange_client import retry_ccxt, get_futures_position
+from .user_stream import QUIET_TICKS
+from .transport import gather
+
+ccxt = lazy_import("ccxt")
+
+CURSOR_OVERLAP_MS = 1000
+
+def track_order(order: dict, level=None) -> OrderStatus:
+    status = OrderStatus.from_ccxt_order(order)
+    status.created_at = clock.now()
+    status.level = level
+    G.order_ids[status.order_id] = status
+    if G.journal is not None:
+        G.journal.record_order(status, flush=True)
+    if G.order_sync_cursor is None:
+        G.order_sync_cursor = int(order.get("timestamp") or clock.now() * 1000) - CURSOR_OVERLAP_MS
+    return status
+
+def untrack_order(order_id: str):
+    order = G.order_ids.pop(order_id, None)
+    if order is not None and G.ledger is not None:
+        G.ledger.apply_order(order)
+        G.ledger.forget(order_id)
+    if order is not None and G.recorder is not None:
+        G.recorder.forget_order(order)
+    if G.journal is not None:
+        G.journal.record_untrack(order_id)
+    if not G.order_ids:
+        G.order_sync_cursor = None
+
+def apply_ccxt_order(order: OrderStatus, data: dict):
+    order.status = OrderStatus.normalize_status(data.get("status", ""))
+    order.filled = float(data.get("filled") or 0)
+    avg_price = data.get("average") or data.get("average_price")
+    order.average_price = float(avg_price) if avg_price is not None else None
+    fee = data.get("fee") or {}
+    if fee.get("cost") is not None:
+        order.fee = float(fee["cost"])
+
+def apply_amended_order(order: OrderStatus, result: dict, price: float, contracts=None):
+    # Deribit keeps the order id on edit; other venues may hand back a new one.
+    apply_ccxt_order(order, result)
+    order.price = float(result.get("price") or price)
+    order.contracts = float(result.get("amount") or contracts or order.contracts)
+    new_id = str(result.get("id") or order.order_id)
+    if new_id != order.order_id:
+        G.order_ids.pop(order.order_id, None)
+        order.order_id = new_id
+        G.order_ids[new_id] = order
+
+def apply_open_orders(open_orders) -> list:
+    open_ids = set()
+    for data in open_orders:
+        order = G.order_ids.get(str(data.get("id", "")))
+        if order is not None:
+            apply_ccxt_order(order, data)
+            open_ids.add(order.order_id)
+    return [order for order_id, order in G.order_ids.items() if order_id not in open_ids]
+
+def apply_closed_orders(closed_orders):
+    cursor = G.order_sync_cursor or 0
+    for data in closed_orders:
+        updated = data.get("lastUpdateTimestamp") or data.get("timestamp") or 0
+        cursor = max(cursor, int(updated) - CURSOR_OVERLAP_MS)
+        order = G.order_ids.get(str(data.get("id", "")))
+        if order is not None:
+            apply_ccxt_order(order, data)
+    G.order_sync_cursor = cursor
+
+def unresolved_orders(missing) -> list:
+    return [order for order in missing if order.status in ("OPEN", "PARTIAL")]
+
+async def _fetch_order(exchange, order):
+    try:
+        apply_ccxt_order(order, await retry_ccxt()(exchange.fetch_order)(order.order_id, G.SYMBOL_FUTURES))
+    except ccxt.OrderNotFound:
+        log_and_print("⚠️ Order %s not found. Dropping it.", "warning", order.order_id)
+        order.status = "CANCELLED"
+        if G.ledger is not None:
+            G.ledger.invalidate()
+    except Exception as e:
+        log_and_print("❌ Error fetching order %s: %s", "error", order.order_id, e)
+
+async def reconcile_orders(exchange, open_orders=None):
+    if not G.order_ids:
+        return
+    if open_orders is None:
+        open_orders = await retry_ccxt()(exchange.fetch_open_orders)(G.SYMBOL_FUTURES)
+    missing = apply_open_orders(open_orders)
+    if not missing:
+        return
+    apply_closed_orders(await retry_ccxt()(exchange.fetch_closed_orders)(G.SYMBOL_FUTURES, G.order_sync_cursor, None, {"include_unfilled": True}))
+
+    unresolved = unresolved_orders(missing)
+    for order in unresolved:
+        log_and_print("⚠️ Order %s missing from open and closed orders. Fetching directly...", "warning", order.order_id)
+    await gather(*[_fetch_order(exchange, order) for order in unresolved])
+
+def sync_from_stream(stream) -> list:
+    # Applies the latest pushed state to every tracked order and returns the
+    # ones the stream cannot vouch for: never reported, or quiet for
+    # QUIET_TICKS. Those go through REST reconciliation.
+    return [order for order in list(G.order_ids.values())
+            if not stream.sync_order(order) or stream.quiet_ticks(order.order_id) >= QUIET_TICKS]
+
+async def reconcile_unverified(exchange, stream) -> bool:
+    # Returns True when REST had to be asked about at least one order.
+    unverified = sync_from_stream(stream)
+    if not unverified:
+        return False
+    await reconcile_orders(exchange)
+    stream.touch([order.order_id for order in unverified])
+    return True
+
+async def resync_after_reconnect(exchange):
+    # Fills, cancels and position changes that happened while the stream was
+    # down were never pushed: take one REST view before trusting it again.
+    log_and_print("🔄 User stream (re)connected. Resyncing orders and position over REST...", "info")
+    G.snapshot.invalidate("position", "balance")
+    if G.ledger is not None:
+        G.ledger.invalidate()
+    await reconcile_orders(exchange)
+    if G.user_stream is not None:
+        G.user_stream.touch(list(G.order_ids))
+    size, _, _ = await get_futures_position(exchange)
+    G.current_short_usd = abs(size)
@@ -0,0 +1,213 @@
+import glob
+import os
+import threading
+import time
+from .lazy import lazy_import
+from .logging_utils import log_and_print
+from . import globals as G
+from . import clock
+
+np = lazy_import("numpy")
+
+RECORD_VERSION = 1
+TICKER, BOOK, POSITION, ORDER = 0, 1, 2, 3
+KINDS = ("ticker", "book", "position", "order")
+STATUSES = ("OPEN", "PARTIAL", "FILLED", "CANCELLED")
+FLUSH_ROWS = 4096
+FLUSH_SECONDS = 1.0
+
+_dtype = None
+
+def record_dtype():
+    # One fixed-width row per observation. Columns a kind does not use stay 0:
+    #   ticker   price=last, bid, ask
+    #   book     bid, ask, bid_size, ask_size (top of book)
+    #   position size (signed contracts), price=entry
+    #   order    order_id, side, status, price, size=contracts, filled
+    global _dtype
+    if _dtype is None:
+        _dtype = np.dtype([
+            ("ts", "<f8"), ("tick", "<u4"), ("kind", "u1"), ("side", "i1"), ("status", "u1"),
+            ("price", "<f8"), ("bid", "<f8"), ("ask", "<f8"), ("bid_size", "<f8"), ("ask_size", "<f8"),
+            ("size", "<f8"), ("filled", "<f8"), ("order_id", "S24"),
+        ])
+    return _dtype
+
+def records_dir(config_key, symbol_futures, bot_name=None):
+    key = "_".join(part for part in (config_key, symbol_futures, bot_name) if part)
+    name = "".join(c if c.isalnum() else "_" for c in key)
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", G.RECORDS_FOLDER, name))
+
+def segment_day(ts) -> str:
+    return time.strftime("%Y%m%d", time.gmtime(ts))
+
+def segment_path(folder, day):
+    return os.path.join(folder, f"{day}.v{RECORD_VERSION}.rec")
+
+class Recorder:
+    # Appends what the bot observed each tick to one raw segment file per UTC
+    # day. Rows are buffered and written as a single block at most every
+    # FLUSH_SECONDS, so the cost per tick is a few tuple appends. Only values
+    # that changed since the last row of their kind are written.
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self._rows = []
+        self._day = None
+        self._file = None
+        self._flushed_at = clock.monotonic()
+        self._last = {}
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def _append(self, ts, kind, side=0, status=0, price=0.0, bid=0.0, ask=0.0, bid_size=0.0, ask_size=0.0,
+                size=0.0, filled=0.0, order_id=b""):
+        with self._lock:
+            if self._day is not None and segment_day(ts) != self._day:
+                self._write()
+                self._roll()
+            if self._day is None:
+                self._day = segment_day(ts)
+            self._rows.append((ts, G.tick_id, kind, side, status, price, bid, ask, bid_size, ask_size, size, filled, order_id))
+
+    def _changed(self, kind, value) -> bool:
+        if value is None or self._last.get(kind) == value:
+            return False
+        self._last[kind] = value
+        return True
+
+    def record_ticker(self, ticker, ts=None):
+        values = (ticker.get("last") or 0.0, ticker.get("bid") or 0.0, ticker.get("ask") or 0.0)
+        if self._changed(TICKER, values):
+            self._append(clock.now() if ts is None else ts, TICKER, price=values[0], bid=values[1], ask=values[2])
+
+    def record_book(self, bid, ask, bid_size, ask_size, ts=None):
+        if self._changed(BOOK, (bid, ask, bid_size, ask_size)):
+            self._append(clock.now() if ts is None else ts, BOOK, bid=bid or 0.0, ask=ask or 0.0,
+                         bid_size=bid_size or 0.0, ask_size=ask_size or 0.0)
+
+    def record_position(self, size, entry_price, ts=None):
+        if self._changed(POSITION, (size, entry_price)):
+            self._append(clock.now() if ts is None else ts, POSITION, size=size, price=entry_price or 0.0)
+
+    def record_order(self, order, ts=None):
+        values = (order.status, order.filled, order.price, order.contracts)
+        if self._orders.get(order.order_id) == values:
+            return
+        self._orders[order.order_id] = values
+        self._append(clock.now() if ts is None else ts, ORDER, side=1 if order.side == "BUY" else -1,
+                     status=STATUSES.index(order.status) if order.status in STATUSES else len(STATUSES),
+                     price=order.price, size=order.contracts, filled=order.filled, order_id=order.order_id.encode()[:24])
+
+    def forget_order(self, order):
+        self.record_order(order)
+        self._orders.pop(order.order_id, None)
+
+    def checkpoint(self):
+        ticker = G.snapshot.peek("ticker", G.SYMBOL_FUTURES)
+        if ticker:
+            self.record_ticker(ticker)
+        book = G.order_book
+        if book is not None and book.fresh():
+            bid, ask = book.best_bid(), book.best_ask()
+            self.record_book(bid, ask, book.depth_at("buy", bid) if bid else 0.0, book.depth_at("sell", ask) if ask else 0.0)
+        else:
+            snapshot = G.snapshot.peek("book", G.SYMBOL_FUTURES)
+            if snapshot and snapshot["bids"] and snapshot["asks"]:
+                (bid, bid_size), (ask, ask_size) = snapshot["bids"][0][:2], snapshot["asks"][0][:2]
+                self.record_book(bid, ask, bid_size, ask_size)
+        position = G.snapshot.peek("position", G.SYMBOL_FUTURES)
+        if position:
+            self.record_position(position[0], position[1])
+        elif G.ledger is not None and G.ledger.fresh():
+            self.record_position(G.ledger.size, G.ledger.entry_price)
+        for order in list(G.order_ids.values()):
+            self.record_order(order)
+        if len(self._rows) >= FLUSH_ROWS or clock.monotonic() - self._flushed_at >= FLUSH_SECONDS:
+            self.flush()
+
+    def _write(self):
+        if self._rows:
+            if self._file is None:
+                self._file = open(segment_path(self.folder, self._day), "ab")
+            self._file.write(np.array(self._rows, dtype=record_dtype()).tobytes())
+            self._file.flush()
+            self._rows = []
+        self._flushed_at = clock.monotonic()
+
+    def _roll(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._day = None
+
+    def flush(self):
+        with self._lock:
+            self._write()
+
+    def close(self):
+        with self._lock:
+            self._write()
+            self._roll()
+
+def open_recorder():
+    if G.RECORD_MARKET_DATA and G.recorder is None:
+        G.recorder = Recorder(records_dir(G.CONFIG_KEY, G.SYMBOL_FUTURES, G.BOT_NAME))
+        log_and_print("🎞️ Recording market data to %s", "info", G.recorder.folder)
+    return G.recorder
+
+def close_recorder():
+    if G.recorder is not None:
+        G.recorder.checkpoint()
+        G.recorder.close()
+        G.recorder = None
+
+class RecordReader:
+    # Memory-maps the segment files read-only. Rows are appended in time
+    # order, so a time range is two binary searches on the `ts` column and
+    # the rows in between are returned as a view, without copying.
+    def __init__(self, folder):
+        self.folder = folder
+
+    def segments(self, start=None, end=None) -> list:
+        days = []
+        for path in sorted(glob.glob(os.path.join(self.folder, f"*.v{RECORD_VERSION}.rec"))):
+            day = os.path.basename(path).split(".", 1)[0]
+            if (start is None or day >= segment_day(start)) and (end is None or day <= segment_day(end)):
+                days.append(path)
+        return days
+
+    def _map(self, path):
+        dtype = record_dtype()
+        # A writer may be part way through a block; only whole rows are mapped.
+        rows = os.path.getsize(path) // dtype.itemsize
+        if not rows:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+
+    def read(self, start=None, end=None, kinds=None):
+        # Yields one array per segment for rows with start <= ts < end,
+        # optionally restricted to some kinds (that filter makes a copy).
+        kinds = None if kinds is None else [KINDS.index(k) if isinstance(k, str) else k for k in kinds]
+        for path in self.segments(start, end):
+            rows = self._map(path)
+            ts = rows["ts"]
+            lo = 0 if start is None else int(np.searchsorted(ts, start, "left"))
+            hi = len(rows) if end is None else int(np.searchsorted(ts, end, "left"))
+            rows = rows[lo:hi]
+            if kinds is not None:
+                rows = rows[np.isin(rows["kind"], kinds)]
+            if len(rows):
+                yield rows
+
+    def prices(self, start=None, end=None):
+        # Price path as the bot saw it: ticker last prices, and the book mid
+        # in between since the ticker is only fetched when it is needed.
+        for rows in self.read(start, end, kinds=("ticker", "book")):
+            yield from np.where(rows["kind"] == TICKER, rows["price"], (rows["bid"] + rows["ask"]) / 2).tolist()
+
+    def price_interval(self, start=None, end=None, sample=1000) -> float:
+        for rows in self.read(start, end, kinds=("ticker", "book")):
+            if len(rows) > 1:
+                return float(np.median(np.diff(rows["ts"][:sample]))) or 1.0
+        return 1.0
@@ -1,21 +1,37 @@
 import os
 import uuid
-import time
-import ccxt
+import asyncio
+from .lazy import lazy_import
 import configparser
-from .logging_utils import log_and_print
+from .logging_utils import log_and_print, start_logging
 from . import globals as G
+from . import clock
+from .metrics import timed_tick, start_metrics_server
+from .journal import open_journal, close_journal
+from .recorder import open_recorder, close_recorder
+from .market_cache import ensure_markets, ensure_markets_async
+from .tick_scheduler import TickScheduler
 from .models import BotConfig, ProcessState
-from .exchange_client import load_config, connect_exchange, getPerpetualSymbols, retry_ccxt, get_target_symbol_balance
+from .exchange_client import load_config, connect_exchange, connect_exchange_async, getPerpetualSymbols, get_target_symbol_balance, get_price
 from .portfolio import setup_portfolio
 from .rebalance_flow import rebalance
-from .orders import handle_order_status, cancel_all_orders
+from .orders import handle_order_status
+from .reconcile import resync_after_reconnect
+from .kill_switch import engage_kill_switch
+from .user_stream import UserStream
+from .order_book import open_order_book
+from .config_watcher import ConfigWatcher, read_config_file, validate_config
+from .rate_limit import backoff_delay
+from .transport import run_sync, blocking, sleep, wait_event
+
+ccxt = lazy_import("ccxt")
 
 PARAMETER_FILE = os.path.join(os.path.dirname(__file__), "..", G.CONFIG_FOLDER, "rebalance_parameters.ini")
+MIN_TICK_BUDGET_SECONDS = 2.0
 
 def save_config(config: BotConfig):
     G.UNIQUE_KEY = uuid.uuid4().hex[:8]
-    log_and_print(f"🔑 Bot Key: {G.UNIQUE_KEY}", "info")
+    log_and_print("🔑 Bot Key: %s", "info", G.UNIQUE_KEY)
     config_parser = configparser.ConfigParser()
     config_parser['bot'] = {
         'symbol_futures': config.symbol_futures,
@@ -23,63 +39,83 @@ def save_config(config: BotConfig):
         'short_target_ratio': str(config.short_target_ratio),
         'interval_seconds': str(config.interval_seconds),
         'max_leverage': str(config.max_leverage),
-        'initial_asset': str(config.initial_asset)
+        'initial_asset': str(config.initial_asset),
+        'use_user_stream': str(config.use_user_stream),
+        'use_async_engine': str(config.use_async_engine),
+        'use_journal': str(config.use_journal),
+        'adaptive_interval': str(config.adaptive_interval),
+        'min_interval_seconds': str(config.min_interval_seconds),
+        'max_interval_seconds': str(config.max_interval_seconds),
+        'request_budget': str(config.request_budget),
+        'ladder_levels': str(config.ladder_levels),
+        'cancel_on_disconnect': str(config.cancel_on_disconnect)
     }
     os.makedirs(os.path.join(os.path.dirname(__file__), "..", G.CONFIG_FOLDER), exist_ok=True)
     path = os.path.join(os.path.dirname(__file__), "..", G.CONFIG_FOLDER, f"rebalance_parameters_{G.UNIQUE_KEY}.ini")
     with open(path, 'w') as f:
         config_parser.write(f)
-    log_and_print(f"✅ Configuration saved to {path}", "info")
-    global PARAMETER_FILE
-    PARAMETER_FILE = path
+    log_and_print("✅ Configuration saved to %s", "info", path)
+    G.parameter_file = path
 
 def load_config_from_file(file_path: str, force_update: bool = False) -> BotConfig:
-    config_parser = configparser.ConfigParser()
-    if not os.path.exists(file_path):
-        log_and_print(f"❌ Configuration file {file_path} not found. Stopping bot...", "error")
-        raise SystemExit(1)
-    config_parser.read(file_path)
-    if 'bot' not in config_parser:
-        log_and_print(f"❌ Configuration file {file_path} is missing 'bot' section. Stopping bot...", "error")
+    start_logging()
+    try:
+        bot_config = read_config_file(file_path)
+    except ValueError as e:
+        log_and_print("❌ %s. Stopping bot...", "error", e)
         raise SystemExit(1)
-    config = config_parser['bot']
-    bot_config = BotConfig(
-        symbol_futures=config.get('symbol_futures', 'BTC/USD:BTC'),
-        rebalance_gap=float(config.get('rebalance_gap', 0.01)),
-        short_target_ratio=float(config.get('short_target_ratio', 0.5)),
-        interval_seconds=int(config.get('interval_seconds', 5)),
-        max_leverage=float(config.get('max_leverage', 1.0)),
-        initial_asset=float(config.get('initial_asset', 0.0))
-    )
-    log_and_print(f"🔧 Loaded configuration: {bot_config}", "info")
+    log_and_print("🔧 Loaded configuration: %s", "info", bot_config)
     if force_update:
         update_config_from_file(bot_config)
     return bot_config
 
 def update_config_from_file(config: BotConfig):
-    if config.max_leverage <= 0:
-        log_and_print("❌ MAX_LEVERAGE must be greater than 0. Stopping bot...", "error")
-        raise SystemExit(1)
-    if not (0.05 <= config.short_target_ratio <= 0.95):
-        log_and_print("❌ SHORT_TARGET_RATIO must be between 0.05 and 0.95. Stopping bot...", "error")
-        raise SystemExit(1)
-    if config.rebalance_gap <= 0:
-        log_and_print("❌ REBALANCE_GAP must be greater than 0. Stopping bot...", "error")
-        raise SystemExit(1)
-    if config.interval_seconds <= 0:
-        log_and_print("❌ INTERVAL_SECONDS must be greater than 0. Stopping bot...", "error")
+    errors = validate_config(config)
+    if errors:
+        log_and_print("❌ %s. Stopping bot...", "error", errors[0])
         raise SystemExit(1)
+    apply_config(config)
 
+def apply_config(config: BotConfig):
     G.REBALANCE_GAP = config.rebalance_gap
     G.SHORT_TARGET_RATIO = config.short_target_ratio
     G.INTERVAL_SECONDS = config.interval_seconds
     G.MAX_LEVERAGE = config.max_leverage
     G.SYMBOL_FUTURES = config.symbol_futures
     G.SYMBOL = G.SYMBOL_FUTURES.split(':')[-1]
-    log_and_print(f"🔄 Updated global parameters from config: REBALANCE_GAP={G.REBALANCE_GAP}, SHORT_TARGET_RATIO={G.SHORT_TARGET_RATIO}, INTERVAL_SECONDS={G.INTERVAL_SECONDS}, MAX_LEVERAGE={G.MAX_LEVERAGE}, SYMBOL_FUTURES={G.SYMBOL_FUTURES}", "info")
+    G.USE_USER_STREAM = config.use_user_stream
+    G.USE_ASYNC_ENGINE = config.use_async_engine
+    G.USE_JOURNAL = config.use_journal
+    G.ADAPTIVE_INTERVAL = config.adaptive_interval
+    G.MIN_INTERVAL_SECONDS = config.min_interval_seconds
+    G.MAX_INTERVAL_SECONDS = config.max_interval_seconds
+    G.REQUEST_BUDGET = config.request_budget
+    G.LADDER_LEVELS = config.ladder_levels
+    G.CANCEL_ON_DISCONNECT = config.cancel_on_disconnect
+    if not G.ADAPTIVE_INTERVAL:
+        G.tick_scheduler = None
+    elif G.tick_scheduler is None:
+        G.tick_scheduler = TickScheduler(G.MIN_INTERVAL_SECONDS, G.MAX_INTERVAL_SECONDS, G.REQUEST_BUDGET)
+    else:
+        G.tick_scheduler.update_limits(G.MIN_INTERVAL_SECONDS, G.MAX_INTERVAL_SECONDS, G.REQUEST_BUDGET)
+    log_and_print("🔄 Updated global parameters from config: REBALANCE_GAP=%s, SHORT_TARGET_RATIO=%s, INTERVAL_SECONDS=%s, MAX_LEVERAGE=%s, SYMBOL_FUTURES=%s", "info", G.REBALANCE_GAP, G.SHORT_TARGET_RATIO, G.INTERVAL_SECONDS, G.MAX_LEVERAGE, G.SYMBOL_FUTURES)
+
+def start_config_watcher():
+    G.config_watcher = ConfigWatcher(G.parameter_file or PARAMETER_FILE)
+    apply_config_changes()
+
+def apply_config_changes():
+    if G.config_watcher is None:
+        return
+    config = G.config_watcher.poll()
+    if config is not None:
+        apply_config(config)
 
 def get_bot_config_from_terminal() -> BotConfig:
-    log_and_print("Insert Key API KEY: ")
+    # Runs before run_bot(): start logging so warnings reach the log file, and
+    # print the prompts so the user sees them whatever the echo setting.
+    start_logging()
+    print("Insert Key API KEY: ")
     exchange_key = input("Input Exchange Key: ").strip()
     api_key, api_secret = load_config(exchange_key)
     G.CONFIG_KEY = exchange_key
@@ -89,12 +125,12 @@ def get_bot_config_from_terminal() -> BotConfig:
             user_input = input(f"{prompt} (default = {default}): ").strip()
             return cast_fn(user_input) if user_input else default
         except Exception as e:
-            log_and_print(f"⚠️ Invalid input: {e}. Using default = {default}", "warning")
+            print(f"⚠️ Invalid input: {e}. Using default = {default}")
             return default
 
-    log_and_print("Perpetual Futures Symbols:", "info")
+    print("Perpetual Futures Symbols:")
     perpetual_symbols = getPerpetualSymbols(ex)
-    log_and_print(", ".join(perpetual_symbols) if perpetual_symbols else "No perpetual futures symbols found.", "info")
+    print(", ".join(perpetual_symbols) if perpetual_symbols else "No perpetual futures symbols found.")
     symbol_futures = input("SYMBOL_FUTURES (default = 'BTC/USD:BTC'): ").strip() or "BTC/USD:BTC"
     rebalance_gap = get_input("REBALANCE_GAP", 0.01, float)
     short_target_ratio = get_input("SHORT_TARGET_RATIO", 0.5, float)
@@ -102,11 +138,24 @@ def get_bot_config_from_terminal() -> BotConfig:
     initial_asset_default = 0.0
     if symbol_futures:
         symbol = symbol_futures.split(':')[0].split("/")[0]
-        log_and_print(f"Fetching initial asset default value for {symbol}...", "info")
-        initial_asset_default = get_target_symbol_balance(ex, symbol)
-        log_and_print(f"Initial asset default value set to {initial_asset_default:.6f} {symbol} based on current balance.", "info")
+        print(f"Fetching initial asset default value for {symbol}...")
+        initial_asset_default = run_sync(get_target_symbol_balance(ex, symbol))
+        print(f"Initial asset default value set to {initial_asset_default:.6f} {symbol} based on current balance.")
     max_leverage = get_input("MAX_LEVERAGE", 1.0, float)
     initial_asset = get_input("INITIAL_ASSET", initial_asset_default)
+    use_user_stream = get_input("USE_USER_STREAM (y/n)", False, lambda v: v.lower() in ("y", "yes", "true", "1"))
+    cancel_on_disconnect = False
+    if use_user_stream:
+        cancel_on_disconnect = get_input("CANCEL_ON_DISCONNECT (y/n)", False, lambda v: v.lower() in ("y", "yes", "true", "1"))
+    use_async_engine = get_input("USE_ASYNC_ENGINE (y/n)", False, lambda v: v.lower() in ("y", "yes", "true", "1"))
+    use_journal = get_input("USE_JOURNAL (y/n)", True, lambda v: v.lower() in ("y", "yes", "true", "1"))
+    adaptive_interval = get_input("ADAPTIVE_INTERVAL (y/n)", False, lambda v: v.lower() in ("y", "yes", "true", "1"))
+    min_interval_seconds, max_interval_seconds, request_budget = 1.0, 30.0, 60.0
+    if adaptive_interval:
+        min_interval_seconds = get_input("MIN_INTERVAL_SECONDS", 1.0, float)
+        max_interval_seconds = get_input("MAX_INTERVAL_SECONDS", 30.0, float)
+        request_budget = get_input("REQUEST_BUDGET (requests/minute)", 60.0, float)
+    ladder_levels = get_input("LADDER_LEVELS per side (1 = single boundary pair)", 1, int)
 
     return BotConfig(
         symbol_futures=symbol_futures,
@@ -114,42 +163,160 @@ def get_bot_config_from_terminal() -> BotConfig:
         short_target_ratio=short_target_ratio,
         interval_seconds=interval_seconds,
         max_leverage=max_leverage,
-        initial_asset=initial_asset
+        initial_asset=initial_asset,
+        use_user_stream=use_user_stream,
+        use_async_engine=use_async_engine,
+        use_journal=use_journal,
+        adaptive_interval=adaptive_interval,
+        min_interval_seconds=min_interval_seconds,
+        max_interval_seconds=max_interval_seconds,
+        request_budget=request_budget,
+        ladder_levels=ladder_levels,
+        cancel_on_disconnect=cancel_on_disconnect
     )
 
-def run_bot():
-    api_key, api_secret = load_config(G.CONFIG_KEY)
-    ex = connect_exchange(api_key, api_secret)
+def tick_deadline():
+    return clock.monotonic() + max(G.INTERVAL_SECONDS, MIN_TICK_BUDGET_SECONDS)
+
+def _resting_prices():
+    return [o.price for o in G.order_ids.values() if o.status in ("OPEN", "PARTIAL")]
+
+def _schedule(price):
+    scheduler = G.tick_scheduler
+    scheduler.observe_requests(G.tick_requests)
+    scheduler.observe_price(price)
+    return scheduler.next_interval(price, G.state, _resting_prices(), G.INTERVAL_SECONDS)
+
+async def next_tick_interval(ex):
+    if G.tick_scheduler is None:
+        return G.INTERVAL_SECONDS
+    ticker = G.snapshot.peek("ticker", G.SYMBOL_FUTURES)
+    price = ticker["last"] if ticker else None
+    if price is None and _resting_prices():
+        try:
+            price = await get_price(ex)
+        except Exception as e:
+            log_and_print("⚠️ Unable to fetch price for tick scheduling: %s", "warning", e)
+    return _schedule(price)
+
+async def tick(ex):
+    G.tick_id += 1
+    G.tick_requests = 0
+    G.tick_deadline = tick_deadline()
     try:
-        markets = ex.load_markets()
-        if G.SYMBOL_FUTURES not in markets:
-            log_and_print(f"❌ SYMBOL_FUTURES '{G.SYMBOL_FUTURES}' not found on exchange. Stopping bot...", "error")
-            raise SystemExit(1)
-    except Exception as e:
-        log_and_print(f"❌ Error loading markets or validating symbol: {e}. Stopping bot...", "error")
+        with timed_tick():
+            streaming = G.user_stream is not None and G.user_stream.is_live()
+            G.snapshot.begin_tick(keep=("position",) if streaming else ())
+            if G.user_stream is not None:
+                G.user_stream.apply_updates()
+            apply_config_changes()
+            resync = G.user_stream.resync_due() if streaming else None
+            if resync is not None:
+                await resync_after_reconnect(ex)
+                G.user_stream.resynced(resync)
+            if G.state == ProcessState.REBALANCING:
+                await rebalance(ex)
+            if G.order_ids:
+                await handle_order_status(ex)
+    finally:
+        G.tick_deadline = None
+        if G.journal is not None:
+            G.journal.checkpoint()
+        if G.recorder is not None:
+            G.recorder.checkpoint()
+
+def run_tick(ex):
+    run_sync(tick(ex))
+
+def _require_symbol(markets):
+    if G.SYMBOL_FUTURES not in markets:
+        log_and_print("❌ SYMBOL_FUTURES '%s' not found on exchange. Stopping bot...", "error", G.SYMBOL_FUTURES)
         raise SystemExit(1)
 
-    setup_portfolio(ex)
-    log_and_print(f"📡 Rebalancing bot started. Running every {G.INTERVAL_SECONDS} seconds...", "info")
+async def start_user_stream(ex):
+    # The stream authenticates with the client's own keys, so injected
+    # exchanges without credentials (the simulator) simply poll.
+    api_key, api_secret = getattr(ex, "apiKey", None), getattr(ex, "secret", None)
+    if not (G.USE_USER_STREAM and api_key):
+        return
+    instrument = ex.market(G.SYMBOL_FUTURES)['id']
+    G.user_stream = UserStream(api_key, api_secret, instrument, cancel_on_disconnect=G.CANCEL_ON_DISCONNECT,
+                               book=open_order_book(instrument))
+    if not G.user_stream.start():
+        return
+    for _ in range(100):
+        if G.user_stream.is_live():
+            return
+        await sleep(0.1)
+    log_and_print("⚠️ User stream not live yet. Polling until it connects...", "warning")
 
+async def run_engine(ex, max_ticks=None):
+    # The bot loop for both engines, once the markets are loaded.
+    start_config_watcher()
+    start_metrics_server()
+    open_journal()
+    open_recorder()
     try:
-        while True:
-            try:
-                if G.state == ProcessState.REBALANCING:
-                    load_config_from_file(PARAMETER_FILE)
-                    rebalance(ex)
-                if G.order_ids:
-                    handle_order_status(ex)
-                time.sleep(G.INTERVAL_SECONDS)
-            except ccxt.NetworkError as ne:
-                log_and_print(f"🌐 Network error: {ne}. Retrying in 10 seconds...", "warning")
-                time.sleep(10)
-    except KeyboardInterrupt:
-        log_and_print("🛑 Bot stopped by user.", "info")
-        cancel_all_orders(ex)
-    except ccxt.RateLimitExceeded as re:
-        log_and_print(f"⚠️ Rate limit hit: {str(re)}. Retrying in 60 sec...", "warning")
-        time.sleep(60)
+        await setup_portfolio(ex)
+        await start_user_stream(ex)
+        log_and_print("📡 Rebalancing bot started%s. Running every %s seconds...", "info", "" if blocking() else " (async engine)", G.INTERVAL_SECONDS)
+        try:
+            errors = 0
+            while max_ticks is None or G.tick_id < max_ticks:
+                try:
+                    await tick(ex)
+                    errors = 0
+                    if await wait_event(G.wake_event, await next_tick_interval(ex)):
+                        log_and_print("⚡ Woken early by user stream event.", "debug")
+                    G.wake_event.clear()
+                except ccxt.NetworkError as ne:
+                    errors += 1
+                    wait = backoff_delay(errors, 1.0, 60.0 if isinstance(ne, ccxt.RateLimitExceeded) else 10.0)
+                    log_and_print("🌐 %s: %s. Retrying in %.1f seconds...", "warning", type(ne).__name__, ne, wait)
+                    await sleep(wait)
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            log_and_print("🛑 Bot stopped by user.", "info")
+            await engage_kill_switch(ex, "stopped by user")
+        except Exception as e:
+            log_and_print("❌ Unexpected error: %s", "error", e)
+            await engage_kill_switch(ex, "unexpected error")
+    finally:
+        close_journal()
+        close_recorder()
+        if G.user_stream is not None:
+            G.user_stream.stop()
+            G.user_stream = None
+            G.order_book = None
+
+def run_bot(ex=None, max_ticks=None):
+    start_logging()
+    if G.USE_ASYNC_ENGINE and ex is None:
+        return asyncio.run(run_bot_async(max_ticks=max_ticks))
+    if ex is None:
+        ex = connect_exchange(*load_config(G.CONFIG_KEY))
+    try:
+        _require_symbol(ensure_markets(ex, (G.SYMBOL_FUTURES,)))
+    except SystemExit:
+        raise
     except Exception as e:
-        log_and_print(f"❌ Unexpected error: {str(e)}", "error")
-        cancel_all_orders(ex)
+        log_and_print("❌ Error loading markets or validating symbol: %s. Stopping bot...", "error", e)
+        raise SystemExit(1)
+    run_sync(run_engine(ex, max_ticks))
+
+async def run_bot_async(ex=None, max_ticks=None):
+    start_logging()
+    owns_exchange = ex is None
+    if owns_exchange:
+        ex = connect_exchange_async(*load_config(G.CONFIG_KEY))
+    try:
+        try:
+            _require_symbol(await ensure_markets_async(ex, (G.SYMBOL_FUTURES,)))
+        except SystemExit:
+            raise
+        except Exception as e:
+            log_and_print("❌ Error loading markets or validating symbol: %s. Stopping bot...", "error", e)
+            raise SystemExit(1)
+        await run_engine(ex, max_ticks)
+    finally:
+        if owns_exchange:
+            await ex.close()
@@ -0,0 +1,349 @@
+import bisect
+import itertools
+import random
+import threading
+from .lazy import lazy_import
+from . import clock
+from .recorder import RecordReader
+
+ccxt = lazy_import("ccxt")
+
+class SimExchange:
+    id = "deribit-sim"
+    apiKey = None
+    cache_markets = False
+
+    def __init__(self, symbol="BTC/USD:BTC", instrument="BTC-PERPETUAL", prices=None, start_price=60000.0,
+                 volatility=0.0005, step_seconds=1.0, half_spread=0.25, depth=100000.0, taker_volume=None,
+                 lot_size=10.0, balance=1.0, position=0.0, latency=0.0, error_rates=None, seed=0, sim_clock=None):
+        self.symbol = symbol
+        self.instrument = instrument
+        self.rng = random.Random(seed)
+        self.prices = iter(prices) if prices is not None else None
+        self.price = float(start_price)
+        self.volatility = volatility
+        self.step_seconds = step_seconds
+        self.half_spread = half_spread
+        self.depth = depth
+        self.taker_volume = taker_volume
+        self.lot_size = lot_size
+        self.balance = float(balance)
+        self.position = float(position)
+        self.entry_price = self.price if position else 0.0
+        self.latency = latency
+        self.error_rates = dict(error_rates or {})
+        self.pending_errors = []
+        self.exhausted = False
+        self.calls = {}
+        self.orders = {}
+        self.bids = []
+        self.asks = []
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+        # Cancels may arrive from several threads at once (see kill_switch).
+        self._lock = threading.RLock()
+        self.markets = {}
+        self.currencies = {}
+        self.clock = sim_clock or clock.SimClock()
+        self._last_step = self.clock.time()
+        self.clock.add_listener(self._on_clock)
+        self._book_change_id = 0
+        self._published = None
+        self.has = {"editOrder": True, "cancelAllOrders": True, "fetchOpenOrders": True, "fetchClosedOrders": True}
+
+    # --- market simulation -------------------------------------------------
+
+    def _on_clock(self, now):
+        while now - self._last_step >= self.step_seconds:
+            self._last_step += self.step_seconds
+            self.step()
+
+    def step(self):
+        if self.prices is not None:
+            try:
+                self.price = float(next(self.prices))
+            except StopIteration:
+                self.exhausted = True
+        else:
+            self.price *= 1 + self.rng.gauss(0, self.volatility)
+        self._match()
+
+    def _match(self):
+        # Taker flow is drawn separately on each side of the book for every step.
+        volume = self.taker_volume if self.taker_volume is not None else float("inf")
+        with self._lock:
+            self._sweep(self.asks, lambda order: self.price >= order["price"], volume)
+            self._sweep(self.bids, lambda order: self.price <= order["price"], volume)
+
+    def _sweep(self, book, crosses, volume):
+        while book and volume > 0:
+            order = self.orders[book[0][2]]
+            if not crosses(order):
+                break
+            amount = min(order["remaining"], volume)
+            if order["reduceOnly"]:
+                amount = min(amount, max(0.0, -self.position if order["side"] == "buy" else self.position))
+            if amount > 0:
+                self._fill(order, amount)
+                volume -= amount
+            if order["remaining"] <= 0 or amount <= 0:
+                order["status"] = "closed" if order["filled"] > 0 else "canceled"
+                book.pop(0)
+        return volume
+
+    def _fill(self, order, amount):
+        price = order["price"]
+        signed = amount if order["side"] == "buy" else -amount
+        if self.position == 0 or (self.position > 0) == (signed > 0):
+            asset = (abs(self.position) / self.entry_price if self.entry_price else 0.0) + amount / price
+            self.position += signed
+            self.entry_price = abs(self.position) / asset
+        else:
+            closed = min(amount, abs(self.position))
+            direction = 1 if self.position > 0 else -1
+            self.balance += direction * closed * (1 / self.entry_price - 1 / price)
+            self.position += signed
+            if abs(self.position) < 1e-9:
+                self.position, self.entry_price = 0.0, 0.0
+            elif (self.position > 0) != (direction > 0):
+                self.entry_price = price
+        order["average"] = ((order["average"] or 0) * order["filled"] + price * amount) / (order["filled"] + amount)
+        order["filled"] += amount
+        order["remaining"] -= amount
+        order["lastUpdateTimestamp"] = self._ms()
+
+    def best_bid(self):
+        own = self.orders[self.bids[0][2]]["price"] if self.bids else None
+        synthetic = self.price - self.half_spread
+        return max(synthetic, own) if own is not None else synthetic
+
+    def best_ask(self):
+        own = self.orders[self.asks[0][2]]["price"] if self.asks else None
+        synthetic = self.price + self.half_spread
+        return min(synthetic, own) if own is not None else synthetic
+
+    def book_levels(self):
+        # Aggregated L2 view: the synthetic touch on each side plus every
+        # resting order, summed per price.
+        levels = {"bids": {self.price - self.half_spread: self.depth}, "asks": {self.price + self.half_spread: self.depth}}
+        with self._lock:
+            for side, book in (("bids", self.bids), ("asks", self.asks)):
+                for _, _, order_id in book:
+                    order = self.orders[order_id]
+                    levels[side][order["price"]] = levels[side].get(order["price"], 0.0) + order["remaining"]
+        return levels
+
+    def book_updates(self):
+        # Deribit `book.<instrument>.raw` notifications describing how the
+        # book moved since the last call: a snapshot first, then changes. No
+        # request is counted, as these would arrive over the websocket.
+        levels = self.book_levels()
+        previous, self._published = self._published, levels
+        data = {"instrument_name": self.instrument, "timestamp": self._ms()}
+        if previous is None:
+            data["type"] = "snapshot"
+            for side in ("bids", "asks"):
+                data[side] = [["new", price, amount] for price, amount in levels[side].items()]
+        else:
+            data.update(type="change", prev_change_id=self._book_change_id)
+            for side in ("bids", "asks"):
+                old, new = previous[side], levels[side]
+                data[side] = ([["delete", price, 0.0] for price in old if price not in new]
+                              + [["new" if price not in old else "change", price, amount]
+                                 for price, amount in new.items() if old.get(price) != amount])
+            if not data["bids"] and not data["asks"]:
+                return []
+        self._book_change_id += 1
+        data["change_id"] = self._book_change_id
+        return [data]
+
+    def reset_book_feed(self):
+        self._published = None
+
+    # --- request plumbing --------------------------------------------------
+
+    def _ms(self):
+        return int(self.clock.time() * 1000)
+
+    def fail_next(self, method, error=None):
+        self.pending_errors.append((method, error or ccxt.NetworkError(f"injected failure in {method}")))
+
+    def _request(self, method):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            self.clock.sleep(latency)
+        for i, (name, error) in enumerate(self.pending_errors):
+            if name in (method, "*"):
+                del self.pending_errors[i]
+                raise error
+        rate = self.error_rates.get(method, self.error_rates.get("*", 0.0))
+        if rate and self.rng.random() < rate:
+            raise ccxt.NetworkError(f"injected network error in {method}")
+
+    # --- ccxt surface ------------------------------------------------------
+
+    def load_markets(self, reload=False):
+        self._request("load_markets")
+        self.markets = {
+            self.symbol: {
+                "id": self.instrument, "symbol": self.symbol, "base": "BTC", "quote": "USD", "settle": "BTC",
+                "contract": True, "swap": True, "inverse": True, "contractSize": 1.0,
+                "limits": {"amount": {"min": self.lot_size}},
+            }
+        }
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = dict(markets)
+        self.currencies = dict(currencies or {})
+        return self.markets
+
+    def market(self, symbol):
+        return self.markets[symbol]
+
+    def fetch_balance(self, params=None):
+        self._request("fetch_balance")
+        return {"total": {"BTC": self.balance}, "free": {"BTC": self.balance}, "used": {"BTC": 0.0}}
+
+    def fetch_ticker(self, symbol, params=None):
+        self._request("fetch_ticker")
+        return {"symbol": symbol, "last": self.price, "bid": self.best_bid(), "ask": self.best_ask(), "timestamp": self._ms()}
+
+    def fetch_positions(self, symbols=None, params=None):
+        self._request("fetch_positions")
+        unrealized = self.position * (1 / self.entry_price - 1 / self.price) if self.entry_price else 0.0
+        return [{
+            "symbol": self.symbol,
+            "info": {"instrument_name": self.instrument, "size": str(self.position)},
+            "entryPrice": self.entry_price,
+            "unrealizedPnl": unrealized,
+        }]
+
+    def fetch_order_book(self, symbol, limit=None, params=None):
+        self._request("fetch_order_book")
+        return {
+            "symbol": symbol,
+            "bids": [[self.best_bid(), self.depth]],
+            "asks": [[self.best_ask(), self.depth]],
+            "timestamp": self._ms(),
+        }
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self._request(f"create_limit_{side}_order")
+        params = params or {}
+        if type != "limit" or price is None:
+            raise ccxt.InvalidOrder("simulated exchange only supports limit orders")
+        if amount <= 0 or amount % self.lot_size:
+            raise ccxt.InvalidOrder(f"amount {amount} is not a multiple of lot size {self.lot_size}")
+        post_only = params.get("post_only") or params.get("postOnly")
+        if post_only and self._would_cross(side, price):
+            raise ccxt.OrderImmediatelyFillable(f"post_only {side} at {price} would cross the book")
+        order = {
+            "id": str(next(self._ids)), "symbol": symbol, "type": "limit", "side": side,
+            "amount": float(amount), "price": float(price), "filled": 0.0, "remaining": float(amount),
+            "average": None, "status": "open", "reduceOnly": bool(params.get("reduce_only") or params.get("reduceOnly")),
+            "timestamp": self._ms(), "lastUpdateTimestamp": self._ms(),
+        }
+        with self._lock:
+            self.orders[order["id"]] = order
+            self._rest(order)
+        self._match()
+        return dict(order)
+
+    def create_limit_buy_order(self, symbol, amount, price, params=None):
+        return self.create_order(symbol, "limit", "buy", amount, price, params)
+
+    def create_limit_sell_order(self, symbol, amount, price, params=None):
+        return self.create_order(symbol, "limit", "sell", amount, price, params)
+
+    def _would_cross(self, side, price):
+        return (side == "buy" and price >= self.price + self.half_spread) or (side == "sell" and price <= self.price - self.half_spread)
+
+    def _rest(self, order):
+        key = (-order["price"], next(self._seq), order["id"]) if order["side"] == "buy" else (order["price"], next(self._seq), order["id"])
+        bisect.insort(self.bids if order["side"] == "buy" else self.asks, key)
+
+    def _get(self, order_id):
+        order = self.orders.get(str(order_id))
+        if order is None:
+            raise ccxt.OrderNotFound(f"order {order_id} not found")
+        return order
+
+    def fetch_order(self, id, symbol=None, params=None):
+        self._request("fetch_order")
+        return dict(self._get(id))
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        self._request("fetch_open_orders")
+        return [dict(o) for o in self.orders.values() if o["status"] == "open"]
+
+    def fetch_closed_orders(self, symbol=None, since=None, limit=None, params=None):
+        self._request("fetch_closed_orders")
+        return [dict(o) for o in self.orders.values()
+                if o["status"] != "open" and (since is None or o["lastUpdateTimestamp"] >= since)]
+
+    def _remove_resting(self, order):
+        book = self.bids if order["side"] == "buy" else self.asks
+        for i, entry in enumerate(book):
+            if entry[2] == order["id"]:
+                del book[i]
+                break
+
+    def cancel_order(self, id, symbol=None, params=None):
+        self._request("cancel_order")
+        with self._lock:
+            order = self._get(id)
+            if order["status"] != "open":
+                raise ccxt.OrderNotFound(f"order {id} is already {order['status']}")
+            self._remove_resting(order)
+            order["status"] = "canceled"
+            order["lastUpdateTimestamp"] = self._ms()
+            return dict(order)
+
+    def edit_order(self, id, symbol, type, side, amount=None, price=None, params=None):
+        # Like Deribit's private/edit: the id is kept but time priority is lost.
+        self._request("edit_order")
+        params = params or {}
+        order = self._get(id)
+        if order["status"] != "open":
+            raise ccxt.OrderNotFound(f"order {id} is already {order['status']}")
+        amount = order["amount"] if amount is None else float(amount)
+        price = order["price"] if price is None else float(price)
+        if amount <= order["filled"] or amount % self.lot_size:
+            raise ccxt.InvalidOrder(f"amount {amount} is not a valid size for order {id}")
+        if (params.get("post_only") or params.get("postOnly")) and self._would_cross(order["side"], price):
+            raise ccxt.OrderImmediatelyFillable(f"post_only {order['side']} at {price} would cross the book")
+        with self._lock:
+            self._remove_resting(order)
+            order.update(amount=amount, price=price, remaining=amount - order["filled"], lastUpdateTimestamp=self._ms())
+            self._rest(order)
+        self._match()
+        return dict(order)
+
+    def cancel_all_orders(self, symbol=None, params=None):
+        self._request("cancel_all_orders")
+        cancelled = []
+        with self._lock:
+            for order in self.orders.values():
+                if order["status"] == "open":
+                    order["status"] = "canceled"
+                    order["lastUpdateTimestamp"] = self._ms()
+                    cancelled.append(dict(order))
+            self.bids.clear()
+            self.asks.clear()
+        return cancelled
+
+    def close(self):
+        pass
+
+def replay_exchange(folder, start=None, end=None, **kwargs):
+    # SimExchange driven by recorded ticker prices, one per recorded interval,
+    # as a stand-in exchange for run_bot() or bench scenarios.
+    reader = RecordReader(folder)
+    kwargs.setdefault("step_seconds", reader.price_interval(start, end))
+    prices = reader.prices(start, end)
+    first = next(prices, None)
+    if first is None:
+        raise ValueError(f"no recorded ticker prices in {folder}")
+    return SimExchange(prices=prices, start_price=first, **kwargs)
@@ -0,0 +1,66 @@
+import math
+from . import clock
+from .models import ProcessState
+
+# handle_order_status reprices a WAITMATCH order once price drifts this far from it.
+WAITMATCH_DRIFT = 0.001
+# Sleep only as long as a move of this many standard deviations stays unlikely.
+SAFETY_SIGMAS = 3.0
+
+class TickScheduler:
+    def __init__(self, min_interval, max_interval, request_budget, half_life=300.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.request_budget = request_budget
+        self.half_life = half_life
+        self.variance = None
+        self.requests_per_tick = None
+        self._last_price = None
+        self._last_time = None
+
+    def update_limits(self, min_interval, max_interval, request_budget):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.request_budget = request_budget
+
+    def observe_price(self, price, now=None):
+        now = clock.monotonic() if now is None else now
+        if price is None or price <= 0:
+            return
+        if self._last_price is not None and now > self._last_time:
+            dt = now - self._last_time
+            sample = math.log(price / self._last_price) ** 2 / dt
+            alpha = 1 - math.exp(-dt / self.half_life)
+            self.variance = sample if self.variance is None else self.variance + alpha * (sample - self.variance)
+        self._last_price, self._last_time = price, now
+
+    def observe_requests(self, count):
+        if self.requests_per_tick is None:
+            self.requests_per_tick = float(count)
+        else:
+            self.requests_per_tick += 0.2 * (count - self.requests_per_tick)
+
+    def distance(self, price, state, resting_prices):
+        if not price or not resting_prices:
+            return None
+        nearest = min(abs(p - price) / price for p in resting_prices)
+        if state == ProcessState.WAITMATCH:
+            return min(nearest, max(0.0, WAITMATCH_DRIFT - nearest))
+        return nearest
+
+    def budget_floor(self):
+        if not self.request_budget or not self.requests_per_tick:
+            return 0.0
+        return self.requests_per_tick * 60.0 / self.request_budget
+
+    def next_interval(self, price, state, resting_prices, default):
+        if state == ProcessState.REBALANCING:
+            interval = self.min_interval
+        else:
+            distance = self.distance(price, state, resting_prices)
+            if distance is None or not self.variance:
+                interval = default
+            else:
+                interval = (distance / (SAFETY_SIGMAS * math.sqrt(self.variance))) ** 2
+        interval = min(max(interval, self.min_interval), self.max_interval)
+        return max(interval, self.budget_floor())
@@ -0,0 +1,51 @@
+import asyncio
+import contextvars
+from . import clock
+
+# The engine (reconcile, orders, ladder, kill switch, portfolio, runner) is
+# written once as coroutines. With a blocking ccxt client every await
+# completes inline and run_sync() drives the coroutine to the end on the
+# calling thread; with ccxt.async_support the same code runs on the event
+# loop and gather() places requests concurrently.
+_blocking = contextvars.ContextVar("blocking_transport", default=False)
+
+def run_sync(coro):
+    token = _blocking.set(True)
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    finally:
+        _blocking.reset(token)
+    coro.close()
+    raise RuntimeError("engine step suspended on a blocking exchange client")
+
+def blocking() -> bool:
+    return _blocking.get()
+
+async def gather(*aws, return_exceptions=False) -> list:
+    if not blocking():
+        return await asyncio.gather(*aws, return_exceptions=return_exceptions)
+    results = []
+    for i, aw in enumerate(aws):
+        try:
+            results.append(await aw)
+        except Exception as e:
+            if not return_exceptions:
+                for rest in aws[i + 1:]:
+                    rest.close()
+                raise
+            results.append(e)
+    return results
+
+async def sleep(seconds):
+    if blocking():
+        clock.sleep(seconds)
+    else:
+        await clock.sleep_async(seconds)
+
+async def wait_event(signal, timeout=None) -> bool:
+    # `signal` is a WakeSignal, set from the user stream thread.
+    if blocking():
+        return signal.wait(timeout)
+    return await signal.wait_async(timeout)
@@ -0,0 +1,247 @@
+import json
+import threading
+import contextvars
+from collections import OrderedDict
+from .logging_utils import log_and_print
+from . import globals as G
+from .models import OrderStatus
+
+try:
+    from websockets.sync.client import connect as ws_connect
+except ImportError:
+    ws_connect = None
+
+MAX_CACHED_ORDERS = 500
+HEARTBEAT_SECONDS = 10
+STREAM_POSITION_TTL = 300.0
+# A tracked order the stream has said nothing about for this many ticks is
+# checked over REST, in case an update was missed.
+QUIET_TICKS = 12
+
+class UserStream:
+    def __init__(self, api_key, api_secret, instrument, url=None, cancel_on_disconnect=False, book=None):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.instrument = instrument
+        self.url = url or G.DERIBIT_WS_URL
+        self.cancel_on_disconnect = cancel_on_disconnect
+        self.book = book
+        self.orders = OrderedDict()
+        self.position = None
+        self._pending_position = None
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._live = threading.Event()
+        self._connects = 0
+        self._resynced = 0
+        self._thread = None
+        self._ws = None
+        self._next_id = 0
+
+    def book_channel(self):
+        return f"book.{self.instrument}.raw"
+
+    def channels(self):
+        channels = [
+            f"user.orders.{self.instrument}.raw",
+            f"user.trades.{self.instrument}.raw",
+            f"user.changes.{self.instrument}.raw",
+        ]
+        if self.book is not None:
+            channels.append(self.book_channel())
+        return channels
+
+    def start(self):
+        if ws_connect is None:
+            log_and_print("⚠️ websockets package not installed. User stream disabled, falling back to polling.", "warning")
+            return False
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._run,), name=f"user-stream-{self.instrument}", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._live.clear()
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def is_live(self):
+        return self._live.is_set()
+
+    def wait_live(self, timeout=None):
+        return self._live.wait(timeout)
+
+    def resync_due(self):
+        # Connection number still waiting for a REST resync, or None. Anything
+        # that happened while the socket was down was never pushed; the caller
+        # passes the number to resynced() once it has caught up.
+        connects = self._connects
+        return connects if connects != self._resynced else None
+
+    def resynced(self, connects):
+        self._resynced = max(self._resynced, connects)
+
+    def latest_order(self, order_id):
+        with self._lock:
+            return self.orders.get(order_id)
+
+    def quiet_ticks(self, order_id) -> float:
+        with self._lock:
+            seen = self._seen.get(order_id)
+        return float("inf") if seen is None else G.tick_id - seen
+
+    def touch(self, order_ids):
+        # Orders just verified over REST count as heard from.
+        with self._lock:
+            for order_id in order_ids:
+                self._seen[order_id] = G.tick_id
+
+    def sync_order(self, order: OrderStatus) -> bool:
+        data = self.latest_order(order.order_id)
+        if data is None:
+            return False
+        apply_order_update(order, data)
+        return True
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                with ws_connect(self.url, open_timeout=10) as ws:
+                    self._ws = ws
+                    self._session(ws)
+                backoff = 1
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                log_and_print("🌐 User stream disconnected: %s. Reconnecting in %ss...", "warning", e, backoff)
+            finally:
+                self._ws = None
+                self._live.clear()
+                if self.book is not None:
+                    self.book.invalidate()
+            if self._stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, 30)
+
+    def _send(self, ws, method, params=None):
+        self._next_id += 1
+        ws.send(json.dumps({"jsonrpc": "2.0", "id": self._next_id, "method": method, "params": params or {}}))
+        return self._next_id
+
+    def _call(self, ws, method, params=None):
+        request_id = self._send(ws, method, params)
+        while True:
+            message = json.loads(ws.recv(timeout=10))
+            if message.get("id") == request_id:
+                if "error" in message:
+                    raise RuntimeError(f"{method} failed: {message['error']}")
+                return message.get("result")
+            self._dispatch(ws, message)
+
+    def _session(self, ws):
+        self._call(ws, "public/auth", {
+            "grant_type": "client_credentials",
+            "client_id": self.api_key,
+            "client_secret": self.api_secret,
+        })
+        self._call(ws, "public/set_heartbeat", {"interval": HEARTBEAT_SECONDS})
+        if self.cancel_on_disconnect:
+            # Deribit pulls the orders if this socket drops or misses heartbeats,
+            # so a crashed or hung bot does not leave quotes behind.
+            self._call(ws, "private/enable_cancel_on_disconnect", {"scope": "connection"})
+            log_and_print("🛡️ Cancel-on-disconnect enabled for the user stream connection", "info")
+        subscribed = self._call(ws, "private/subscribe", {"channels": self.channels()})
+        log_and_print("📡 User stream subscribed: %s", "info", ', '.join(subscribed or []))
+        self._connects += 1
+        self._live.set()
+        while not self._stop.is_set():
+            message = json.loads(ws.recv(timeout=HEARTBEAT_SECONDS * 3))
+            self._dispatch(ws, message)
+
+    def _dispatch(self, ws, message):
+        method = message.get("method")
+        if method == "heartbeat":
+            if message.get("params", {}).get("type") == "test_request":
+                self._send(ws, "public/test")
+        elif method == "subscription":
+            params = message.get("params", {})
+            channel = params.get("channel", "")
+            gaps = self.book.gaps if self.book is not None else 0
+            self.handle_notification(channel, params.get("data"))
+            if self.book is not None and self.book.gaps != gaps:
+                # Subscribing again makes Deribit start over with a snapshot.
+                self._send(ws, "private/unsubscribe", {"channels": [channel]})
+                self._send(ws, "private/subscribe", {"channels": [channel]})
+
+    def handle_notification(self, channel, data):
+        if channel.startswith("book."):
+            if self.book is not None and data:
+                self.book.apply(data)
+        elif channel.startswith("user.orders."):
+            self._on_orders(data if isinstance(data, list) else [data])
+        elif channel.startswith("user.trades."):
+            if data:
+                log_and_print("⚡ User stream: %s trade(s) on %s", "info", len(data), self.instrument)
+                G.wake_event.set()
+        elif channel.startswith("user.changes."):
+            self._on_orders((data or {}).get("orders", []))
+            self._on_positions((data or {}).get("positions", []))
+
+    def _on_orders(self, orders):
+        # Runs on the socket thread: only the cache is written here. Tracked
+        # orders pick the updates up on the tick thread, in apply_updates() or
+        # sync_from_stream().
+        wake = False
+        for data in orders:
+            order_id = str(data.get("order_id", ""))
+            if not order_id:
+                continue
+            with self._lock:
+                self.orders[order_id] = data
+                self.orders.move_to_end(order_id)
+                self._seen[order_id] = G.tick_id
+                while len(self.orders) > MAX_CACHED_ORDERS:
+                    self._seen.pop(self.orders.popitem(last=False)[0], None)
+            if order_id in G.order_ids and OrderStatus.normalize_status(data.get("order_state", "")) in ("FILLED", "CANCELLED"):
+                wake = True
+        if wake:
+            G.wake_event.set()
+
+    def _on_positions(self, positions):
+        for pos in positions:
+            if pos.get("instrument_name") != self.instrument:
+                continue
+            position = (float(pos.get("size", 0)), float(pos.get("average_price", 0) or 0), float(pos.get("floating_profit_loss", 0) or 0))
+            with self._lock:
+                self.position = self._pending_position = position
+
+    def apply_updates(self):
+        # Called at the start of a tick, on the tick thread, so the snapshot,
+        # the ledger and the tracked orders never change under a tick that is
+        # planning from them.
+        with self._lock:
+            position, self._pending_position = self._pending_position, None
+        for order in list(G.order_ids.values()):
+            self.sync_order(order)
+        if position is None:
+            return
+        size, entry_price, _ = position
+        G.snapshot.put("position", G.SYMBOL_FUTURES, position, ttl=STREAM_POSITION_TTL)
+        G.current_short_usd = abs(size)
+        if G.ledger is not None:
+            G.ledger.sync(size, entry_price, list(G.order_ids.values()))
+
+def apply_order_update(order: OrderStatus, data: dict):
+    order.status = OrderStatus.normalize_status(data.get("order_state", ""))
+    order.filled = float(data.get("filled_amount", 0) or 0)
+    avg_price = data.get("average_price")
+    order.average_price = float(avg_price) if avg_price else None
+    if data.get("commission") is not None:
+        order.fee = abs(float(data["commission"]))
@@ -0,0 +1,78 @@
+import json
+import threading
+
+try:
+    from websockets.sync.server import serve
+except ImportError:
+    serve = None
+
+class StandInServer:
+    def __init__(self, host="127.0.0.1", port=0):
+        if serve is None:
+            raise RuntimeError("websockets package is required for the stand-in server")
+        self._server = serve(self._handler, host, port)
+        self._clients = []
+        self._lock = threading.Lock()
+        self._subscribed = threading.Event()
+        self._thread = None
+        self.requests = []
+
+    @property
+    def url(self):
+        host, port = self._server.socket.getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ws-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def wait_subscribed(self, timeout=None):
+        return self._subscribed.wait(timeout)
+
+    def disconnect(self):
+        # Drops every client, as a network failure would; they may reconnect.
+        self._subscribed.clear()
+        with self._lock:
+            clients = list(self._clients)
+        for ws in clients:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def push(self, channel, data):
+        message = json.dumps({"jsonrpc": "2.0", "method": "subscription", "params": {"channel": channel, "data": data}})
+        with self._lock:
+            clients = list(self._clients)
+        for ws in clients:
+            try:
+                ws.send(message)
+            except Exception:
+                pass
+
+    def _handler(self, ws):
+        with self._lock:
+            self._clients.append(ws)
+        try:
+            for raw in ws:
+                request = json.loads(raw)
+                method = request.get("method")
+                params = request.get("params", {})
+                self.requests.append(method)
+                if method == "public/auth":
+                    result = {"access_token": "standin", "expires_in": 900, "token_type": "bearer"}
+                elif method in ("private/subscribe", "public/subscribe"):
+                    result = params.get("channels", [])
+                    self._subscribed.set()
+                else:
+                    result = "ok"
+                ws.send(json.dumps({"jsonrpc": "2.0", "id": request.get("id"), "result": result}))
+        finally:
+            with self._lock:
+                self._clients.remove(ws)
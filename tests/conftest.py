@@ -0,0 +1,18 @@
+import time
+import pytest
+from rebalance_bot import globals as G
+from rebalance_bot.models import BotContext
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+@pytest.fixture
+def context():
+    token = G.use_context(BotContext(UNIQUE_KEY="test"))
+    yield G.current_context()
+    G.reset_context(token)
@@ -0,0 +1,72 @@
+import pytest
+from rebalance_bot import clock
+from rebalance_bot import globals as G
+from rebalance_bot.lazy import lazy_import
+from rebalance_bot.models import ProcessState
+from rebalance_bot.orders import amend_order
+from rebalance_bot.reconcile import track_order
+from rebalance_bot.sim_exchange import SimExchange
+from rebalance_bot.transport import run_sync
+
+ccxt = lazy_import("ccxt")
+
+@pytest.fixture
+def exchange(context):
+    # Flat position against 1 BTC: the plan is a short that the resting sell
+    # order has fallen behind.
+    ex = SimExchange(balance=1.0, position=0.0, volatility=0.0, seed=5)
+    previous = clock.install(ex.clock)
+    ex.load_markets()
+    G.current_balance_asset = 1.0
+    G.state = ProcessState.WAITMATCH
+    yield ex
+    clock.install(previous)
+
+def _stale_sell(ex):
+    return track_order(ex.create_limit_sell_order(G.SYMBOL_FUTURES, 10000, ex.price + 300, {"post_only": True}))
+
+def _open(ex):
+    return {order["id"]: order for order in ex.fetch_open_orders(G.SYMBOL_FUTURES)}
+
+def test_edit_reprices_in_place(exchange):
+    order = _stale_sell(exchange)
+    stale_price = order.price
+    assert run_sync(amend_order(exchange, order))
+    assert list(G.order_ids) == [order.order_id]
+    assert order.price < stale_price
+    assert _open(exchange)[order.order_id]["price"] == order.price
+    assert "cancel_order" not in exchange.calls and exchange.calls["create_limit_sell_order"] == 1
+
+def test_cancel_and_replace_without_edit_support(exchange):
+    exchange.has["editOrder"] = False
+    order = _stale_sell(exchange)
+    assert run_sync(amend_order(exchange, order))
+    (replacement,) = G.order_ids.values()
+    assert replacement.order_id != order.order_id
+    assert set(_open(exchange)) == {replacement.order_id}
+    assert replacement.price < order.price
+    assert "edit_order" not in exchange.calls
+
+def test_falls_back_when_the_venue_rejects_edits(exchange, monkeypatch):
+    def not_supported(*args, **kwargs):
+        raise ccxt.NotSupported("edit_order")
+    monkeypatch.setattr(exchange, "edit_order", not_supported)
+    order = _stale_sell(exchange)
+    assert run_sync(amend_order(exchange, order))
+    assert order.order_id not in G.order_ids
+    assert set(_open(exchange)) == set(G.order_ids)
+    assert exchange.calls["cancel_order"] == 1 and exchange.calls["create_limit_sell_order"] == 2
+
+def test_order_filled_before_the_edit_is_left_for_reconciliation(exchange):
+    order = _stale_sell(exchange)
+    exchange.price = order.price + 100
+    exchange.step()
+    assert run_sync(amend_order(exchange, order))
+    assert G.order_ids[order.order_id] is order
+    assert exchange.calls["create_limit_sell_order"] == 1
+
+def test_order_no_longer_needed_is_not_repriced(exchange):
+    order = _stale_sell(exchange)
+    exchange.position = -30000.0
+    assert not run_sync(amend_order(exchange, order))
+    assert "edit_order" not in exchange.calls and "cancel_order" not in exchange.calls
@@ -0,0 +1,61 @@
+import asyncio
+import time
+from rebalance_bot import clock
+from rebalance_bot import globals as G
+from rebalance_bot.models import BotContext, ProcessState
+from rebalance_bot.runner import run_bot, run_bot_async
+from rebalance_bot.sim_exchange import SimExchange
+
+TICKS = 40
+
+class AsyncSim:
+    # ccxt.async_support stand-in: the simulator's requests become coroutines.
+    def __init__(self, ex):
+        self._ex = ex
+
+    def __getattr__(self, name):
+        attr = getattr(self._ex, name)
+        if callable(attr) and name.startswith(("fetch_", "create_", "cancel_", "edit_", "load_markets")):
+            async def call(*args, **kwargs):
+                return attr(*args, **kwargs)
+            call.__name__ = name
+            return call
+        return attr
+
+    async def close(self):
+        pass
+
+def _configure(tmp_path):
+    G.USE_JOURNAL = False
+    G.parameter_file = str(tmp_path / "missing.ini")
+
+def _run(engine, tmp_path):
+    token = G.use_context(BotContext(UNIQUE_KEY=engine))
+    ex = SimExchange(seed=3, volatility=0.002)
+    previous = clock.install(ex.clock)
+    try:
+        _configure(tmp_path)
+        started = ex.clock.monotonic()
+        if engine == "async":
+            asyncio.run(run_bot_async(AsyncSim(ex), max_ticks=TICKS))
+        else:
+            run_bot(ex, max_ticks=TICKS)
+        return ex, G.tick_id, G.state, ex.clock.monotonic() - started
+    finally:
+        clock.install(previous)
+        G.reset_context(token)
+
+def test_async_engine_runs_on_simulated_time(tmp_path):
+    started = time.monotonic()
+    _, ticks, state, simulated = _run("async", tmp_path)
+    assert ticks == TICKS
+    assert state in (ProcessState.WAITMATCHPRE, ProcessState.WAITMATCH)
+    assert simulated >= (TICKS - 1) * BotContext().INTERVAL_SECONDS
+    assert time.monotonic() - started < simulated / 10
+
+def test_both_engines_make_the_same_requests(tmp_path):
+    sync_ex, *sync_result = _run("sync", tmp_path)
+    async_ex, *async_result = _run("async", tmp_path)
+    assert async_result == sync_result
+    assert async_ex.calls == sync_ex.calls
+    assert sync_ex.calls.get("create_limit_sell_order", 0) > 1
@@ -0,0 +1,50 @@
+from rebalance_bot import globals as G
+from rebalance_bot.config_watcher import ConfigWatcher
+from rebalance_bot.runner import start_config_watcher, apply_config_changes
+
+def _write(path, **values):
+    values = {"symbol_futures": "BTC/USD:BTC", "rebalance_gap": "0.01", **values}
+    path.write_text("[bot]\n" + "".join(f"{key} = {value}\n" for key, value in values.items()))
+
+def test_reload_applies_a_changed_file(tmp_path, context):
+    path = tmp_path / "rebalance_parameters.ini"
+    _write(path)
+    G.parameter_file = str(path)
+    start_config_watcher()
+    assert G.REBALANCE_GAP == 0.01
+    _write(path, rebalance_gap="0.025", interval_seconds="12")
+    apply_config_changes()
+    assert (G.REBALANCE_GAP, G.INTERVAL_SECONDS) == (0.025, 12)
+
+def test_unchanged_file_is_not_reapplied(tmp_path):
+    path = tmp_path / "rebalance_parameters.ini"
+    _write(path)
+    watcher = ConfigWatcher(str(path))
+    assert watcher.poll() is not None
+    assert watcher.poll() is None
+
+def test_invalid_change_keeps_current_parameters(tmp_path):
+    path = tmp_path / "rebalance_parameters.ini"
+    _write(path)
+    watcher = ConfigWatcher(str(path))
+    config = watcher.poll()
+    _write(path, short_target_ratio="1.5")
+    assert watcher.poll() is None
+    assert watcher.config is config
+
+def test_symbol_cannot_change_while_running(tmp_path):
+    path = tmp_path / "rebalance_parameters.ini"
+    _write(path)
+    watcher = ConfigWatcher(str(path))
+    watcher.poll()
+    _write(path, symbol_futures="ETH/USD:ETH")
+    assert watcher.poll() is None
+    assert watcher.config.symbol_futures == "BTC/USD:BTC"
+
+def test_missing_or_broken_file_is_ignored(tmp_path):
+    path = tmp_path / "rebalance_parameters.ini"
+    watcher = ConfigWatcher(str(path))
+    assert watcher.poll() is None
+    path.write_text("rebalance_gap = 0.02\n")
+    assert watcher.poll() is None
+    assert watcher.config is None
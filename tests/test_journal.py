@@ -0,0 +1,87 @@
+import pytest
+from rebalance_bot import clock
+from rebalance_bot import globals as G
+from rebalance_bot.journal import Journal, journal_path
+from rebalance_bot.models import BotContext, ProcessState
+from rebalance_bot.portfolio import setup_portfolio
+from rebalance_bot.runner import run_tick
+from rebalance_bot.sim_exchange import SimExchange
+from rebalance_bot.transport import run_sync
+
+@pytest.fixture
+def exchange(context):
+    # Starts at the target short so the first tick places boundary orders.
+    ex = SimExchange(balance=1.0, position=-30000.0, volatility=0.0002, seed=4)
+    previous = clock.install(ex.clock)
+    ex.load_markets()
+    yield ex
+    clock.install(previous)
+
+def _start(ex, path):
+    G.journal = Journal(str(path))
+    run_sync(setup_portfolio(ex))
+
+def _restart(ex, path):
+    # A crash: the journal is left as the last tick wrote it and the orders
+    # keep resting on the exchange.
+    G.journal.close()
+    token = G.use_context(BotContext(UNIQUE_KEY="restart"))
+    _start(ex, path)
+    return token
+
+def _open_ids(ex):
+    return {order["id"] for order in ex.fetch_open_orders(G.SYMBOL_FUTURES)}
+
+def test_resume_keeps_journaled_orders_and_cancels_strays(exchange, tmp_path):
+    path = tmp_path / "journal.db"
+    _start(exchange, path)
+    run_tick(exchange)
+    placed, initial = set(G.order_ids), (G.initial_balance_asset, G.initial_short_usd)
+    assert G.state == ProcessState.WAITMATCHPRE and len(placed) == 2
+    stray = exchange.create_limit_sell_order(G.SYMBOL_FUTURES, 10, exchange.price + 5000, {"post_only": True})
+    token = _restart(exchange, path)
+    try:
+        assert set(G.order_ids) == placed
+        assert G.state == ProcessState.WAITMATCHPRE
+        assert (G.initial_balance_asset, G.initial_short_usd) == initial
+        assert _open_ids(exchange) == placed
+        assert stray["id"] not in _open_ids(exchange)
+    finally:
+        G.journal.close()
+        G.reset_context(token)
+
+def test_resume_picks_up_orders_filled_while_down(exchange, tmp_path):
+    path = tmp_path / "journal.db"
+    _start(exchange, path)
+    run_tick(exchange)
+    lower = min(G.order_ids.values(), key=lambda order: order.price)
+    exchange.price = lower.price - 100
+    exchange.step()
+    token = _restart(exchange, path)
+    try:
+        assert G.order_ids[lower.order_id].status == "FILLED"
+        run_tick(exchange)
+        assert not G.order_ids and G.state == ProcessState.REBALANCING
+        run_tick(exchange)
+        assert G.state == ProcessState.WAITMATCHPRE
+    finally:
+        G.journal.close()
+        G.reset_context(token)
+
+def test_compaction_keeps_the_replayed_state(context, tmp_path):
+    journal = Journal(str(tmp_path / "journal.db"))
+    G.journal = journal
+    for price in (59000.0, 59500.0, 60500.0):
+        G.ladder_center = price
+        journal.checkpoint()
+    before = journal.replay()
+    journal.compact()
+    assert journal.replay() == before
+    assert before.ladder_center == 60500.0
+    assert journal._conn.execute("SELECT COUNT(*) FROM events WHERE key = 'ladder_center'").fetchone()[0] == 1
+    journal.close()
+
+def test_bots_sharing_a_key_and_symbol_get_their_own_journal():
+    single = journal_path("deribit", "BTC/USD:BTC")
+    assert single.endswith("deribit_BTC_USD_BTC.db")
+    assert len({single, journal_path("deribit", "BTC/USD:BTC", "hedge_a"), journal_path("deribit", "BTC/USD:BTC", "hedge_b")}) == 3
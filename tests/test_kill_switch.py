@@ -0,0 +1,40 @@
+import pytest
+from rebalance_bot import globals as G
+from rebalance_bot.kill_switch import cancel_open_orders, engage_kill_switch
+from rebalance_bot.transport import run_sync
+from rebalance_bot.reconcile import track_order
+from rebalance_bot.sim_exchange import SimExchange
+
+@pytest.fixture
+def exchange(context):
+    ex = SimExchange(seed=2)
+    ex.load_markets()
+    return ex
+
+def _rest(ex, offset):
+    return ex.create_limit_sell_order(G.SYMBOL_FUTURES, 100, ex.price + offset, {"post_only": True})
+
+def _open_ids(ex):
+    return {order["id"] for order in ex.fetch_open_orders(G.SYMBOL_FUTURES)}
+
+def test_routine_sweep_cancels_only_tracked_orders(exchange):
+    manual = _rest(exchange, 2000)
+    tracked = track_order(_rest(exchange, 1000))
+    assert run_sync(cancel_open_orders(exchange))
+    assert _open_ids(exchange) == {manual["id"]}
+    assert tracked.order_id not in G.order_ids
+    assert "cancel_all_orders" not in exchange.calls
+
+def test_routine_sweep_resolves_orders_filled_before_the_cancel(exchange):
+    order = track_order(exchange.create_limit_buy_order(G.SYMBOL_FUTURES, 100, exchange.price - 1, {"post_only": True}))
+    exchange.price = order.price - 100
+    exchange.step()
+    assert run_sync(cancel_open_orders(exchange))
+    assert G.order_ids[order.order_id].status == "FILLED"
+
+def test_kill_switch_pulls_every_order_on_the_instrument(exchange):
+    _rest(exchange, 2000)
+    track_order(_rest(exchange, 1000))
+    assert run_sync(engage_kill_switch(exchange, "test"))
+    assert _open_ids(exchange) == set()
+    assert not G.order_ids
@@ -0,0 +1,70 @@
+import pytest
+from rebalance_bot import clock
+from rebalance_bot import globals as G
+from rebalance_bot import ledger as ledger_module
+from rebalance_bot.exchange_client import get_futures_position
+from rebalance_bot.ledger import PositionLedger, open_ledger
+from rebalance_bot.models import OrderStatus
+from rebalance_bot.reconcile import track_order, reconcile_orders, untrack_order
+from rebalance_bot.sim_exchange import SimExchange
+from rebalance_bot.transport import run_sync
+
+@pytest.fixture
+def sim_clock():
+    sim_clock = clock.SimClock()
+    previous = clock.install(sim_clock)
+    yield sim_clock
+    clock.install(previous)
+
+def _order(order_id, side, filled, price, fee=0.0):
+    return OrderStatus(order_id=order_id, side=side, contracts=filled, price=price, status="OPEN", filled=filled, fee=fee)
+
+def test_partial_fills_are_booked_once(context):
+    ledger = PositionLedger(lot_size=10)
+    order = _order("1", "SELL", 40, 50000.0, fee=0.0001)
+    assert ledger.apply_order(order) == 40
+    assert ledger.apply_order(order) == 0
+    order.filled, order.fee = 100, 0.0002
+    assert ledger.apply_order(order) == 60
+    assert ledger.position()[:2] == (-100, 50000.0)
+    assert ledger.fees == pytest.approx(0.0002)
+
+def test_entry_is_the_harmonic_mean_and_closing_realizes_pnl(context):
+    ledger = PositionLedger(lot_size=10)
+    ledger.apply_order(_order("1", "SELL", 100, 50000.0))
+    ledger.apply_order(_order("2", "SELL", 100, 100000.0))
+    assert ledger.entry_price == pytest.approx(200 / (100 / 50000 + 100 / 100000))
+    ledger.apply_order(_order("3", "BUY", 200, 40000.0))
+    assert (ledger.size, ledger.entry_price) == (0.0, 0.0)
+    assert ledger.realized == pytest.approx(200 * (1 / 40000 - 1 / 66666.666666))
+
+def test_sync_expires_and_reports_drift(context, sim_clock, monkeypatch):
+    drifts = []
+    monkeypatch.setattr(ledger_module.metrics, "record_ledger_drift", drifts.append)
+    ledger = PositionLedger(lot_size=10, sync_seconds=60)
+    ledger.sync(-100, 50000.0)
+    assert ledger.fresh() and not drifts
+    ledger.apply_order(_order("1", "SELL", 50, 50000.0))
+    ledger.sync(-200, 50000.0, [_order("1", "SELL", 50, 50000.0)])
+    assert drifts == [-50]
+    assert ledger.size == -200 and ledger.apply_order(_order("1", "SELL", 50, 50000.0)) == 0
+    sim_clock.advance(60)
+    assert not ledger.fresh()
+
+def test_fills_move_the_position_without_refetching(context):
+    ex = SimExchange(balance=1.0, position=-30000.0, volatility=0.0, seed=6)
+    previous = clock.install(ex.clock)
+    try:
+        ex.load_markets()
+        open_ledger(ex.lot_size)
+        assert run_sync(get_futures_position(ex))[0] == -30000.0
+        order = track_order(ex.create_limit_buy_order(G.SYMBOL_FUTURES, 1000, ex.price - 50, {"post_only": True}))
+        ex.price = order.price - 100
+        ex.step()
+        run_sync(reconcile_orders(ex))
+        untrack_order(order.order_id)
+        G.snapshot.invalidate("position")
+        assert run_sync(get_futures_position(ex))[0] == ex.position == -29000.0
+        assert ex.calls["fetch_positions"] == 1
+    finally:
+        clock.install(previous)
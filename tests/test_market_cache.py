@@ -0,0 +1,57 @@
+import pytest
+from rebalance_bot import clock
+from rebalance_bot import globals as G
+from rebalance_bot import market_cache
+from rebalance_bot.market_cache import ensure_markets, read_market_cache, perpetual_symbols
+from rebalance_bot.sim_exchange import SimExchange
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(G, "CACHE_FOLDER", str(tmp_path))
+    sim_clock = clock.SimClock()
+    previous = clock.install(sim_clock)
+    yield sim_clock
+    clock.install(previous)
+
+def _exchange(sim_clock):
+    ex = SimExchange(sim_clock=sim_clock)
+    ex.cache_markets = True
+    return ex
+
+def _warm(sim_clock):
+    ex = _exchange(sim_clock)
+    ensure_markets(ex, (ex.symbol,))
+    return ex
+
+def test_second_start_loads_markets_from_disk(cache):
+    first = _warm(cache)
+    second = _exchange(cache)
+    assert ensure_markets(second, (second.symbol,)) == first.markets
+    assert "load_markets" not in second.calls
+    assert perpetual_symbols(second) == [second.symbol]
+
+def test_expired_cache_is_reloaded(cache):
+    _warm(cache)
+    cache.advance(G.MARKET_CACHE_TTL_SECONDS + 1)
+    assert read_market_cache(SimExchange.id) is None
+    ex = _exchange(cache)
+    ensure_markets(ex, (ex.symbol,))
+    assert ex.calls["load_markets"] == 1
+
+def test_cache_from_another_version_is_ignored(cache, monkeypatch):
+    _warm(cache)
+    monkeypatch.setattr(market_cache, "CACHE_VERSION", market_cache.CACHE_VERSION + 1)
+    assert read_market_cache(SimExchange.id) is None
+
+def test_symbol_missing_from_cache_forces_a_reload(cache):
+    _warm(cache)
+    ex = _exchange(cache)
+    ensure_markets(ex, ("ETH/USD:ETH",))
+    assert ex.calls["load_markets"] == 1
+
+def test_empty_cache_folder_disables_the_cache(cache, monkeypatch):
+    monkeypatch.setattr(G, "CACHE_FOLDER", "")
+    _warm(cache)
+    ex = _exchange(cache)
+    ensure_markets(ex, (ex.symbol,))
+    assert ex.calls["load_markets"] == 1
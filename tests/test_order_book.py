@@ -0,0 +1,79 @@
+import pytest
+from rebalance_bot import globals as G
+from rebalance_bot.order_book import LocalOrderBook, replay
+from rebalance_bot.sim_exchange import SimExchange
+from rebalance_bot.user_stream import UserStream
+from rebalance_bot.ws_standin import StandInServer
+from conftest import wait_until
+
+@pytest.fixture
+def exchange(context):
+    ex = SimExchange(seed=3, volatility=0.001)
+    ex.load_markets()
+    # Resting orders so the feed carries more than the synthetic touch.
+    ex.create_limit_sell_order(G.SYMBOL_FUTURES, 100, ex.price + 50, {"post_only": True})
+    ex.create_limit_buy_order(G.SYMBOL_FUTURES, 200, ex.price - 50, {"post_only": True})
+    return ex
+
+def _next_update(ex):
+    while True:
+        ex.step()
+        updates = ex.book_updates()
+        if updates:
+            return updates[0]
+
+def _assert_matches(book, ex):
+    levels = ex.book_levels()
+    bid, ask = max(levels["bids"]), min(levels["asks"])
+    assert (book.best_bid(), book.best_ask()) == (bid, ask)
+    assert book.depth_at("buy", bid) == levels["bids"][bid]
+    assert book.depth_at("sell", ask) == levels["asks"][ask]
+
+def test_replay_tracks_the_exchange_book(exchange):
+    book = LocalOrderBook(exchange.instrument)
+    assert replay(book, exchange.book_updates()) == 0
+    for _ in range(50):
+        _assert_matches(book, exchange)
+        assert replay(book, [_next_update(exchange)]) == 0
+    assert book.gaps == 0 and book.fresh()
+
+def test_skipped_change_id_clears_the_book_until_a_snapshot(exchange):
+    book = LocalOrderBook(exchange.instrument)
+    replay(book, exchange.book_updates())
+    _next_update(exchange)
+
+    assert replay(book, [_next_update(exchange)]) == 1
+    assert book.gaps == 1 and not book.fresh()
+    assert book.best_bid() is None and book.best_ask() is None
+    # Later changes cannot be applied to the cleared book either.
+    assert replay(book, [_next_update(exchange)]) == 1
+    assert book.gaps == 1
+
+    exchange.reset_book_feed()
+    assert replay(book, exchange.book_updates()) == 0
+    assert book.fresh()
+    _assert_matches(book, exchange)
+
+def test_stream_resubscribes_for_a_snapshot_after_a_gap(exchange):
+    server = StandInServer().start()
+    book = LocalOrderBook(exchange.instrument)
+    stream = UserStream("key", "secret", exchange.instrument, url=server.url, book=book)
+    try:
+        assert stream.start() and stream.wait_live(5)
+        channel = stream.book_channel()
+        server.push(channel, exchange.book_updates()[0])
+        assert wait_until(book.fresh)
+
+        _next_update(exchange)
+        server.push(channel, _next_update(exchange))
+        assert wait_until(lambda: server.requests.count("private/subscribe") == 2)
+        assert "private/unsubscribe" in server.requests
+        assert book.gaps == 1 and not book.fresh()
+
+        exchange.reset_book_feed()
+        server.push(channel, exchange.book_updates()[0])
+        assert wait_until(book.fresh)
+        _assert_matches(book, exchange)
+    finally:
+        stream.stop()
+        server.stop()
@@ -0,0 +1,61 @@
+import math
+from dataclasses import asdict
+import numpy as np
+import pytest
+from rebalance_bot.market_utils import rebalance_plan, boundary_order_plan
+from rebalance_bot.planner import ACTIONS, plan_batch, plan_row, plan_portfolio
+
+GAP, RATIO = 0.01, 0.5
+
+@pytest.fixture
+def portfolios():
+    rng = np.random.default_rng(7)
+    n = 500
+    prices = rng.uniform(20000, 120000, n)
+    balances = rng.uniform(0.0, 5.0, n)
+    balances[:5] = 0.0
+    # Around the target, so every action shows up: balanced, rebalance,
+    # leverage skips and sub-lot trades.
+    shorts = balances * prices * RATIO * rng.choice([0.0, 0.995, 1.0, 1.005, 1.5, 5.0], n)
+    lots = rng.choice([1.0, 10.0, 100.0], n)
+    # The planned leverage is the target ratio, so a cap below it skips.
+    max_leverages = rng.choice([2.0, 0.4], n)
+    return prices, balances, shorts, lots, max_leverages
+
+def test_batch_rows_match_single_portfolio_plans(portfolios):
+    prices, balances, shorts, lots, max_leverages = portfolios
+    batch = plan_batch(prices, balances, shorts, lots, GAP, RATIO, max_leverages)
+    assert set(ACTIONS[a] for a in batch.action) == set(ACTIONS)
+    for i, (price, balance, short, lot, max_leverage) in enumerate(zip(*portfolios)):
+        expected = asdict(plan_portfolio(price, balance, short, lot, GAP, RATIO, max_leverage))
+        row = asdict(plan_row(batch, i))
+        assert (row.pop("action"), row.pop("side"), row.pop("balanced")) == (expected.pop("action"), expected.pop("side"), expected.pop("balanced"))
+        assert row == pytest.approx(expected)
+
+def test_batch_matches_market_utils_helpers(portfolios):
+    prices, balances, shorts, lots, max_leverages = portfolios
+    batch = plan_batch(prices, balances, shorts, lots, GAP, RATIO, max_leverages)
+    for i, (price, balance, short, lot) in enumerate(zip(prices, balances, shorts, lots)):
+        if balance == 0:
+            continue
+        plan = rebalance_plan(price, short, lot, balance, RATIO)
+        assert batch.dev[i] == pytest.approx(plan.dev)
+        assert batch.contracts[i] == pytest.approx(plan.contracts)
+        assert batch.leverage[i] == pytest.approx(plan.leverage)
+        assert batch.side[i] == ("sell" if plan.diff > 0 else "buy")
+        lower, upper, down, up = boundary_order_plan(price, lot, None, balance, short, GAP, RATIO)
+        assert (batch.price_lower[i], batch.price_upper[i]) == pytest.approx((lower, upper))
+        assert (batch.contracts_down[i], batch.contracts_up[i]) == pytest.approx((down, up))
+
+def test_known_portfolios():
+    plan = plan_portfolio(60000.0, 1.0, 0.0, 10.0, GAP, RATIO, 2.0)
+    assert (plan.action, plan.side, plan.contracts, plan.dev) == ("rebalance", "sell", 30000.0, -0.5)
+
+    plan = plan_portfolio(60000.0, 1.0, 30000.0, 10.0, GAP, RATIO, 2.0)
+    assert plan.action == "boundary" and plan.balanced
+    assert plan.price_lower == pytest.approx(60000.0 * (1 - GAP / (1 - RATIO + GAP)))
+    assert plan.price_upper == pytest.approx(60000.0 * (1 + GAP / (1 - RATIO - GAP)))
+    assert plan.contracts_up == math.floor((plan.price_upper * RATIO - 30000.0) / 10) * 10
+
+    plan = plan_portfolio(60000.0, 0.0, 100.0, 10.0, GAP, RATIO, 2.0)
+    assert plan.dev == 0.0 and plan.leverage == math.inf
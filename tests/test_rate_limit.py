@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+from rebalance_bot import clock
+from rebalance_bot.rate_limit import RequestScheduler, backoff_delay, PRIORITY_KILL, PRIORITY_POLL
+from conftest import wait_until
+
+def _scheduler(rate=20.0):
+    scheduler = RequestScheduler({"matching": (rate, 1.0)})
+    assert scheduler.acquire("matching")
+    return scheduler
+
+def test_higher_priority_requests_go_first():
+    scheduler, order = _scheduler(), []
+
+    def request(name, priority):
+        scheduler.acquire("matching", priority)
+        order.append(name)
+
+    poll = threading.Thread(target=request, args=("poll", PRIORITY_POLL))
+    poll.start()
+    wait_until(lambda: len(scheduler._queues["matching"]) == 1)
+    kill = threading.Thread(target=request, args=("kill", PRIORITY_KILL))
+    kill.start()
+    poll.join(5)
+    kill.join(5)
+    assert order == ["kill", "poll"]
+
+def test_refuses_when_the_bucket_refills_after_the_deadline():
+    scheduler = _scheduler(rate=1.0)
+    started = time.monotonic()
+    assert not scheduler.acquire("matching", deadline=clock.monotonic() + 0.1)
+    assert time.monotonic() - started < 0.1
+    assert scheduler._queues["matching"] == []
+
+def test_queued_request_gives_up_at_its_deadline():
+    scheduler = _scheduler()
+    scheduler._enqueue("matching", PRIORITY_KILL)
+    started = time.monotonic()
+    assert not scheduler.acquire("matching", deadline=clock.monotonic() + 0.2)
+    assert time.monotonic() - started < 1.0
+    assert len(scheduler._queues["matching"]) == 1
+
+def test_queued_async_request_gives_up_at_its_deadline():
+    scheduler = _scheduler()
+    scheduler._enqueue("matching", PRIORITY_KILL)
+
+    async def acquire():
+        return await scheduler.acquire_async("matching", deadline=clock.monotonic() + 0.2)
+    started = time.monotonic()
+    assert not asyncio.run(acquire())
+    assert time.monotonic() - started < 1.0
+
+def test_penalty_drains_the_bucket():
+    scheduler = RequestScheduler({"matching": (10.0, 5.0)})
+    scheduler.penalize("matching", 2.0)
+    assert scheduler.buckets["matching"].take() >= 2.0
+
+def test_backoff_grows_up_to_the_cap():
+    for attempt in range(8):
+        ceiling = min(8.0, 0.25 * 2 ** attempt)
+        assert ceiling / 2 <= backoff_delay(attempt) <= ceiling
@@ -0,0 +1,51 @@
+from rebalance_bot.models import OrderStatus
+from rebalance_bot.recorder import Recorder, RecordReader, record_dtype, segment_path, TICKER, POSITION, ORDER
+from rebalance_bot.sim_exchange import replay_exchange
+
+DAY = 1_700_006_400.0  # 2023-11-15 00:00 UTC
+
+def _rows(folder, **kwargs):
+    return [row for rows in RecordReader(str(folder)).read(**kwargs) for row in rows]
+
+def test_round_trip_keeps_only_changes(context, tmp_path):
+    recorder = Recorder(str(tmp_path))
+    recorder.record_ticker({"last": 100.0, "bid": 99.5, "ask": 100.5}, ts=DAY + 1)
+    recorder.record_ticker({"last": 100.0, "bid": 99.5, "ask": 100.5}, ts=DAY + 2)
+    recorder.record_position(-500.0, 100.0, ts=DAY + 3)
+    order = OrderStatus(order_id="42", side="SELL", contracts=500, price=101.0, status="OPEN")
+    recorder.record_order(order, ts=DAY + 4)
+    order.status, order.filled = "FILLED", 500
+    recorder.record_order(order, ts=DAY + 5)
+    recorder.close()
+
+    rows = _rows(tmp_path)
+    assert [int(row["kind"]) for row in rows] == [TICKER, POSITION, ORDER, ORDER]
+    assert (rows[0]["price"], rows[0]["bid"], rows[0]["ask"]) == (100.0, 99.5, 100.5)
+    assert (rows[1]["size"], rows[1]["price"]) == (-500.0, 100.0)
+    assert rows[3]["order_id"] == b"42" and rows[3]["side"] == -1 and rows[3]["filled"] == 500
+    assert [row["ts"] for row in _rows(tmp_path, start=DAY + 3, end=DAY + 5)] == [DAY + 3, DAY + 4]
+
+def test_segments_roll_by_day_and_ignore_partial_rows(context, tmp_path):
+    recorder = Recorder(str(tmp_path))
+    recorder.record_ticker({"last": 100.0}, ts=DAY - 1)
+    recorder.record_ticker({"last": 101.0}, ts=DAY + 1)
+    recorder.close()
+    with open(segment_path(str(tmp_path), "20231115"), "ab") as f:
+        f.write(b"\0" * (record_dtype().itemsize // 2))
+    assert len(RecordReader(str(tmp_path)).segments()) == 2
+    assert [row["price"] for row in _rows(tmp_path)] == [100.0, 101.0]
+    assert [row["price"] for row in _rows(tmp_path, start=DAY)] == [101.0]
+
+def test_replay_exchange_follows_the_recorded_prices(context, tmp_path):
+    recorder = Recorder(str(tmp_path))
+    prices = [100.0, 101.0, 99.0, 102.0]
+    for i, price in enumerate(prices):
+        recorder.record_ticker({"last": price}, ts=DAY + 5 * i)
+    recorder.close()
+    ex = replay_exchange(str(tmp_path))
+    assert ex.step_seconds == 5.0
+    seen = [ex.price]
+    while not ex.exhausted:
+        ex.step()
+        seen.append(ex.price)
+    assert seen[:len(prices)] == prices
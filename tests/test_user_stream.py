@@ -0,0 +1,83 @@
+import pytest
+from rebalance_bot import globals as G
+from rebalance_bot.models import OrderStatus
+from rebalance_bot.orders import handle_order_status
+from rebalance_bot.transport import run_sync
+from rebalance_bot.reconcile import track_order
+from rebalance_bot.sim_exchange import SimExchange
+from rebalance_bot.user_stream import UserStream, QUIET_TICKS
+from rebalance_bot.ws_standin import StandInServer
+from conftest import wait_until
+
+INSTRUMENT = "BTC-PERPETUAL"
+
+@pytest.fixture
+def server():
+    server = StandInServer().start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def stream(context, server):
+    stream = UserStream("key", "secret", INSTRUMENT, url=server.url)
+    assert stream.start()
+    assert stream.wait_live(5)
+    yield stream
+    stream.stop()
+
+def _order(order_id, side="SELL"):
+    order = OrderStatus(order_id=order_id, side=side, contracts=100.0, price=60000.0, status="OPEN")
+    G.order_ids[order_id] = order
+    return order
+
+def test_fill_and_cancel_are_applied_to_tracked_orders(stream, server):
+    filled, cancelled = _order("1"), _order("2", side="BUY")
+    server.push(f"user.orders.{INSTRUMENT}.raw", {
+        "order_id": "1", "order_state": "filled", "filled_amount": 100, "average_price": 60010.0, "commission": -0.0000012,
+    })
+    server.push(f"user.changes.{INSTRUMENT}.raw", {
+        "orders": [{"order_id": "2", "order_state": "cancelled", "filled_amount": 0}],
+        "positions": [{"instrument_name": INSTRUMENT, "size": -100, "average_price": 60010.0}],
+    })
+    assert wait_until(lambda: stream.position is not None)
+    assert G.wake_event.is_set()
+    # The socket thread only records; the tick applies.
+    assert filled.status == "OPEN" and G.current_short_usd == 0
+    stream.apply_updates()
+    assert filled.status == "FILLED" and cancelled.status == "CANCELLED"
+    assert filled.filled == 100 and filled.average_price == 60010.0
+    assert filled.fee == pytest.approx(0.0000012)
+    assert G.current_short_usd == 100
+    assert G.snapshot.peek("position", G.SYMBOL_FUTURES)[0] == -100
+
+def test_reconnect_asks_for_a_rest_resync(stream, server):
+    first = stream.resync_due()
+    assert first is not None
+    stream.resynced(first)
+    assert stream.resync_due() is None
+
+    server.disconnect()
+    assert wait_until(lambda: not stream.is_live())
+    assert stream.wait_live(5)
+    assert stream.resync_due() == first + 1
+    assert server.requests.count("private/subscribe") == 2
+
+def test_orders_the_stream_has_not_reported_are_reconciled_over_rest(context):
+    ex = SimExchange(seed=1)
+    ex.load_markets()
+    order = track_order(ex.create_limit_sell_order(G.SYMBOL_FUTURES, 100, ex.price + 1000, {"post_only": True}))
+    stream = UserStream("key", "secret", INSTRUMENT)
+    stream._live.set()
+    G.user_stream = stream
+
+    run_sync(handle_order_status(ex))
+    assert ex.calls.get("fetch_open_orders") == 1
+
+    stream.handle_notification(f"user.orders.{INSTRUMENT}.raw", {"order_id": order.order_id, "order_state": "open", "filled_amount": 0})
+    run_sync(handle_order_status(ex))
+    assert ex.calls.get("fetch_open_orders") == 1
+
+    G.tick_id += QUIET_TICKS
+    run_sync(handle_order_status(ex))
+    assert ex.calls.get("fetch_open_orders") == 2
+    assert order.status == "OPEN"